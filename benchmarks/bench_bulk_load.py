@@ -0,0 +1,105 @@
+"""Throughput of MplusDatabase.bulk_insert at 10k, 100k and 1M rows.
+
+Loads synthetic run and roster rows into temporary copies of the 'run'
+and 'roster' tables (so MDB data isn't touched), with multi-row INSERTs.
+Needs config/db_config.ini.
+
+With --client-only, no database is used: it times only the client side
+(escaping the query parameters the way the pure python mysql.connector
+does), i.e. the most rows/sec the loader could push. Server-side parse,
+index and commit costs aren't in it.
+
+Usage (from the repo root):
+
+    python benchmarks/bench_bulk_load.py [--client-only] [--sizes 10000 100000]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np  # noqa: E402
+from mysql.connector.conversion import MySQLConverter  # noqa: E402
+
+import blizz_parser  # noqa: E402
+import mplusdb  # noqa: E402
+import utils  # noqa: E402
+
+SIZES = [10 ** 4, 10 ** 5, 10 ** 6]
+
+
+def make_rows(table: str, num_rows: int, seed: int = 0) -> List[tuple]:
+    """Returns num_rows random rows of table ('run' or 'roster')."""
+    rng = np.random.default_rng(seed)
+    if table == "run":
+        rows = np.zeros(num_rows, dtype=blizz_parser.RUN_DTYPE)
+        rows["dungeon"] = rng.choice(list(utils.Scorer().dungeon_timers), num_rows)
+        rows["level"] = rng.integers(2, 26, num_rows)
+        rows["period"] = 775
+        rows["timestamp"] = 1600000000000 + rng.integers(0, 10 ** 9, num_rows)
+        rows["duration"] = rng.integers(900000, 3000000, num_rows)
+        rows["faction"] = rng.integers(0, 2, num_rows)
+        rows["region"] = 1
+        rows["score"] = rng.uniform(50, 300, num_rows)
+        rows["istimed"] = rng.integers(0, 2, num_rows)
+        rows["composition"] = "BHaqx"
+    else:
+        rows = np.zeros(num_rows, dtype=blizz_parser.ROSTER_DTYPE)
+        rows["character_id"] = rng.integers(10 ** 7, 3 * 10 ** 8, num_rows)
+        rows["name"] = "Playername"
+        rows["spec"] = rng.choice(utils.Utils.get_all_spec_ids(), num_rows)
+        rows["realm"] = rng.integers(1, 4000, num_rows)
+    rows["run_id"] = np.arange(num_rows, dtype=np.uint64)
+    return rows.tolist()
+
+
+def time_client_side(table: str, rows: List[tuple]) -> float:
+    """Returns seconds spent building the chunks, without sending them."""
+    fields = ["f%d" % i for i in range(len(rows[0]))]
+    chunk_size = mplusdb.BULK_CHUNK_SIZE
+    converter = MySQLConverter()
+    start = time.perf_counter()
+    for chunk_start in range(0, len(rows), chunk_size):
+        chunk = rows[chunk_start : chunk_start + chunk_size]
+        mplusdb.get_multirow_insert(table, fields, len(chunk))
+        [
+            converter.quote(converter.escape(converter.to_mysql(value)))
+            for row in chunk
+            for value in row
+        ]
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Prints rows/sec of each table and size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--client-only", action="store_true")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    args = parser.parse_args()
+    mdb = None
+    if not args.client_only:
+        mdb = mplusdb.MplusDatabase("config/db_config.ini")
+    for table in ["run", "roster"]:
+        for num_rows in args.sizes:
+            rows = make_rows(table, num_rows)
+            if mdb is None:
+                rows_per_sec = num_rows / time_client_side(table, rows)
+            else:
+                # temporary tables live on the session's connection
+                with mdb.session():
+                    mdb.send_query_to_mdb(
+                        "CREATE TEMPORARY TABLE bench_%s LIKE %s" % (table, table)
+                    )
+                    stats = mdb.bulk_insert(table, rows, into="bench_" + table)
+                    mdb.send_query_to_mdb("DROP TEMPORARY TABLE bench_" + table)
+                rows_per_sec = stats["rows_per_sec"]
+            print("%-7s %8d rows %10.0f rows/sec" % (table, num_rows, rows_per_sec))
+    if mdb is not None:
+        mdb.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Before/after benchmark of the leaderboard decoders.
+
+Times each BatchCaller decoder on a synthetic 500-run leaderboard, and
+the arithmetic run id against the string-built one it replaced.
+
+Usage (from the repo root):
+
+    python benchmarks/bench_decoders.py
+"""
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import blizz_parser  # noqa: E402
+from fixtures import make_leaderboard  # noqa: E402
+
+REPEAT = 50
+
+
+def decode_objects(payload: bytes) -> tuple:
+    """The original decoder: json tree, then KeyRun/RosterMember objects."""
+    leaderboard = blizz_parser.KeyRunLeaderboard(json.loads(payload))
+    return leaderboard.get_runs_as_tuple_list(), leaderboard.get_rosters_as_tuple_list()
+
+
+def decode_fast(payload: bytes) -> tuple:
+    """json tree, then tuples straight away."""
+    return blizz_parser.parse_leaderboard_json(json.loads(payload))
+
+
+def decode_stream(payload: bytes) -> tuple:
+    """No json tree, one group at a time."""
+    return blizz_parser.parse_leaderboard_stream(payload)
+
+
+def string_run_id(completed_timestamp, region, member_ids) -> int:
+    """Run id as it was built before the arithmetic fast path."""
+    timestamp = str(completed_timestamp)[1:-4]
+    member_id = str(min(member_ids)).zfill(10)
+    return int("%s%s%s" % (timestamp, region, member_id))
+
+
+def main() -> None:
+    """Prints time and peak memory per decoder, and run id timings."""
+    payload = make_leaderboard()
+    print("leaderboard: 500 runs, %.2f MB" % (len(payload) / 1e6))
+    decoders = [
+        ("json (objects)", decode_objects),
+        ("fast", decode_fast),
+        ("stream", decode_stream),
+    ]
+    expected = decode_objects(payload)
+    for name, decode in decoders:
+        if decode(payload) != expected:
+            raise AssertionError("%s decoder output differs" % name)
+        seconds = min(timeit.repeat(lambda: decode(payload), number=1, repeat=REPEAT))
+        tracemalloc.start()
+        decode(payload)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            "%-16s %7.1f ms  %6.2f MB peak" % (name, seconds * 1000, peak / 1e6)
+        )
+
+    rnd = random.Random(0)
+    ids = [[rnd.randint(10 ** 7, 3 * 10 ** 8) for _ in range(5)] for _ in range(1000)]
+    for name, generate in [
+        ("run id (string)", string_run_id),
+        ("run id (arith)", blizz_parser._generate_run_id),
+    ]:
+        seconds = min(
+            timeit.repeat(
+                lambda: [generate(1600000000000, 1, members) for members in ids],
+                number=10,
+                repeat=5,
+            )
+        )
+        print("%-16s %7.2f us per run" % (name, seconds / 10 / len(ids) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
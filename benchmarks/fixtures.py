@@ -0,0 +1,220 @@
+"""Leaderboard fixtures for the benchmarks.
+
+A corpus is the set of leaderboard response bodies of one region and
+dungeon, one body per connected realm, as BatchCaller would download
+them. Synthetic corpora are generated from a seed, recorded ones are
+read from benchmarks/corpora/recorded/<name>/*.json, and the ones
+synthetic_api.py writes from benchmarks/corpora/generated/<name>/.
+
+Usage (from the repo root):
+
+    # write the synthetic corpora to benchmarks/corpora/synthetic/
+    python benchmarks/fixtures.py write
+
+    # record a live corpus (needs API credentials in config/)
+    python benchmarks/fixtures.py record us 244 775
+"""
+import glob
+import json
+import os
+import random
+import sys
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import utils  # noqa: E402
+
+CORPORA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpora")
+
+# name -> (runs per leaderboard, number of realms, share of runs that are
+# also on another realm's leaderboard)
+SYNTHETIC_CORPORA = {
+    "small": (50, 5, 0.3),
+    "medium": (200, 20, 0.3),
+    "full": (500, 40, 0.3),
+}  # type: Dict[str, tuple]
+
+
+def make_group(rnd: random.Random, spec_ids: List[int]) -> dict:
+    """Returns a random 'leading_groups' entry (rank is set later)."""
+    faction = rnd.choice(["ALLIANCE", "HORDE"])
+    members = []
+    for _ in range(5):
+        members.append(
+            {
+                "profile": {
+                    "name": "player%d" % rnd.randint(1, 10 ** 6),
+                    "id": rnd.randint(10 ** 7, 3 * 10 ** 8),
+                    "realm": {"key": {"href": "x"}, "id": 11, "slug": "s"},
+                },
+                "faction": {"type": faction},
+                "specialization": {"id": rnd.choice(spec_ids)},
+            }
+        )
+    return {
+        "ranking": 0,
+        "duration": rnd.randint(900000, 3000000),
+        "completed_timestamp": 1600000000000 + rnd.randint(0, 10 ** 9),
+        "keystone_level": rnd.randint(2, 25),
+        "keystone_affixes": [],
+        "members": members,
+    }
+
+
+def make_leaderboard(
+    num_runs: int = 500,
+    seed: int = 0,
+    groups: Optional[List[dict]] = None,
+    realm_id: int = 11,
+) -> bytes:
+    """Returns body of a synthetic leaderboard, shaped like Blizzard's.
+
+    Parameters
+    ----------
+    num_runs : int
+        number of random runs (if groups is not given)
+    seed : int
+        seed of the random runs
+    groups : list of dict, optional
+        'leading_groups' entries to use instead of random ones
+    realm_id : int
+        connected realm id of the leaderboard
+    """
+    if groups is None:
+        rnd = random.Random(seed)
+        spec_ids = utils.Utils.get_all_spec_ids()
+        groups = [make_group(rnd, spec_ids) for _ in range(num_runs)]
+    groups = sorted(
+        groups, key=lambda group: (-group["keystone_level"], group["duration"])
+    )
+    for rank, group in enumerate(groups):
+        group["ranking"] = rank + 1
+    realm_url = "https://us.api.blizzard.com/data/wow/connected-realm/%d" % realm_id
+    leaderboard = {
+        "_links": {
+            "self": {
+                "href": realm_url
+                + "/mythic-leaderboard/244/period/775?namespace=dynamic-us"
+            }
+        },
+        "map": {"name": "Atal'Dazar", "id": 1763},
+        "period": 775,
+        "period_start_timestamp": 1600000000000,
+        "period_end_timestamp": 1600604800000,
+        "connected_realm": {"href": realm_url + "?namespace=dynamic-us"},
+        "leading_groups": groups,
+        "keystone_affixes": [],
+        "map_challenge_mode_id": 244,
+        "name": "Atal'Dazar",
+    }
+    return json.dumps(leaderboard).encode()
+
+
+def make_corpus(
+    num_runs: int = 500,
+    num_realms: int = 40,
+    duplicate_rate: float = 0.3,
+    seed: int = 0,
+) -> List[bytes]:
+    """Returns leaderboards of num_realms realms, with shared runs.
+
+    Each leaderboard has num_runs runs; about duplicate_rate of them are
+    runs that are on another realm's leaderboard too (groups made of
+    players from several realms).
+    """
+    rnd = random.Random(seed)
+    spec_ids = utils.Utils.get_all_spec_ids()
+    seen = []
+    payloads = []
+    for realm in range(num_realms):
+        groups = []
+        for _ in range(num_runs):
+            if seen and rnd.random() < duplicate_rate:
+                groups.append(json.loads(json.dumps(rnd.choice(seen))))
+            else:
+                groups.append(make_group(rnd, spec_ids))
+        # no run twice on one leaderboard
+        unique = {}
+        for group in groups:
+            key = (group["completed_timestamp"], group["members"][0]["profile"]["id"])
+            unique[key] = group
+        seen.extend(json.loads(json.dumps(list(unique.values()))))
+        payloads.append(
+            make_leaderboard(groups=list(unique.values()), realm_id=realm + 1)
+        )
+    return payloads
+
+
+def get_corpus_names() -> List[str]:
+    """Returns names of the synthetic corpora, and of any recorded ones or
+    ones written by synthetic_api.py (generated/)."""
+    on_disk = sorted(
+        os.path.relpath(path, CORPORA_DIR)
+        for kind in ["recorded", "generated"]
+        for path in glob.glob(os.path.join(CORPORA_DIR, kind, "*"))
+        if os.path.isdir(path)
+    )
+    return list(SYNTHETIC_CORPORA) + on_disk
+
+
+def load_corpus(name: str) -> List[bytes]:
+    """Returns leaderboard bodies of corpus name.
+
+    Synthetic corpora are read from benchmarks/corpora/synthetic/<name>/
+    if written there, and generated on the fly otherwise.
+    """
+    directory = name if "/" in name else "synthetic/" + name
+    paths = sorted(glob.glob(os.path.join(CORPORA_DIR, directory, "*.json")))
+    if paths:
+        payloads = []
+        for path in paths:
+            with open(path, "rb") as file_:
+                payloads.append(file_.read())
+        return payloads
+    if name not in SYNTHETIC_CORPORA:
+        raise ValueError("No such corpus: %s" % name)
+    num_runs, num_realms, duplicate_rate = SYNTHETIC_CORPORA[name]
+    return make_corpus(num_runs, num_realms, duplicate_rate)
+
+
+def write_corpus(name: str, payloads: List[bytes]) -> None:
+    """Writes leaderboard bodies to benchmarks/corpora/<name>/."""
+    directory = os.path.join(CORPORA_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    for index, payload in enumerate(payloads):
+        with open(os.path.join(directory, "%04d.json" % index), "wb") as file_:
+            file_.write(payload)
+    print("Wrote %d leaderboards to %s" % (len(payloads), directory))
+
+
+def record_corpus(region: str, dungeon: int, period: int) -> None:
+    """Downloads leaderboards of every realm and writes them as a corpus."""
+    import blizz_api
+    import blizz_http
+
+    batch_caller = blizz_api.BatchCaller()
+    batch_caller.region = region
+    batch_caller.dungeon = dungeon
+    batch_caller.period = period
+    calls = batch_caller._get_leaderboard_calls()
+    responses, report = blizz_api._multi_threaded_call(
+        calls,
+        batch_caller.workers,
+        batch_caller.pool,
+        None,
+        blizz_http.RetryQueue(batch_caller.retry_budget, batch_caller.max_attempts),
+    )
+    print("Leaderboard calls: %s" % report)
+    payloads = [resp.content for resp in responses if resp is not None]
+    write_corpus("recorded/%s-%d-%d" % (region, dungeon, period), payloads)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["write"]:
+        for corpus_name in SYNTHETIC_CORPORA:
+            write_corpus("synthetic/" + corpus_name, load_corpus(corpus_name))
+    elif sys.argv[1:2] == ["record"] and len(sys.argv) == 5:
+        record_corpus(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        print(__doc__)
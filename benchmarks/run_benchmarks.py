@@ -0,0 +1,335 @@
+"""Parser, scorer, composition and dedupe benchmarks over leaderboard corpora.
+
+Every case runs on every corpus (see fixtures.py), in its own process,
+so its peak RSS isn't inflated by the cases before it. For each case the
+suite records runs/sec (best of REPEAT), peak traced python allocations
+and peak RSS, and saves the results as json, so two versions can be
+compared.
+
+Usage (from the repo root):
+
+    # run everything, save to benchmarks/results/<label>.json
+    python benchmarks/run_benchmarks.py --label before
+
+    # only some cases/corpora, and compare to a saved run
+    python benchmarks/run_benchmarks.py --corpus small --case parse \\
+        --label after --compare benchmarks/results/before.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np  # noqa: E402
+
+import blizz_api  # noqa: E402
+import blizz_parser  # noqa: E402
+import utils  # noqa: E402
+from fixtures import get_corpus_names, load_corpus  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+REPEAT = 5
+
+
+def _decode_all(payloads: List[bytes], decoder: str) -> int:
+    """Parses every leaderboard on its own (no dedupe)."""
+    num_runs = 0
+    for payload in payloads:
+        runs, _ = blizz_parser.parse_leaderboard(payload, decoder)
+        num_runs += len(runs)
+    return num_runs
+
+
+def _get_groups(payloads: List[bytes]) -> List[dict]:
+    """Returns 'leading_groups' entries of every leaderboard."""
+    groups = []
+    for payload in payloads:
+        groups.extend(json.loads(payload).get("leading_groups", []))
+    return groups
+
+
+def _get_runs(payloads: List[bytes]) -> List[tuple]:
+    """Returns unique run tuples of the corpus."""
+    return blizz_api.BatchCaller._parse_responses(payloads)[0]
+
+
+def setup_parse(payloads: List[bytes], decoder: str) -> Callable[[], int]:
+    """Decoding each leaderboard on its own with decoder."""
+    return lambda: _decode_all(payloads, decoder)
+
+
+def setup_parse_responses(payloads: List[bytes]) -> Callable[[], int]:
+    """Whole BatchCaller parse step: stream decoding with early dedupe."""
+    num_entries = len(_get_groups(payloads))
+
+    def run() -> int:
+        _get_runs(payloads)
+        return num_entries
+
+    return run
+
+
+def setup_score_scalar(payloads: List[bytes]) -> Callable[[], int]:
+    """Scorer.get_score, one run at a time."""
+    runs = _get_runs(payloads)
+    scorer = utils.Scorer()
+
+    def run() -> int:
+        for run_ in runs:
+            scorer.get_score(run_[5], run_[1], run_[2])
+        return len(runs)
+
+    return run
+
+
+def setup_score_vectorized(payloads: List[bytes]) -> Callable[[], int]:
+    """Scorer.get_scores over columnar runs."""
+    runs = blizz_parser.runs_to_array(_get_runs(payloads))
+    scorer = utils.Scorer()
+
+    def run() -> int:
+        scorer.get_scores(runs["duration"], runs["dungeon"], runs["level"])
+        return len(runs)
+
+    return run
+
+
+def setup_composition_strings(payloads: List[bytes]) -> Callable[[], int]:
+    """Composition strings, as built for every run at parse time."""
+    specs = [
+        [member["specialization"]["id"] for member in group["members"]]
+        for group in _get_groups(payloads)
+    ]
+
+    def run() -> int:
+        for run_specs in specs:
+            blizz_parser._get_composition(run_specs)
+        return len(specs)
+
+    return run
+
+
+def setup_composition_index(payloads: List[bytes]) -> Callable[[], int]:
+    """Composition codes and index built from the strings, plus a query."""
+    compositions = blizz_parser.runs_to_array(_get_runs(payloads))["composition"]
+
+    def run() -> int:
+        index = utils.CompositionIndex.from_strings(compositions)
+        index.find(specs={256: 1}, roles={"tank": 1, "healer": 1})
+        return len(index)
+
+    return run
+
+
+def setup_dedupe_fingerprint(payloads: List[bytes]) -> Callable[[], int]:
+    """RunDeduper over every leaderboard entry."""
+    groups = _get_groups(payloads)
+
+    def run() -> int:
+        deduper = blizz_parser.RunDeduper()
+        for group in groups:
+            deduper.is_new_group(group)
+        return len(groups)
+
+    return run
+
+
+def setup_dedupe_tuples(payloads: List[bytes]) -> Callable[[], int]:
+    """The dedupe that ran before fingerprints: set() over every tuple."""
+    runs, rosters = [], []
+    for payload in payloads:
+        leaderboard_runs, leaderboard_rosters = blizz_parser.parse_leaderboard(payload)
+        runs.extend(leaderboard_runs)
+        rosters.extend(leaderboard_rosters)
+
+    def run() -> int:
+        list(set(runs))
+        list(set(rosters))
+        return len(runs)
+
+    return run
+
+
+# case name -> setup(payloads) returning the timed function, which returns
+# the number of runs it went through
+CASES = {
+    "parse/json": lambda payloads: setup_parse(payloads, "json"),
+    "parse/fast": lambda payloads: setup_parse(payloads, "fast"),
+    "parse/stream": lambda payloads: setup_parse(payloads, "stream"),
+    "parse/parse_responses": setup_parse_responses,
+    "score/scalar": setup_score_scalar,
+    "score/vectorized": setup_score_vectorized,
+    "composition/strings": setup_composition_strings,
+    "composition/index": setup_composition_index,
+    "dedupe/fingerprint": setup_dedupe_fingerprint,
+    "dedupe/tuple_set": setup_dedupe_tuples,
+}  # type: Dict[str, Callable]
+
+
+def _get_rss_kb() -> int:
+    """Returns peak RSS of this process in KB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, linux KB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def measure_case(case: str, corpus: str) -> dict:
+    """Runs case on corpus and returns its measurements."""
+    payloads = load_corpus(corpus)
+    run = CASES[case](payloads)
+    rss_before = _get_rss_kb()
+    num_runs = run()  # warm up
+    seconds = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    rss_after = _get_rss_kb()
+    tracemalloc.start()
+    run()
+    alloc_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "case": case,
+        "corpus": corpus,
+        "leaderboards": len(payloads),
+        "runs": num_runs,
+        "seconds": seconds,
+        "runs_per_sec": num_runs / seconds if seconds else None,
+        "alloc_peak_bytes": alloc_peak,
+        "rss_peak_kb": rss_after,
+        "rss_growth_kb": rss_after - rss_before,
+    }
+
+
+def _measure_in_child(queue, case: str, corpus: str) -> None:
+    """Process target of measure_isolated."""
+    queue.put(measure_case(case, corpus))
+
+
+def measure_isolated(case: str, corpus: str) -> dict:
+    """Runs measure_case in a fresh process (for a clean RSS reading)."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure_in_child, args=(queue, case, corpus))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except queue_module.Empty:
+            if not process.is_alive():
+                raise RuntimeError("%s on %s crashed" % (case, corpus))
+    process.join()
+    return result
+
+
+def get_environment() -> dict:
+    """Returns versions the results were measured with."""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        )
+        commit = commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": multiprocessing.cpu_count(),
+    }
+
+
+def compare(results: List[dict], baseline: dict, threshold: float) -> bool:
+    """Prints runs/sec change vs baseline; returns False if any case regressed."""
+    old = {(r["case"], r["corpus"]): r for r in baseline["results"]}
+    ok = True
+    print("\nvs %s (%s):" % (baseline["label"], baseline["git_commit"]))
+    for result in results:
+        previous = old.get((result["case"], result["corpus"]))
+        if previous is None or not previous["runs_per_sec"]:
+            continue
+        change = result["runs_per_sec"] / previous["runs_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            ok = False
+        print(
+            "%-24s %-16s %+7.1f%%%s"
+            % (result["case"], result["corpus"], change * 100, flag)
+        )
+    return ok
+
+
+def main() -> None:
+    """Runs the selected cases on the selected corpora and saves results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--case", action="append", help="case name or prefix")
+    parser.add_argument("--corpus", action="append", help="corpus name")
+    parser.add_argument("--label", help="results name (default: git commit)")
+    parser.add_argument("--compare", help="results json to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="runs/sec drop that counts as a regression (default: 0.1)",
+    )
+    args = parser.parse_args()
+    cases = [
+        case
+        for case in CASES
+        if not args.case or any(case.startswith(name) for name in args.case)
+    ]
+    corpora = args.corpus if args.corpus else get_corpus_names()
+    environment = get_environment()
+    label = args.label or environment["git_commit"] or "results"
+
+    results = []
+    for corpus in corpora:
+        for case in cases:
+            result = measure_isolated(case, corpus)
+            results.append(result)
+            print(
+                "%-24s %-16s %10.0f runs/sec %8.2f MB alloc %8.1f MB rss"
+                % (
+                    case,
+                    corpus,
+                    result["runs_per_sec"],
+                    result["alloc_peak_bytes"] / 1e6,
+                    result["rss_peak_kb"] / 1024,
+                )
+            )
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results_fp = os.path.join(RESULTS_DIR, "%s.json" % label)
+    saved = {
+        "label": label,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    saved.update(environment)
+    with open(results_fp, "w") as file_:
+        json.dump(saved, file_, indent=1)
+    print("Saved results to %s" % results_fp)
+    if args.compare:
+        with open(args.compare) as file_:
+            baseline = json.load(file_)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
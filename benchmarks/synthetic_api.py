@@ -0,0 +1,602 @@
+"""Synthetic stand-in for the Blizzard game data API, for scale testing.
+
+SyntheticApi answers every call the pipeline makes (connected realms,
+periods, specs, dungeons, mythic+ leaderboards) with schema-faithful
+json, generated from a seed. The shape follows the live data:
+
+    - specs, roles and dungeon timers come from utils (REGISTRY)
+    - realms are skewed in activity: big realms fill all 500 leaderboard
+      slots, small ones have a few hundred runs
+    - groups are 1 tank, 1 healer and 3 dps, picked by per-role spec
+      popularity; players come from per-realm character pools, so the
+      same characters show up in many runs
+    - a share of groups mixes players of 2-3 connected realms, and such a
+      run is on the leaderboard of each of them (cross-realm copies)
+    - key levels peak in the mid teens, durations scatter around the
+      dungeon timer and get slower with the level
+
+scale multiplies the number of connected realms per region, so
+scale=10 is about 10x the leaderboard calls (and runs) of a live cycle.
+
+Usage (from the repo root):
+
+    # serve on localhost (scale 10), point the callers at it
+    python benchmarks/synthetic_api.py serve --scale 10 --port 8000
+    blizz_api.UrlFactory.base_url = "http://127.0.0.1:8000"
+
+    # or write the leaderboards to files (ex: for benchmarks/fixtures.py)
+    python benchmarks/synthetic_api.py write --region us --dungeon 375
+
+    # full LeaderboardScheduler sweep against a local server
+    python benchmarks/synthetic_api.py sweep --scale 10
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from itertools import accumulate
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import utils  # noqa: E402
+
+WEEK_MS = 7 * 24 * 3600 * 1000
+# a period (weekly reset) start, periods are counted from here
+EPOCH_PERIOD = 800
+EPOCH_PERIOD_START = 1615302000000  # 2021-03-09 15:00 UTC
+# connected realms per region in the live API (roughly)
+REALM_COUNTS = {"us": 122, "eu": 108, "kr": 11, "tw": 11}
+REGION_IDS = {"us": 1, "kr": 2, "eu": 3, "tw": 4}
+FACTIONS = ["ALLIANCE", "HORDE"]
+# fmt: off
+SYLLABLES = [
+    "ar", "bel", "cor", "dra", "el", "fen", "gor", "hal", "is", "jor",
+    "ka", "lor", "mi", "nar", "or", "pel", "qua", "ros", "sil", "tor",
+    "ul", "val", "wyn", "xe", "yl", "zu", "ë", "ø",
+]
+# fmt: on
+
+
+def get_period_start(period: int) -> int:
+    """Returns start timestamp (ms) of period."""
+    return EPOCH_PERIOD_START + (period - EPOCH_PERIOD) * WEEK_MS
+
+
+def get_current_period() -> int:
+    """Returns the period that is running now."""
+    return EPOCH_PERIOD + (int(time.time() * 1000) - EPOCH_PERIOD_START) // WEEK_MS
+
+
+class SyntheticApi:
+    """Deterministic generator of game data API responses.
+
+    Attributes
+    ----------
+        seed : int
+            same seed (and arguments), same responses
+        scale : float
+            connected realms per region, relative to the live API
+        dungeons : List[int]
+            dungeons of the season (default: the last 8 in utils timers)
+        runs_per_leaderboard : int
+            leaderboard size (500 in the live API)
+        top_realm_runs : int
+            runs per dungeon and period on the most active realm;
+            the n-th most active realm has top_realm_runs / sqrt(n)
+        cross_realm_rate : float
+            share of groups with players from more than one realm
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        scale: float = 1.0,
+        dungeons: Optional[List[int]] = None,
+        current_period: Optional[int] = None,
+    ) -> None:
+        """Inits with seed, scale and season dungeons."""
+        self.seed = seed
+        self.scale = scale
+        if not dungeons:
+            dungeons = sorted(utils.REGISTRY.dungeon_timers)[-8:]
+        self.dungeons = dungeons
+        self.current_period = current_period or get_current_period()
+        self.runs_per_leaderboard = 500
+        self.top_realm_runs = 1500
+        self.cross_realm_rate = 0.35
+        self._realms = self._make_realms()
+        self._realm_weights = {
+            region: list(accumulate(realm["activity"] for realm in realms))
+            for region, realms in self._realms.items()
+        }
+        self._spec_weights = self._make_spec_weights()
+        # json entries shared by many runs, made once
+        self._characters = {}  # connected realm -> character pool
+        self._spec_entries = {}  # (region, spec) -> specialization entry
+        self._leaderboards = OrderedDict()  # (region, dungeon, period) -> boards
+        self._lock = threading.Lock()
+
+    def _random(self, *key) -> random.Random:
+        """Returns random generator seeded by seed and key."""
+        digest = hashlib.md5(repr((self.seed,) + key).encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _make_realms(self) -> Dict[str, List[dict]]:
+        """Returns connected realms of each region, most active first."""
+        rnd = self._random("realms")
+        counts = {
+            region: max(1, int(round(count * self.scale)))
+            for region, count in REALM_COUNTS.items()
+        }
+        total = sum(counts.values())
+        ids = rnd.sample(range(1, 20 * total + 100), total)
+        realms = {}
+        realm_id = 0
+        for region, count in counts.items():
+            realms[region] = []
+            for rank in range(count):
+                connected_id = ids.pop()
+                members = []
+                for _ in range(rnd.choice([1, 1, 2, 3])):
+                    realm_id += 1
+                    name = "".join(rnd.choice(SYLLABLES) for _ in range(3)).title()
+                    members.append({"id": realm_id, "name": name})
+                realms[region].append(
+                    {
+                        "id": connected_id,
+                        "realms": members,
+                        "activity": 1 / (rank + 1) ** 0.5,
+                        "timezone": rnd.choice(
+                            ["America/Chicago", "Europe/Paris", "Asia/Seoul"]
+                        ),
+                    }
+                )
+        return realms
+
+    def _make_spec_weights(self) -> Dict[str, Tuple[list, list]]:
+        """Returns (spec ids, cumulative popularity weights) of each role."""
+        rnd = self._random("specs")
+        weights = {}
+        for role in ["tank", "healer", "dps"]:
+            if role == "dps":
+                spec_ids = list(utils.REGISTRY.spec_ids_by_role.get("mdps", ()))
+                spec_ids += list(utils.REGISTRY.spec_ids_by_role.get("rdps", ()))
+            else:
+                spec_ids = list(utils.REGISTRY.spec_ids_by_role.get(role, ()))
+            rnd.shuffle(spec_ids)
+            # a few popular specs, a long tail of rare ones
+            ranks = range(1, len(spec_ids) + 1)
+            cum_weights = list(accumulate(1 / rank for rank in ranks))
+            weights[role] = (spec_ids, cum_weights)
+        return weights
+
+    def _get_characters(self, region: str, connected_realm: dict) -> List[dict]:
+        """Returns 'profile' entries of the characters of connected realm."""
+        key = connected_realm["id"]
+        if key not in self._characters:
+            rnd = self._random("characters", key)
+            size = max(20, int(self.top_realm_runs * connected_realm["activity"]))
+            characters = []
+            for _ in range(size):
+                realm = rnd.choice(connected_realm["realms"])
+                name = "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+                characters.append(
+                    {
+                        "name": name[:12].title(),
+                        "id": rnd.randint(10 ** 7, 3 * 10 ** 8),
+                        "realm": {
+                            "key": {"href": self._href(region, "realm/%(id)d" % realm)},
+                            "id": realm["id"],
+                            "slug": realm["name"].lower(),
+                        },
+                    }
+                )
+            self._characters[key] = characters
+        return self._characters[key]
+
+    def _get_spec_entry(self, region: str, spec_id: int) -> dict:
+        """Returns 'specialization' entry of a member (shared between runs)."""
+        key = (region, spec_id)
+        if key not in self._spec_entries:
+            endpoint = "playable-specialization/%d" % spec_id
+            self._spec_entries[key] = {
+                "key": {"href": self._href(region, endpoint, "static")},
+                "id": spec_id,
+            }
+        return self._spec_entries[key]
+
+    def _make_group(
+        self, rnd: random.Random, region: str, home: int, dungeon: int, period: int
+    ) -> Tuple[dict, set]:
+        """Returns a 'leading_groups' entry and the connected realms it is on."""
+        realms = self._realms[region]
+        home_realm = realms[home]
+        guests = []
+        if rnd.random() < self.cross_realm_rate:
+            guests = rnd.choices(
+                realms,
+                cum_weights=self._realm_weights[region],
+                k=rnd.choice([1, 1, 2]),
+            )
+        specs = []
+        for role, k in [("tank", 1), ("healer", 1), ("dps", 3)]:
+            spec_ids, cum_weights = self._spec_weights[role]
+            specs.extend(rnd.choices(spec_ids, cum_weights=cum_weights, k=k))
+        faction = {"type": rnd.choice(FACTIONS)}
+        members = []
+        on_realms = set()
+        for slot, spec_id in enumerate(specs):
+            # home realm players fill the group, guests take the last slots
+            connected_realm = home_realm
+            if guests and slot >= 5 - len(guests):
+                connected_realm = guests[slot - 5 + len(guests)]
+            on_realms.add(connected_realm["id"])
+            characters = self._get_characters(region, connected_realm)
+            members.append(
+                {
+                    "profile": rnd.choice(characters),
+                    "faction": faction,
+                    "specialization": self._get_spec_entry(region, spec_id),
+                }
+            )
+        level = 2 + int(rnd.betavariate(4, 3) * 26)
+        ratio = max(0.55, min(1.6, rnd.gauss(0.92, 0.12) + (level - 15) * 0.01))
+        timer = utils.REGISTRY.dungeon_timers.get(dungeon, 1800000)
+        group = {
+            "ranking": 0,
+            "duration": int(timer * ratio),
+            "completed_timestamp": get_period_start(period) + rnd.randrange(WEEK_MS),
+            "keystone_level": level,
+            "members": members,
+        }
+        return group, on_realms
+
+    def _make_leaderboards(
+        self, region: str, dungeon: int, period: int
+    ) -> Dict[int, List[dict]]:
+        """Returns ranked 'leading_groups' of every connected realm."""
+        rnd = self._random("runs", region, dungeon, period)
+        boards = {realm["id"]: [] for realm in self._realms[region]}
+        for home, realm in enumerate(self._realms[region]):
+            num_runs = max(1, int(self.top_realm_runs * realm["activity"]))
+            for _ in range(num_runs):
+                group, on_realms = self._make_group(rnd, region, home, dungeon, period)
+                for realm_id in on_realms:
+                    boards[realm_id].append(group)
+        for realm_id, groups in boards.items():
+            groups.sort(key=lambda g: (-g["keystone_level"], g["duration"]))
+            del groups[self.runs_per_leaderboard :]
+        return boards
+
+    def _get_leaderboards(self, region: str, dungeon: int, period: int) -> dict:
+        """Returns _make_leaderboards output, keeping the last few in memory."""
+        key = (region, dungeon, period)
+        with self._lock:
+            if key not in self._leaderboards:
+                self._leaderboards[key] = self._make_leaderboards(*key)
+                while len(self._leaderboards) > 4:
+                    self._leaderboards.popitem(last=False)
+            return self._leaderboards[key]
+
+    @staticmethod
+    def _href(region: str, endpoint: str, namespace: str = "dynamic") -> str:
+        """Returns Blizzard's link to endpoint."""
+        return "https://%s.api.blizzard.com/data/wow/%s?namespace=%s-%s" % (
+            region,
+            endpoint,
+            namespace,
+            region,
+        )
+
+    def get_realm_ids(self, region: str) -> List[int]:
+        """Returns connected realm ids of region."""
+        return [realm["id"] for realm in self._realms[region]]
+
+    def get_leaderboard(
+        self, region: str, realm_id: int, dungeon: int, period: int
+    ) -> Optional[dict]:
+        """Returns mythic-leaderboard json, None if there is no such realm."""
+        if realm_id not in self.get_realm_ids(region):
+            return None
+        groups = []
+        for rank, group in enumerate(
+            self._get_leaderboards(region, dungeon, period)[realm_id]
+        ):
+            group = dict(group, ranking=rank + 1)
+            groups.append(group)
+        rnd = self._random("affixes", period)
+        affixes = [9 + period % 2] + rnd.sample([6, 7, 8, 11, 12, 13, 14], 2) + [128]
+        endpoint = "connected-realm/%d/mythic-leaderboard/%d/period/%d" % (
+            realm_id,
+            dungeon,
+            period,
+        )
+        return {
+            "_links": {"self": {"href": self._href(region, endpoint)}},
+            "map": {"name": "Dungeon %d" % dungeon, "id": 2000 + dungeon},
+            "period": period,
+            "period_start_timestamp": get_period_start(period),
+            "period_end_timestamp": get_period_start(period + 1),
+            "connected_realm": {
+                "href": self._href(region, "connected-realm/%d" % realm_id)
+            },
+            "leading_groups": groups,
+            "keystone_affixes": [
+                {
+                    "keystone_affix": {
+                        "key": {"href": self._href(region, "keystone-affix/%d" % id_)},
+                        "name": "Affix %d" % id_,
+                        "id": id_,
+                    },
+                    "starting_level": 2 + 3 * index,
+                }
+                for index, id_ in enumerate(affixes)
+            ],
+            "map_challenge_mode_id": dungeon,
+            "name": "Dungeon %d" % dungeon,
+        }
+
+    def get_connected_realm(self, region: str, realm_id: int) -> Optional[dict]:
+        """Returns connected-realm json, None if there is no such realm."""
+        for connected_realm in self._realms[region]:
+            if connected_realm["id"] == realm_id:
+                break
+        else:
+            return None
+        href = self._href(region, "connected-realm/%d" % realm_id)
+        return {
+            "id": realm_id,
+            "realms": [
+                {
+                    "id": realm["id"],
+                    "region": {"id": REGION_IDS[region]},
+                    "connected_realm": {"href": href},
+                    "name": realm["name"],
+                    "timezone": connected_realm["timezone"],
+                    "slug": realm["name"].lower(),
+                    "locale": "enUS" if region in ("us", "eu") else "koKR",
+                }
+                for realm in connected_realm["realms"]
+            ],
+        }
+
+    def get_response(self, url: str) -> Optional[dict]:
+        """Returns json the API would answer url with, None for a 404."""
+        parts = urlsplit(url)
+        path = re.sub("/+", "/", parts.path).rstrip("/")
+        namespace = parse_qs(parts.query).get("namespace", ["dynamic-us"])[0]
+        region = namespace.rsplit("-", 1)[-1]
+        if region not in self._realms:
+            return None
+        match = re.search(
+            r"connected-realm/(\d+)/mythic-leaderboard/(\d+)/period/(\d+)$", path
+        )
+        if match:
+            return self.get_leaderboard(region, *map(int, match.groups()))
+        if path.endswith("connected-realm/index"):
+            return {
+                "connected_realms": [
+                    {"href": self._href(region, "connected-realm/%d" % realm_id)}
+                    for realm_id in self.get_realm_ids(region)
+                ]
+            }
+        match = re.search(r"connected-realm/(\d+)$", path)
+        if match:
+            return self.get_connected_realm(region, int(match.group(1)))
+        if path.endswith("mythic-keystone/period/index"):
+            return {
+                "periods": [{"id": p} for p in range(641, self.current_period + 1)],
+                "current_period": {"id": self.current_period},
+            }
+        match = re.search(r"mythic-keystone/period/(\d+)$", path)
+        if match:
+            period = int(match.group(1))
+            return {
+                "id": period,
+                "start_timestamp": get_period_start(period),
+                "end_timestamp": get_period_start(period + 1),
+            }
+        if path.endswith("mythic-keystone/dungeon/index"):
+            return {
+                "dungeons": [
+                    {"name": "Dungeon %d" % dungeon, "id": dungeon}
+                    for dungeon in self.dungeons
+                ]
+            }
+        if path.endswith("playable-specialization/index"):
+            return {
+                "character_specializations": [
+                    {"name": spec["spec_name"].title(), "id": spec["spec_id"]}
+                    for spec in utils.REGISTRY.specs
+                ]
+            }
+        match = re.search(r"playable-specialization/(\d+)$", path)
+        if match:
+            spec = utils.REGISTRY.spec_by_id.get(int(match.group(1)))
+            if spec is None:
+                return None
+            role = spec["role"].upper()
+            if spec["role"] in ("mdps", "rdps"):
+                role = "DAMAGE"
+            return {
+                "id": spec["spec_id"],
+                "name": spec["spec_name"].title(),
+                "playable_class": {
+                    "name": spec["class_name"].title(),
+                    "id": spec["class_id"],
+                },
+                "role": {"type": role},
+            }
+        return None
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(
+    api: SyntheticApi, host: str = "127.0.0.1", port: int = 8000
+) -> HTTPServer:
+    """Starts serving api on a background thread, returns the server.
+
+    Responses carry an ETag, and If-None-Match gets a 304, like the
+    live API.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            response = api.get_response(self.path)
+            if response is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = json.dumps(response).encode()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json;charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = _ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_leaderboards(
+    api: SyntheticApi, region: str, dungeon: int, period: int, directory: str
+) -> int:
+    """Writes leaderboard of every realm of region as directory/<realm>.json.
+
+    The layout is the one benchmarks/fixtures.py reads corpora in.
+    Returns number of runs written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    num_runs = 0
+    for realm_id in api.get_realm_ids(region):
+        leaderboard = api.get_leaderboard(region, realm_id, dungeon, period)
+        num_runs += len(leaderboard["leading_groups"])
+        with open(os.path.join(directory, "%d.json" % realm_id), "w") as file_:
+            json.dump(leaderboard, file_)
+    return num_runs
+
+
+def _serve_forever(seed: int, scale: float, port: int) -> None:
+    """Process target: serves a SyntheticApi until killed."""
+    serve(SyntheticApi(seed, scale), port=port)
+    while True:
+        time.sleep(3600)
+
+
+def sweep(seed: int = 0, scale: float = 1.0, port: int = 8765, workers: int = 20):
+    """Runs a LeaderboardScheduler cycle against a local synthetic server.
+
+    The server runs in its own process, so it doesn't share the GIL with
+    the client. Rate limits are lifted and metadata isn't cached on disk.
+    """
+    import blizz_api
+    import blizz_http
+
+    context = multiprocessing.get_context("spawn")
+    server = context.Process(target=_serve_forever, args=(seed, scale, port))
+    server.daemon = True
+    server.start()
+    blizz_api.UrlFactory.base_url = "http://127.0.0.1:%d" % port
+    blizz_api.Caller._default_metadata_cache_fp = None
+    try:
+        pool = blizz_http.SessionPool(
+            pool_size=workers, limiter=blizz_http.RateLimiter(10 ** 6, 10 ** 9)
+        )
+        for _ in range(100):  # wait for the server to come up
+            try:
+                pool.get("http://127.0.0.1:%d/" % port)
+                break
+            except Exception:
+                time.sleep(0.1)
+        caller = blizz_api.Caller("synthetic", pool=pool)
+        dungeons = [dungeon["id"] for dungeon in caller.get_dungeons()]
+        periods = {region: caller.get_current_period(region) for region in REALM_COUNTS}
+        scheduler = blizz_api.LeaderboardScheduler("synthetic", pool=pool)
+        scheduler.workers = workers
+        start = time.time()
+        num_runs = 0
+        for region, dungeon, runs, rosters, report in scheduler.iter_groups(
+            periods, dungeons
+        ):
+            num_runs += len(runs)
+        seconds = time.time() - start
+        print("Leaderboard calls: %s" % scheduler.report)
+        print(
+            "%d unique runs in %.1f sec (%.0f runs/sec, %.0f calls/sec), "
+            "%d cross-realm copies skipped"
+            % (
+                num_runs,
+                seconds,
+                num_runs / seconds,
+                scheduler.report.requested / seconds,
+                sum(scheduler.duplicates_skipped.values()),
+            )
+        )
+        pool.close()
+    finally:
+        server.terminate()
+
+
+def main() -> None:
+    """Command line: serve, write or sweep."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["serve", "write", "sweep"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--region", default="us")
+    parser.add_argument("--dungeon", type=int, action="append")
+    parser.add_argument("--period", type=int)
+    parser.add_argument(
+        "--out",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpora"),
+    )
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(SyntheticApi(args.seed, args.scale), port=args.port)
+        print("Serving on http://127.0.0.1:%d (ctrl-c to stop)" % args.port)
+        while True:
+            time.sleep(3600)
+    elif args.command == "write":
+        api = SyntheticApi(args.seed, args.scale)
+        period = args.period if args.period else api.current_period
+        for dungeon in args.dungeon if args.dungeon else api.dungeons:
+            name = "generated/%s-%d-%d" % (args.region, dungeon, period)
+            directory = os.path.join(args.out, name)
+            num_runs = write_leaderboards(api, args.region, dungeon, period, directory)
+            print("Wrote %d runs to %s" % (num_runs, directory))
+    else:
+        sweep(args.seed, args.scale, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
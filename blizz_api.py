@@ -8,6 +8,7 @@ Usage example:
 
     import blizz_api
 
+    # calls share the process-wide blizz_http session pool by default
     batch_caller = blizz_api.BatchCaller(api_token)
     batch_caller.region = "us"
     batch_caller.dungeon = 244
@@ -15,14 +16,30 @@ Usage example:
     batch_caller.workers = 5
     runs, rosters = batch_caller.get_data()
 
+    # same contract, but every realm call is its own coroutine
+    async_caller = blizz_api.AsyncBatchCaller(api_token)
+    async_caller.region = "us"
+    async_caller.dungeon = 244
+    async_caller.period = 744
+    async_caller.workers = 200  # requests in flight
+    runs, rosters = async_caller.get_data()
+
 """
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from json import JSONDecodeError
-from typing import Generator, List, Optional, Tuple, Type
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from collections import Counter, defaultdict
+from typing import Any, Dict, Generator, List, Optional, Tuple, Type
 
+import aiohttp
 import requests
 
 import blizz_credentials
+import blizz_http
 import blizz_parser
 
 
@@ -33,7 +50,17 @@ def _isvalid(region: str) -> bool:
 
 
 class UrlFactory:
-    """API url call constructor."""
+    """API url call constructor.
+
+    Attributes
+    ----------
+        base_url : str, optional
+            class-wide; if set (ex: "http://127.0.0.1:8000"), calls go to
+            this server instead of Blizzard's regional hosts, ex: a stand-in
+            server for scale tests (default None)
+    """
+
+    base_url = None  # type: Optional[str]
 
     def __init__(self, access_token: str, region: str) -> None:
         """Inits with API access token and region id.
@@ -70,6 +97,8 @@ class UrlFactory:
             locale=self.locale,
             token=self.access_token,
         )
+        if self.base_url:
+            call_url = call_url.replace("https://" + self.host, self.base_url, 1)
         return call_url
 
     def get_connected_realm_index_url(self) -> str:
@@ -140,27 +169,208 @@ class UrlFactory:
         return call_url
 
 
+class MetadataCache:
+    """TTL cache for slowly-changing API metadata, in memory and on disk.
+
+    Entries are keyed by tuples (endpoint name, *call args) and expire at
+    an absolute unix time, or never. Updates are snapshotted to a json
+    file (if the file's directory exists), so a fresh process starts warm;
+    bulk updates set entries with save=False and save once at the end.
+
+    Attributes
+    ----------
+        file_path : str, optional
+            json snapshot the cache is loaded from and saved to
+    """
+
+    def __init__(self, file_path: Optional[str] = None) -> None:
+        """Inits with optional snapshot file; loads it if it exists."""
+        self.file_path = file_path
+        self._entries = {}
+        self._dirty = False  # entries changed since the last save
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        if file_path and os.path.exists(file_path):
+            self.load()
+
+    @staticmethod
+    def _encode_key(key: tuple) -> str:
+        """Converts key tuple into json-friendly string."""
+        return "/".join(str(k) for k in key)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        """Returns copy of cached value, None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(self._encode_key(key))
+        if entry is None:
+            return None
+        if entry["expires_at"] is not None and entry["expires_at"] <= time.time():
+            return None
+        # callers are free to mutate what they get back
+        return copy.deepcopy(entry["value"])
+
+    def set(
+        self,
+        key: tuple,
+        value: Any,
+        ttl: Optional[float] = None,
+        expires_at: Optional[float] = None,
+        save: bool = True,
+    ) -> None:
+        """Caches json-serializable value.
+
+        Parameters
+        ----------
+        key : tuple
+            (endpoint name, *call args)
+        value
+            value to cache
+        ttl : float, optional
+            seconds until the entry expires
+        expires_at : float, optional
+            unix time the entry expires at (wins over ttl); if neither is
+            given, the entry never expires
+        save : bool
+            snapshot the cache right away; pass False when setting many
+            entries, and call save() after the last one
+        """
+        if expires_at is None and ttl is not None:
+            expires_at = time.time() + ttl
+        with self._lock:
+            self._entries[self._encode_key(key)] = {
+                "value": copy.deepcopy(value),
+                "expires_at": expires_at,
+            }
+            self._dirty = True
+        if save:
+            self.save()
+
+    def clear(self) -> None:
+        """Drops all entries."""
+        with self._lock:
+            self._entries = {}
+            self._dirty = True
+        self.save()
+
+    def load(self) -> None:
+        """Loads entries from the json snapshot, skipping expired ones."""
+        with open(self.file_path) as file_:
+            entries = json.load(file_)
+        now = time.time()
+        entries = {
+            key: entry
+            for key, entry in entries.items()
+            if entry["expires_at"] is None or entry["expires_at"] > now
+        }
+        with self._lock:
+            self._entries = entries
+            self._dirty = False
+
+    def save(self) -> None:
+        """Saves entries to the json snapshot, if they changed since last save.
+
+        Skipped if there is no file path, or its directory doesn't exist
+        (ex: running from outside the repo root). The file is written
+        outside the entry lock, so get/set don't wait on it.
+        """
+        if not self.file_path:
+            return
+        directory = os.path.dirname(self.file_path)
+        if directory and not os.path.isdir(directory):
+            return
+        with self._file_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = dict(self._entries)
+                self._dirty = False
+            temp_path = "%s.%d.tmp" % (self.file_path, os.getpid())
+            try:
+                with open(temp_path, "w") as file_:
+                    json.dump(entries, file_)
+                os.replace(temp_path, self.file_path)
+            except Exception:
+                with self._lock:
+                    self._dirty = True  # next save tries again
+                raise
+
+
+_default_metadata_cache = None  # type: Optional[MetadataCache]
+_default_metadata_cache_lock = threading.Lock()
+
+
+def get_default_metadata_cache() -> MetadataCache:
+    """Returns process-wide metadata cache, creating it on first use."""
+    global _default_metadata_cache
+    with _default_metadata_cache_lock:
+        if _default_metadata_cache is None:
+            _default_metadata_cache = MetadataCache(Caller._default_metadata_cache_fp)
+        return _default_metadata_cache
+
+
+def get_default_access_token() -> str:
+    """Returns current token of the process-wide (auto-refreshed) credentials."""
+    auth = blizz_credentials.get_credentials(Caller._default_access_token_fp)
+    return auth.access_token
+
+
 class Caller:
-    """Abstracts API interactions into a high-level interface."""
+    """Abstracts API interactions into a high-level interface.
+
+    Metadata calls (specs, periods, dungeons, realms) are answered from
+    a MetadataCache when possible. Period entries expire when the period
+    ends, the rest after the TTLs in _metadata_ttls.
+
+    Attributes
+    ----------
+        workers : int
+            number of threads for metadata sweeps (get_connected_realms,
+            get_class_spec_table), keep it <= pool.pool_size (default 10)
+    """
 
     _default_access_token_fp = "config/blizzard_api_access.ini"
+    _default_metadata_cache_fp = "data/metadata_cache.json"
+    _metadata_ttls = {  # seconds
+        "spec_ids": 7 * 24 * 3600,
+        "spec": 7 * 24 * 3600,
+        "dungeons": 24 * 3600,
+        "connected_realm_ids": 24 * 3600,
+        "connected_realm": 24 * 3600,
+    }
 
-    def __init__(self, access_token: Optional[str] = None) -> None:
-        """Inits wtih access token. If token not given, tries to get one."""
-        if not access_token:
-            auth = blizz_credentials.Credentials(self._default_access_token_fp)
-            access_token = auth.access_token
-        self.access_token = access_token
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        pool: Optional[blizz_http.SessionPool] = None,
+        cache: Optional[MetadataCache] = None,
+    ) -> None:
+        """Inits wtih access token. If token not given, tries to get one.
+
+        Without a token, the caller uses the process-wide credentials,
+        which are cached on disk and refreshed before they expire.
+        Calls go through pool (process-wide pool if not given), metadata
+        is cached in cache (process-wide cache if not given).
+        """
+        self.pool = pool if pool else blizz_http.get_default_pool()
+        self.cache = cache if cache else get_default_metadata_cache()
+        self.workers = 10
+        self._access_token = access_token
         if not self.access_token:
             raise ValueError(
                 """Caller needs a valid access token
                 to query Blizzard API"""
             )
 
-    @staticmethod
-    def _send_request(call_url) -> requests.Response:
+    @property
+    def access_token(self) -> str:
+        """Token given on init, or current token of the shared credentials."""
+        if self._access_token:
+            return self._access_token
+        return get_default_access_token()
+
+    def _send_request(self, call_url) -> requests.Response:
         """Sends URL request to Blizzard API."""
-        response = requests.get(call_url)
+        response = self.pool.get(call_url)
         response.raise_for_status()  # catches 4xx and 5xx codes
         if response.status_code != 200:  # if something non-obvious happened
             raise Exception(
@@ -169,32 +379,97 @@ class Caller:
             )
         return response
 
+    def _sweep(self, calls: List[Tuple[tuple, str]], parse) -> tuple:
+        """Fetches many metadata calls in parallel, skipping cached ones.
+
+        Parameters
+        ----------
+        calls : list
+            (cache key, call URL) of each call, key is (endpoint name, *args)
+        parse : callable
+            turns response json into the value to cache
+
+        Returns
+        -------
+            values
+                parsed value per call, in call order; None if the call failed
+            report
+                blizz_http.FetchReport of the calls that were sent
+        """
+        values = [self.cache.get(key) for key, _ in calls]
+        missing = [index for index, value in enumerate(values) if value is None]
+        responses, report = _multi_threaded_call(
+            [calls[index] for index in missing], self.workers, self.pool
+        )
+        for index, response in zip(missing, responses):
+            if response is None:  # failed for good, already in the report
+                continue
+            key = calls[index][0]
+            values[index] = parse(response.json())
+            self.cache.set(
+                key, values[index], ttl=self._metadata_ttls[key[0]], save=False
+            )
+        # one snapshot for the whole sweep
+        self.cache.save()
+        return values, report
+
     def get_spec_ids(self) -> List[dict]:
         """Gets list of spec ids and names."""
+        key = ("spec_ids",)
+        specs = self.cache.get(key)
+        if specs is not None:
+            return specs
         region = "us"
         url_factory = UrlFactory(self.access_token, region)
         url = url_factory.get_spec_index_url()
         response = self._send_request(url)
         json = response.json()
         specs = blizz_parser.parse_spec_index_json(json)
+        self.cache.set(key, specs, ttl=self._metadata_ttls["spec_ids"])
         return specs
 
     def get_spec_by_id(self, spec_id: int) -> dict:
         """Gets full spec info given spec id."""
+        key = ("spec", spec_id)
+        spec_info = self.cache.get(key)
+        if spec_info is not None:
+            return spec_info
         region = "us"
         url_factory = UrlFactory(self.access_token, region)
         url = url_factory.get_spec_url(spec_id)
         response = self._send_request(url)
         spec_info = blizz_parser.parse_spec_json(response.json())
+        self.cache.set(key, spec_info, ttl=self._metadata_ttls["spec"])
         return spec_info
 
-    def get_class_spec_table(self) -> List[dict]:
-        """Gets table of playable classes and specs."""
-        class_spec_table = []
+    def get_class_spec_table(self, with_report: bool = False):
+        """Gets table of playable classes and specs.
+
+        Specs are fetched in parallel; specs whose call failed are left
+        out of the table.
+
+        Parameters
+        ----------
+        with_report : bool
+            also return blizz_http.FetchReport of the spec calls
+
+        Returns
+        -------
+            class_spec_table
+                spec info dicts, in spec index order
+            report
+                only if with_report
+        """
         specs = self.get_spec_ids()
-        for spec in specs:
-            spec_info = self.get_spec_by_id(spec["spec_id"])
-            class_spec_table.append(spec_info)
+        url_factory = UrlFactory(self.access_token, "us")
+        calls = [
+            (("spec", spec["spec_id"]), url_factory.get_spec_url(spec["spec_id"]))
+            for spec in specs
+        ]
+        spec_infos, report = self._sweep(calls, blizz_parser.parse_spec_json)
+        class_spec_table = [info for info in spec_infos if info is not None]
+        if with_report:
+            return class_spec_table, report
         return class_spec_table
 
     def get_leaderboard(
@@ -210,11 +485,20 @@ class Caller:
         return leaderboard
 
     def get_period_ids(self, region: str) -> List[int]:
-        """Gets list of m+ period ids for region."""
+        """Gets list of m+ period ids for region.
+
+        Cached until the current (latest) period ends.
+        """
+        key = ("period_ids", region)
+        periods = self.cache.get(key)
+        if periods is not None:
+            return periods
         url_factory = UrlFactory(self.access_token, region)
         period_index_url = url_factory.get_timeperiod_index_url()
-        response = requests.get(period_index_url)
+        response = self.pool.get(period_index_url)
         periods = blizz_parser.parse_timeperiod_index_json(response.json())
+        _, end = self.get_period_startend(region, max(periods))
+        self.cache.set(key, periods, expires_at=end / 1000)
         return periods
 
     def get_current_period(self, region: str) -> int:
@@ -224,11 +508,21 @@ class Caller:
         return current_period
 
     def get_period_startend(self, region: str, period: int) -> Tuple[int, int]:
-        """Gets start and end timestamp for period."""
+        """Gets start and end timestamp for period.
+
+        Cached until the period ends; periods that are over never change,
+        so they are cached for good.
+        """
+        key = ("period", region, period)
+        startend = self.cache.get(key)
+        if startend is not None:
+            return tuple(startend)
         url_factory = UrlFactory(self.access_token, region)
         period_url = url_factory.get_timeperiod_url(period)
-        response = requests.get(period_url)
+        response = self.pool.get(period_url)
         start, end = blizz_parser.parse_timeperiod_json(response.json())
+        expires_at = end / 1000 if end / 1000 > time.time() else None
+        self.cache.set(key, [start, end], expires_at=expires_at)
         return start, end
 
     def get_dungeons(self) -> List[dict]:
@@ -236,41 +530,87 @@ class Caller:
 
         Warning: only returns data for current expansion.
         """
+        key = ("dungeons",)
+        dungeons = self.cache.get(key)
+        if dungeons is not None:
+            return dungeons
         url_factory = UrlFactory(self.access_token, region="us")
         dungeon_index_url = url_factory.get_dungeon_index_url()
-        response = requests.get(dungeon_index_url)
+        response = self.pool.get(dungeon_index_url)
         dungeons = blizz_parser.parse_dungeon_index_json(response.json())
+        self.cache.set(key, dungeons, ttl=self._metadata_ttls["dungeons"])
         return dungeons
 
     def get_connected_realm_ids(self, region: str) -> List[int]:
         """Gets list of connected realm ids for region."""
+        key = ("connected_realm_ids", region)
+        realm_ids = self.cache.get(key)
+        if realm_ids is not None:
+            return realm_ids
         url_factory = UrlFactory(self.access_token, region=region)
         realm_index_url = url_factory.get_connected_realm_index_url()
-        response = requests.get(realm_index_url)
+        response = self.pool.get(realm_index_url)
         realm_ids = blizz_parser.parse_connected_realm_index_json(response.json())
+        ttl = self._metadata_ttls["connected_realm_ids"]
+        self.cache.set(key, realm_ids, ttl=ttl)
         return realm_ids
 
     def get_connected_realm(self, region: str, realm_id: int) -> List[dict]:
         """Gets info for a shard given its id and region."""
+        key = ("connected_realm", region, realm_id)
+        realms_in_cluster = self.cache.get(key)
+        if realms_in_cluster is not None:
+            return realms_in_cluster
         url_factory = UrlFactory(self.access_token, region=region)
         realm_url = url_factory.get_connected_realm_url(realm_id=realm_id)
-        response = requests.get(realm_url)
+        response = self.pool.get(realm_url)
         # "connected" realms correspond to a cluster of realms
         # that used to be stand-alone but got merged; some "connected"
         # realms only contain 1 realm (never merged)
         # Anyway, this is what the line below returns a list
         realms_in_cluster = blizz_parser.parse_connected_realm_json(response.json())
+        ttl = self._metadata_ttls["connected_realm"]
+        self.cache.set(key, realms_in_cluster, ttl=ttl)
         return realms_in_cluster
 
-    def get_connected_realms(self, region: str) -> List[dict]:
-        """Gets full info for all of region's shards."""
+    def get_connected_realms(self, region: str, with_report: bool = False):
+        """Gets full info for all of region's shards.
+
+        Shards are fetched in parallel; shards whose call failed are left
+        out of the list.
+
+        Parameters
+        ----------
+        region : str
+            region one of "us", "eu", "kr", "tw"
+        with_report : bool
+            also return blizz_http.FetchReport of the shard calls
+
+        Returns
+        -------
+            realms
+                realm info dicts, in realm index order
+            report
+                only if with_report
+        """
         cluster_ids = self.get_connected_realm_ids(region=region)
-        realms = []
-        for cluster_id in cluster_ids:
-            realms_in_cluster = self.get_connected_realm(
-                region=region, realm_id=cluster_id
+        url_factory = UrlFactory(self.access_token, region=region)
+        calls = [
+            (
+                ("connected_realm", region, cluster_id),
+                url_factory.get_connected_realm_url(realm_id=cluster_id),
             )
-            realms.extend(realms_in_cluster)
+            for cluster_id in cluster_ids
+        ]
+        clusters, report = self._sweep(
+            calls, blizz_parser.parse_connected_realm_json
+        )
+        realms = []
+        for realms_in_cluster in clusters:
+            if realms_in_cluster is not None:
+                realms.extend(realms_in_cluster)
+        if with_report:
+            return realms, report
         return realms
 
 
@@ -282,7 +622,10 @@ class BatchCaller:
     Attributes
     ----------
         access_token : str
-            valid API access token
+            valid API access token (default: current token of the
+            process-wide credentials)
+        pool : blizz_http.SessionPool
+            pooled transport the calls go through (set on init)
         region : str
             region one of "us", "eu", "kr", "tw"
         dungeon : int
@@ -290,12 +633,33 @@ class BatchCaller:
         period : int
             a valid period id
         workers : int
-            number of threads to spawn (ex: 5)
+            number of threads to spawn (ex: 5), keep it <= pool.pool_size
+        validator_cache : blizz_http.ValidatorCache, optional
+            if set, leaderboards are requested with conditional GETs and
+            unchanged (304) leaderboards are skipped (default None)
+        retry_budget : blizz_http.RetryBudget
+            retries the caller may spend on failed calls; share one
+            budget between all calls of a cycle (default: 100 retries)
+        max_attempts : int
+            max number of attempts per call, first call included (ex: 4)
+        decoder : str
+            "stream" parses leaderboards with
+            blizz_parser.LeaderboardStreamParser (default), "fast" with
+            json.loads and blizz_parser.parse_leaderboard_json, "json"
+            with blizz_parser.KeyRunLeaderboard; all give the same tuples
+        duplicates_skipped : int
+            copies of runs from other realms' leaderboards that the last
+            get_data skipped
     """
 
-    def __init__(self, access_token: str) -> None:
-        """Inits with access token."""
-        self.access_token = access_token
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        pool: Optional[blizz_http.SessionPool] = None,
+    ) -> None:
+        """Inits with access token, and pool (process-wide pool if not given)."""
+        self._access_token = access_token
+        self.pool = pool if pool else blizz_http.get_default_pool()
         # these need to be set using normal attribute syntax
         # (I don't want to mess with setters - just get this done)
         # these are just some valid place holders
@@ -303,89 +667,585 @@ class BatchCaller:
         self.dungeon = 244
         self.period = 733
         self.workers = 2
+        self.validator_cache = None
+        self.retry_budget = blizz_http.RetryBudget(100)
+        self.max_attempts = 4
+        self.decoder = "stream"
+        self.duplicates_skipped = 0
 
-    def _get_leaderboard_urls(self) -> List[str]:
-        """Constructs dungeon leaderboard call URL for every realm in region."""
-        caller = Caller(self.access_token)
+    @property
+    def access_token(self) -> str:
+        """Token given on init, or current token of the shared credentials."""
+        if self._access_token:
+            return self._access_token
+        return get_default_access_token()
+
+    def _get_leaderboard_calls(self) -> List[Tuple[tuple, str]]:
+        """Constructs (cache key, call URL) of dungeon leaderboard for every realm.
+
+        The key is (region, realm, dungeon, period).
+        """
+        caller = Caller(self._access_token, pool=self.pool)
         realm_ids = caller.get_connected_realm_ids(region=self.region)
         url_factory = UrlFactory(region=self.region, access_token=self.access_token)
-        realm_urls = []
+        calls = []
         for realm_id in realm_ids:
             url = url_factory.get_mythic_plus_leaderboard_url(
                 dungeon_id=self.dungeon, realm_id=realm_id, period=self.period
             )
-            realm_urls.append(url)
-        return realm_urls
+            key = (self.region, realm_id, self.dungeon, self.period)
+            calls.append((key, url))
+        return calls
+
+    def _get_leaderboard_urls(self) -> List[str]:
+        """Constructs dungeon leaderboard call URL for every realm in region."""
+        return [url for _, url in self._get_leaderboard_calls()]
 
     @staticmethod
-    def _parse_responses(responses) -> Tuple[List[tuple], List[tuple]]:
-        """Parses jons and aggs runs and rosters into a list of unique tuples."""
-        runs = []
-        rosters = []
-        for resp in responses:
-            try:
-                leaderboard = blizz_parser.KeyRunLeaderboard(resp.json())
-                runs.extend(leaderboard.get_runs_as_tuple_list())
-                rosters.extend(leaderboard.get_rosters_as_tuple_list())
-            except JSONDecodeError as error:
-                print("Leaderboard parse error: JSONDecodeError ", error)
-            except KeyError as error:
-                print("Leaderboard parse error: KeyError", error)
-        # the same run can appear on multiple realm leaderboards, so uniq the data
+    def _parse_responses(
+        payloads: List[bytes],
+        decoder: str = "stream",
+        columnar: bool = False,
+        deduper: Optional[blizz_parser.RunDeduper] = None,
+        failed: Optional[List[int]] = None,
+    ) -> tuple:
+        """Parses jsons and aggs runs and rosters into a list of unique tuples.
+
+        Takes raw response bodies, so both the threaded and the asyncio
+        callers can feed it. decoder is "stream", "fast" or "json" (see
+        decoder attribute). If columnar, the unique runs and rosters come
+        back as blizz_parser.RUN_DTYPE/ROSTER_DTYPE structured arrays.
+
+        The same run can appear on multiple realm leaderboards; copies are
+        skipped before they are scored and counted in deduper.skipped.
+        Indexes of malformed bodies are appended to failed (if given).
+        """
+        deduper = deduper if deduper is not None else blizz_parser.RunDeduper()
+        runs, rosters = blizz_parser.parse_leaderboards(
+            payloads, decoder, deduper, failed
+        )
+        # copies that got past the fingerprints are dropped here
+        num_runs = len(runs)
         runs = list(set(runs))
         rosters = list(set(rosters))
+        deduper.skipped += num_runs - len(runs)
+        if columnar:
+            runs = blizz_parser.runs_to_array(runs)
+            rosters = blizz_parser.rosters_to_array(rosters)
         return runs, rosters
 
-    def get_data(self) -> Tuple[List[tuple], List[tuple]]:
+    def _get_retry_queue(self) -> blizz_http.RetryQueue:
+        """Creates retry queue for a batch, drawing on the shared budget."""
+        return blizz_http.RetryQueue(self.retry_budget, self.max_attempts)
+
+    def get_data(self, with_report: bool = False, columnar: bool = False) -> tuple:
         """Collects run leaderboard data from all regional realms in parallel.
 
+        Parameters
+        ----------
+            with_report : bool
+                also return the blizz_http.FetchReport of the calls
+            columnar : bool
+                return runs and rosters as numpy structured arrays
+                (blizz_parser.RUN_DTYPE/ROSTER_DTYPE), one typed column
+                per tuple field
+
         Returns
         -------
             runs
-                list of runs as list of tuples
+                list of runs as list of tuples (or structured array)
             rosters
-                list of player characters as list of tuples
+                list of player characters as list of tuples (or
+                structured array)
+            report
+                (only if with_report) which calls succeeded, were retried,
+                or failed for good
+        """
+        calls = self._get_leaderboard_calls()
+        responses, report = _multi_threaded_call(
+            calls,
+            self.workers,
+            self.pool,
+            self.validator_cache,
+            self._get_retry_queue(),
+        )
+        keys = [key for (key, _), resp in zip(calls, responses) if resp is not None]
+        payloads = [resp.content for resp in responses if resp is not None]
+        deduper = blizz_parser.RunDeduper()
+        failed = []
+        runs, rosters = self._parse_responses(
+            payloads, self.decoder, columnar, deduper, failed
+        )
+        _confirm_validators(self.validator_cache, keys, failed)
+        self.duplicates_skipped = deduper.skipped
+        if with_report:
+            return runs, rosters, report
+        return runs, rosters
+
+
+class AsyncBatchCaller(BatchCaller):
+    """Collects region-wide leaderboard for a dungeon using asyncio calls.
+
+    Same interface as BatchCaller, but every realm call is its own
+    coroutine on a single event loop. A slow realm only holds up its own
+    request, not a whole chunk of urls.
+
+    Attributes
+    ----------
+        (see BatchCaller, plus)
+        workers : int
+            max number of requests in flight to the regional host (ex: 200)
+        timeout : int
+            per-request timeout in seconds
+    """
+
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        pool: Optional[blizz_http.SessionPool] = None,
+    ) -> None:
+        """Inits with access token, and pool used for the realm index call."""
+        super().__init__(access_token, pool)
+        self.workers = 200
+        self.timeout = 5
+
+    async def get_data_async(
+        self, with_report: bool = False, columnar: bool = False
+    ) -> tuple:
+        """Coroutine version of get_data (use this inside a running loop).
+
+        In a notebook, where the event loop is already running, call
+        `runs, rosters = await async_caller.get_data_async()`.
         """
-        urls = self._get_leaderboard_urls()
-        responses = _multi_threaded_call(urls, self.workers)
-        runs, rosters = self._parse_responses(responses)
+        calls = self._get_leaderboard_calls()
+        payloads, report = await _async_multi_call(
+            calls,
+            self.workers,
+            self.timeout,
+            self.validator_cache,
+            self.pool.limiter,
+            self._get_retry_queue(),
+        )
+        keys = [key for (key, _), body in zip(calls, payloads) if body is not None]
+        payloads = [payload for payload in payloads if payload is not None]
+        deduper = blizz_parser.RunDeduper()
+        failed = []
+        runs, rosters = self._parse_responses(
+            payloads, self.decoder, columnar, deduper, failed
+        )
+        _confirm_validators(self.validator_cache, keys, failed)
+        self.duplicates_skipped = deduper.skipped
+        if with_report:
+            return runs, rosters, report
         return runs, rosters
 
+    def get_data(self, with_report: bool = False, columnar: bool = False) -> tuple:
+        """Collects run leaderboard data from all regional realms concurrently.
+
+        Parameters
+        ----------
+            with_report : bool
+                also return the blizz_http.FetchReport of the calls
+            columnar : bool
+                return runs and rosters as numpy structured arrays
+                (blizz_parser.RUN_DTYPE/ROSTER_DTYPE), one typed column
+                per tuple field
+
+        Returns
+        -------
+            runs
+                list of runs as list of tuples (or structured array)
+            rosters
+                list of player characters as list of tuples (or
+                structured array)
+            report
+                (only if with_report) which calls succeeded, were retried,
+                or failed for good
+        """
+        # asyncio.run() is 3.7+, keep 3.6 working
+        loop = asyncio.new_event_loop()
+        try:
+            data = loop.run_until_complete(
+                self.get_data_async(with_report, columnar)
+            )
+        finally:
+            loop.close()
+        return data
 
-def _multi_threaded_call(urls, num_threads) -> List[requests.Response]:
-    """Sends multiple calls to the API at once."""
 
-    # chunk the urls into pieces with 10 urls each
-    url_chunks = _divide_chunks(urls, num_threads)
+class LeaderboardScheduler:
+    """Collects leaderboards of a whole cycle through a single work queue.
+
+    Every (region, dungeon, realm) call of the cycle goes into one thread
+    pool with a single concurrency limit (workers), instead of one
+    BatchCaller run (and one thread pool barrier) per (region, dungeon).
+    A (region, dungeon) group is parsed and handed back as soon as its
+    last realm call is settled, while the other groups keep downloading.
+
+    Usage example:
+
+        scheduler = blizz_api.LeaderboardScheduler(api_token, pool=pool)
+        scheduler.workers = 20
+        periods = {"us": 775, "eu": 775}
+        for region, dungeon, runs, rosters, report in scheduler.iter_groups(
+            periods, dungeons=[244, 245]
+        ):
+            ...
+
+    Attributes
+    ----------
+        access_token : str
+            valid API access token (default: current token of the
+            process-wide credentials)
+        pool : blizz_http.SessionPool
+            pooled transport the calls go through (set on init)
+        workers : int
+            number of threads for the whole cycle, keep it <= pool.pool_size
+        validator_cache : blizz_http.ValidatorCache, optional
+            if set, unchanged (304) leaderboards are skipped (default None)
+        retry_budget : blizz_http.RetryBudget
+            retries the cycle may spend on failed calls (default: 500)
+        max_attempts : int
+            max number of attempts per call, first call included (ex: 4)
+        decoder : str
+            leaderboard decoder, "stream" (default), "fast" or "json"
+            (see BatchCaller)
+        duplicates_skipped : collections.Counter
+            copies of runs from other realms' leaderboards skipped so far,
+            per (region, dungeon)
+        report : blizz_http.FetchReport
+            report of all calls sent by iter_groups so far
+    """
+
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        pool: Optional[blizz_http.SessionPool] = None,
+    ) -> None:
+        """Inits with access token, and pool (process-wide pool if not given)."""
+        self._access_token = access_token
+        self.pool = pool if pool else blizz_http.get_default_pool()
+        self.workers = 20
+        self.validator_cache = None
+        self.retry_budget = blizz_http.RetryBudget(500)
+        self.max_attempts = 4
+        self.decoder = "stream"
+        self.duplicates_skipped = Counter()
+        self.report = blizz_http.FetchReport()
 
-    threads = []
+    @property
+    def access_token(self) -> str:
+        """Token given on init, or current token of the shared credentials."""
+        if self._access_token:
+            return self._access_token
+        return get_default_access_token()
+
+    def _get_calls(
+        self, periods: Dict[str, int], dungeons: List[int]
+    ) -> Tuple[List[Tuple[str, int]], List[Tuple[tuple, str]]]:
+        """Constructs leaderboard calls for every region/dungeon/realm.
+
+        Returns
+        -------
+            groups
+                (region, dungeon) group of each call
+            calls
+                (cache key, call URL) of each call, key is
+                (region, realm, dungeon, period)
+        """
+        caller = Caller(self._access_token, pool=self.pool)
+        groups, calls = [], []
+        for region, period in periods.items():
+            realm_ids = caller.get_connected_realm_ids(region=region)
+            url_factory = UrlFactory(region=region, access_token=self.access_token)
+            for dungeon in dungeons:
+                for realm_id in realm_ids:
+                    url = url_factory.get_mythic_plus_leaderboard_url(
+                        dungeon_id=dungeon, realm_id=realm_id, period=period
+                    )
+                    groups.append((region, dungeon))
+                    calls.append(((region, realm_id, dungeon, period), url))
+        return groups, calls
+
+    def iter_groups(
+        self, periods: Dict[str, int], dungeons: List[int]
+    ) -> Generator[
+        Tuple[str, int, List[tuple], List[tuple], blizz_http.FetchReport], None, None
+    ]:
+        """Collects leaderboards for all regions x dungeons x realms.
+
+        Parameters
+        ----------
+            periods : dict
+                period to collect for each region (ex: {"us": 775})
+            dungeons : list
+                dungeon ids to collect
+
+        Yields
+        ------
+            (region, dungeon, runs, rosters, report)
+                unique runs and rosters of a (region, dungeon) group as
+                lists of tuples (see BatchCaller.get_data), and the
+                blizz_http.FetchReport of the group's calls (retries are
+                counted in the cycle report only); groups are yielded in
+                the order they complete
+        """
+        groups, calls = self._get_calls(periods, dungeons)
+        calls_left = Counter(groups)
+        payloads = defaultdict(list)
+        keys = defaultdict(list)
+        reports = defaultdict(blizz_http.FetchReport)
+        for group in groups:
+            reports[group].requested += 1
+        self.report.requested += len(calls)
+        retries = blizz_http.RetryQueue(self.retry_budget, self.max_attempts)
+        results = _iter_threaded_call(
+            calls, self.workers, self.pool, self.validator_cache, retries, self.report
+        )
+        for index, response, error in results:
+            group = groups[index]
+            if error is not None:
+                # the cycle report has just recorded this failure
+                reports[group].failures.append(self.report.failures[-1])
+            elif response is None:
+                reports[group].not_modified += 1
+            else:
+                reports[group].succeeded += 1
+                payloads[group].append(response.content)
+                keys[group].append(calls[index][0])
+            calls_left[group] -= 1
+            if calls_left[group] == 0:
+                deduper = blizz_parser.RunDeduper()
+                failed = []
+                runs, rosters = BatchCaller._parse_responses(
+                    payloads.pop(group),
+                    self.decoder,
+                    deduper=deduper,
+                    failed=failed,
+                )
+                _confirm_validators(self.validator_cache, keys.pop(group), failed)
+                self.duplicates_skipped[group] += deduper.skipped
+                region, dungeon = group
+                yield region, dungeon, runs, rosters, reports.pop(group)
+
+
+def _confirm_validators(
+    validators: Optional[blizz_http.ValidatorCache], keys: list, failed: List[int]
+) -> None:
+    """Confirms validators of the calls whose bodies parsed (see ValidatorCache)."""
+    if validators is None:
+        return
+    failed = set(failed)
+    validators.confirm([key for index, key in enumerate(keys) if index not in failed])
+
+
+def _multi_threaded_call(
+    calls, num_threads, pool, validators=None, retries=None
+) -> Tuple[List[Optional[requests.Response]], blizz_http.FetchReport]:
+    """Sends multiple (key, url) calls to the API at once, over the shared pool.
+
+    Returns
+    -------
+        responses
+            one per call, in call order; None if the call failed for good
+            or was answered with 304 (not modified)
+        report
+            blizz_http.FetchReport of the batch
+    """
+    retries = retries if retries is not None else blizz_http.RetryQueue()
+    report = blizz_http.FetchReport()
+    report.requested = len(calls)
+    responses = [None] * len(calls)
+    results = _iter_threaded_call(calls, num_threads, pool, validators, retries, report)
+    for index, response, _ in results:
+        responses[index] = response
+    return responses, report
+
+
+def _iter_threaded_call(
+    calls, num_threads, pool, validators, retries, report
+) -> Generator[tuple, None, None]:
+    """Sends (key, url) calls on a thread pool, yields each call once it's settled.
+
+    Every call is its own task, so a slow realm only holds up its own
+    thread. Retryable failures go into the retry queue and are re-sent
+    once their backoff runs out; the rest are recorded in the report.
+    The calls keep going while the consumer works on what was yielded.
+
+    Yields
+    ------
+        (index, response, error)
+            index of the call in calls; response (None if the call was
+            answered 304 or failed for good); error the call failed with
+            for good (None otherwise)
+    """
     with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        for chunk in url_chunks:
-            threads.append(executor.submit(_api_call, chunk))
-    responses = []
-    for task in as_completed(threads):
-        responses.extend(task.result())
-    return responses
-
-
-def _api_call(urls) -> List[requests.Response]:
-    """Calls urls in a requests session."""
-    responses = []
-    with requests.Session() as session:
-        for url in urls:
-            try:
-                response = session.get(url, timeout=5)
-                response.raise_for_status()
-            # this exception is lazy, but we call this script hundreds of times per week
-            # so if a request fails, we'll get the data next time around
-            except Exception as error:
-                print("Request [%s] failed with error [%s]" % (url, error))
+        pending = {}  # task -> (call index, attempt)
+        try:
+            for index, (key, url) in enumerate(calls):
+                task = executor.submit(_api_call, key, url, pool, validators)
+                pending[task] = (index, 1)
+            while pending or retries:
+                if pending:
+                    # wake up on a finished call, or when the next retry is due
+                    done, _ = wait(
+                        pending,
+                        timeout=retries.next_ready_in(),
+                        return_when=FIRST_COMPLETED,
+                    )
+                else:
+                    # only backed-off retries left: wait() on nothing returns
+                    # at once, so sleep until the next one is due
+                    time.sleep(retries.next_ready_in())
+                    done = set()
+                for task in done:
+                    index, attempt = pending.pop(task)
+                    key, url = calls[index]
+                    try:
+                        response = task.result()
+                    except Exception as error:
+                        if blizz_http.is_retryable(error) and retries.push(
+                            index, attempt
+                        ):
+                            continue
+                        report.add_failure(key, url, error, attempt)
+                        failure = report.failures[-1]
+                        print(
+                            "Request [%s] failed with error [%s]"
+                            % (failure["url"], failure["error"])
+                        )
+                        yield index, None, error
+                        continue
+                    report.add_success(attempt, modified=response is not None)
+                    yield index, response, None
+                for index, attempt in retries.pop_ready():
+                    key, url = calls[index]
+                    task = executor.submit(_api_call, key, url, pool, validators)
+                    pending[task] = (index, attempt + 1)
+                    report.retried += 1
+        finally:
+            # consumer stopped early: don't send what hasn't been sent yet
+            for task in pending:
+                task.cancel()
+
+
+def _api_call(key, url, pool, validators=None) -> Optional[requests.Response]:
+    """Sends (key, url) call over the pooled (keep-alive) sessions.
+
+    If validators (blizz_http.ValidatorCache) are given, sends a conditional
+    GET and returns None if the leaderboard is unchanged (304). Validators
+    of a full response are only used once the caller confirms the body
+    parsed.
+    Raises on 4xx/5xx and on connection errors/timeouts.
+    """
+    headers = validators.get_headers(key) if validators else {}
+    response = pool.get(url, timeout=5, headers=headers)
+    response.raise_for_status()
+    if response.status_code == 304:  # leaderboard unchanged since last time
+        validators.record_hit(key)
+        return None
+    if validators:
+        validators.update(key, response.headers, len(response.content))
+    return response
+
+
+async def _async_multi_call(
+    calls, max_in_flight, timeout, validators=None, limiter=None, retries=None
+) -> Tuple[List[Optional[bytes]], blizz_http.FetchReport]:
+    """Sends all (key, url) calls at once, capped at max_in_flight open requests.
+
+    Returns
+    -------
+        payloads
+            response body per call, in call order; None if the call failed
+            for good or was answered with 304 (not modified)
+        report
+            blizz_http.FetchReport of the batch
+    """
+    retries = retries if retries is not None else blizz_http.RetryQueue()
+    report = blizz_http.FetchReport()
+    report.requested = len(calls)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    connector = aiohttp.TCPConnector(limit=max_in_flight, limit_per_host=max_in_flight)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=client_timeout
+    ) as session:
+        fetches = [
+            _async_fetch(
+                session, semaphore, key, url, validators, limiter, retries, report
+            )
+            for key, url in calls
+        ]
+        payloads = await asyncio.gather(*fetches)
+    return list(payloads), report
+
+
+async def _async_fetch(
+    session, semaphore, key, url, validators, limiter, retries, report
+) -> Optional[bytes]:
+    """Calls url until it succeeds, or is out of attempts or retry budget.
+
+    Backoff is slept outside of the semaphore, so waiting retries
+    don't hold up other calls.
+    """
+    attempt = 1
+    while True:
+        try:
+            payload = await _async_api_call(
+                session, semaphore, key, url, validators, limiter
+            )
+        except Exception as error:
+            if blizz_http.is_retryable(error) and retries.allow(attempt):
+                report.retried += 1
+                await asyncio.sleep(retries.backoff(attempt))
+                attempt += 1
                 continue
-            responses.append(response)
-    return responses
+            report.add_failure(key, url, error, attempt)
+            failure = report.failures[-1]
+            print(
+                "Request [%s] failed with error [%s]"
+                % (failure["url"], failure["error"])
+            )
+            return None
+        report.add_success(attempt, modified=payload is not None)
+        return payload
+
+
+async def _async_acquire(limiter) -> None:
+    """Waits (without blocking the loop) until limiter hands out a token."""
+    wait_ = limiter.reserve()
+    while wait_ > 0:
+        await asyncio.sleep(wait_)
+        wait_ = limiter.reserve()
 
 
-def _divide_chunks(list_, n) -> Generator:
-    """Divide list into chunks of size n."""
-    for i in range(0, len(list_), n):
-        yield list_[i : i + n]
+async def _async_api_call(
+    session, semaphore, key, url, validators=None, limiter=None
+) -> Optional[bytes]:
+    """Calls url on the shared session, returns response body.
+
+    Returns None if the leaderboard is unchanged (304), raises on
+    4xx/5xx, timeouts and connection errors. Like SessionPool.get, waits
+    on limiter and re-sends 429'd calls after Retry-After (up to 3 times).
+    """
+    limiter = limiter if limiter else blizz_http.get_default_limiter()
+    headers = validators.get_headers(key) if validators else {}
+    async with semaphore:
+        for attempt in range(4):
+            await _async_acquire(limiter)
+            response = await session.get(url, headers=headers)
+            if response.status != 429 or attempt == 3:
+                break
+            retry_after = response.headers.get("Retry-After")
+            limiter.throttle(blizz_http.parse_retry_after(retry_after))
+            response.release()
+        async with response:
+            response.raise_for_status()
+            if response.status == 304:
+                validators.record_hit(key)
+                return None
+            payload = await response.read()
+            if validators:
+                validators.update(key, response.headers, len(payload))
+    return payload
@@ -9,13 +9,23 @@
     auth = blizz_credentials.Credentials(fp)
     api_token = auth.access_token
 
+    Tokens are cached on disk next to the .ini file along with their
+    expiry, so other processes reuse them instead of asking for new ones.
+    A background thread refreshes the token shortly before it expires;
+    access_token always returns the current one.
+
+    # one shared (and refreshed) instance per .ini file
+    auth = blizz_credentials.get_credentials(fp)
+
 """
 
 
 import configparser
+import json
 import os.path
+import threading
 import time
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 import requests
 
@@ -26,10 +36,26 @@ class Credentials:
     Attributes
     ----------
         access_token : str
-            Blizzard API access token (generated on init)
+            Blizzard API access token (loaded or generated on init,
+            refreshed before it expires)
+        expires_at : float
+            unix time the current token expires at
+        cache_fp : str
+            json file the token and its expiry are cached in
+        refresh_margin : float
+            seconds before expiry the token is refreshed (default: 1 hour,
+            so a token handed out is good for at least that long)
     """
 
-    def __init__(self, auth_tokens_fp: str):
+    _cache_file_name = "access_token_cache.json"
+
+    def __init__(
+        self,
+        auth_tokens_fp: str,
+        cache_fp: Optional[str] = None,
+        refresh_margin: float = 3600,
+        auto_refresh: bool = True,
+    ):
         """Inits with .ini file containing OAuth client tokens.
 
         Parameter
@@ -40,10 +66,120 @@ class Credentials:
             [BLIZZARD]
             client_id = client_id_string
             client_secret = client_secret_sting
+        cache_fp : str, optional
+            token cache file (default: access_token_cache.json next to
+            the .ini file)
+        refresh_margin : float
+            seconds before expiry the token is refreshed
+        auto_refresh : bool
+            refresh the token in a background thread (default True);
+            otherwise it is refreshed on access once within the margin
         """
         self.query_attempts = 0
         self.credentials = self._parse_client_id_and_secret(auth_tokens_fp)
-        self.access_token = self._create_access_token()
+        if cache_fp is None:
+            cache_fp = os.path.join(
+                os.path.dirname(auth_tokens_fp), self._cache_file_name
+            )
+        self.cache_fp = cache_fp
+        self.refresh_margin = refresh_margin
+        self.auto_refresh = auto_refresh
+        self._token = None
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+        self._timer = None
+        self.refresh()
+
+    @property
+    def access_token(self) -> str:
+        """Current access token, refreshed first if it is (nearly) expired."""
+        now = time.time()
+        if self.expires_at <= now:
+            # background refresh failed, or process was suspended
+            self.refresh()
+        elif not self.auto_refresh and self.expires_at - self.refresh_margin <= now:
+            self.refresh()
+        return self._token
+
+    def refresh(self, force: bool = False) -> str:
+        """Gets a fresh token, from the cache file if another process has one.
+
+        Parameters
+        ----------
+        force : bool
+            ignore the cache file and ask Blizzard for a new token
+
+        Returns
+        -------
+        access_token : str
+            the new access token
+        """
+        with self._lock:
+            cached = None if force else self._load_cached_token()
+            if cached and cached[1] - self.refresh_margin > time.time():
+                self._token, self.expires_at = cached
+            else:
+                self.query_attempts = 0
+                self._token, self.expires_at = self._create_access_token()
+                self._save_cached_token()
+            if self.auto_refresh:
+                self._schedule_refresh(self.expires_at - self.refresh_margin)
+            return self._token
+
+    def stop(self) -> None:
+        """Stops background refresh."""
+        self.auto_refresh = False
+        if self._timer:
+            self._timer.cancel()
+
+    def _schedule_refresh(self, refresh_at: float) -> None:
+        """Starts timer that refreshes token at refresh_at (unix time)."""
+        if self._timer:
+            self._timer.cancel()
+        # no faster than once a minute, so a failing endpoint isn't hammered
+        delay = max(refresh_at - time.time(), 60)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self) -> None:
+        """Refreshes token from the timer thread; retries later on failure."""
+        try:
+            self.refresh()
+        except Exception as error:
+            print("Error refreshing auth token in background: ", str(error))
+            with self._lock:
+                if self.auto_refresh:
+                    self._schedule_refresh(time.time())
+
+    def _load_cached_token(self) -> Optional[Tuple[str, float]]:
+        """Loads (token, expires at) from the cache file, None if unusable."""
+        try:
+            with open(self.cache_fp) as file_:
+                cached = json.load(file_)
+        except (OSError, ValueError):
+            return None
+        # cache file may be left over from another client
+        if cached.get("client_id") != self.credentials["client_id"]:
+            return None
+        return cached["access_token"], cached["expires_at"]
+
+    def _save_cached_token(self) -> None:
+        """Saves token and its expiry to the cache file (owner-only)."""
+        cached = {
+            "client_id": self.credentials["client_id"],
+            "access_token": self._token,
+            "expires_at": self.expires_at,
+        }
+        temp_fp = "%s.%d.tmp" % (self.cache_fp, os.getpid())
+        try:
+            fd = os.open(temp_fp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as file_:
+                json.dump(cached, file_)
+            # atomic, so other processes never read a half-written file
+            os.replace(temp_fp, self.cache_fp)
+        except OSError as error:
+            print("Could not cache auth token: ", str(error))
 
     @staticmethod
     def _parse_client_id_and_secret(auth_tokens_fp: str) -> Dict[str, str]:
@@ -94,7 +230,7 @@ class Credentials:
         )
         return response
 
-    def _create_access_token(self) -> str:
+    def _create_access_token(self) -> Tuple[str, float]:
         """Given a credentials dict, generates OAuth access token.
 
         Returns
@@ -102,6 +238,8 @@ class Credentials:
         access_token : str
             OAuth access tokens that allows us to make calls to
             Blizzard API.
+        expires_at : float
+            unix time the token expires at
         """
         response = None
         try:
@@ -115,5 +253,21 @@ class Credentials:
                 response = self._query_blizzard(self.credentials)
             else:
                 raise ConnectionError("Tried 5 times and failed to get auth token.")
-        access_token = response.json()["access_token"]
-        return access_token
+        requested_at = time.time()
+        json_ = response.json()
+        access_token = json_["access_token"]
+        # Blizzard tokens are good for 24 hours
+        expires_at = requested_at + json_.get("expires_in", 24 * 3600)
+        return access_token, expires_at
+
+
+_shared_credentials = {}  # type: Dict[str, Credentials]
+_shared_credentials_lock = threading.Lock()
+
+
+def get_credentials(auth_tokens_fp: str) -> Credentials:
+    """Returns process-wide Credentials for .ini file, creating it on first use."""
+    with _shared_credentials_lock:
+        if auth_tokens_fp not in _shared_credentials:
+            _shared_credentials[auth_tokens_fp] = Credentials(auth_tokens_fp)
+        return _shared_credentials[auth_tokens_fp]
@@ -0,0 +1,709 @@
+"""Shared HTTP transport for Blizzard API calls.
+
+Keeps one long-lived, keep-alive requests.Session per API host, so the
+TLS handshake to {region}.api.blizzard.com is paid once per connection
+instead of once per call (or once per url chunk).
+
+Usage example:
+
+    import blizz_api
+    import blizz_http
+
+    pool = blizz_http.SessionPool(pool_size=20)
+    caller = blizz_api.Caller(api_token, pool=pool)
+    batch_caller = blizz_api.BatchCaller(api_token, pool=pool)
+    ...
+    print(pool.get_stats())
+    pool.close()
+
+If no pool is passed, Caller and BatchCaller share a process-wide pool
+(see get_default_pool), which lives as long as the process does.
+
+Every request sent through a pool first takes a token from a RateLimiter
+(process-wide by default, see get_default_limiter), which enforces
+Blizzard's per-second and per-hour quotas and backs off on 429s:
+
+    limiter = blizz_http.get_default_limiter()
+    print(limiter.get_levels())  # tokens left in each window
+
+The hourly window outlasts a process that runs once an hour, so a
+limiter given a file path carries its hourly bucket over to the next run:
+
+    limiter = blizz_http.RateLimiter(file_path="data/rate_limiter.json")
+    pool = blizz_http.SessionPool(limiter=limiter)
+    ...
+    limiter.save()
+
+ValidatorCache remembers ETag / Last-Modified of leaderboard responses,
+so unchanged leaderboards come back as empty 304s:
+
+    validators = blizz_http.ValidatorCache("data/validator_cache.json")
+    batch_caller.validator_cache = validators
+    runs, rosters = batch_caller.get_data()  # only changed leaderboards
+    validators.save()
+    print(validators.get_stats())
+
+Failed calls are not dropped right away: retryable failures (timeouts,
+connection errors, 429s and 5xx) go into a RetryQueue and are re-sent
+with jittered exponential backoff, drawing on a RetryBudget shared by the
+whole cycle. What happened to each call ends up in a FetchReport:
+
+    batch_caller.retry_budget = blizz_http.RetryBudget(200)
+    runs, rosters, report = batch_caller.get_data(with_report=True)
+    print(report)
+"""
+import email.utils
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class _TokenBucket:
+    """Bucket of capacity tokens that refills at rate tokens per second."""
+
+    def __init__(self, capacity: float, rate: float) -> None:
+        """Inits full bucket."""
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Adds the tokens accrued since last refill."""
+        accrued = (now - self.updated) * self.rate
+        self.tokens = min(self.capacity, self.tokens + accrued)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Returns seconds until a token is available (0 if available now)."""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Thread-safe limiter for Blizzard API quotas.
+
+    Each request needs a token from both a per-second and a per-hour
+    bucket. On a 429, throttle() blocks all callers until Retry-After runs
+    out. Blizzard's documented limits are 100 requests per second and
+    36,000 requests per hour.
+
+    The hourly bucket (and a 429 block) only counts what this process
+    sent, unless the limiter has a file path: then save() writes them
+    down and the next limiter with that path starts from there, refilled
+    for the time in between.
+
+    Attributes
+    ----------
+        per_second : int
+            max requests per second
+        per_hour : int
+            max requests per hour
+        file_path : str, optional
+            json snapshot of the hourly bucket, loaded on init if it exists
+    """
+
+    def __init__(
+        self,
+        per_second: int = 100,
+        per_hour: int = 36000,
+        file_path: Optional[str] = None,
+    ) -> None:
+        """Inits with full buckets for both quota windows (or the saved ones)."""
+        self.per_second = per_second
+        self.per_hour = per_hour
+        self.file_path = file_path
+        self._second = _TokenBucket(per_second, per_second)
+        self._hour = _TokenBucket(per_hour, per_hour / 3600)
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        if file_path and os.path.exists(file_path):
+            self.load()
+
+    def reserve(self) -> float:
+        """Takes a token if one is available now, else returns seconds to wait.
+
+        Non-blocking, so callers can wait in whatever way suits them
+        (time.sleep in threads, asyncio.sleep in coroutines).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._second.refill(now)
+            self._hour.refill(now)
+            wait = max(self._second.wait_time(), self._hour.wait_time())
+            if wait > 0:
+                return wait
+            self._second.tokens -= 1
+            self._hour.tokens -= 1
+        return 0.0
+
+    def acquire(self) -> float:
+        """Blocks until a token is taken, returns seconds spent waiting."""
+        waited = 0.0
+        wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            waited += wait
+            wait = self.reserve()
+        return waited
+
+    def throttle(self, retry_after: float) -> None:
+        """Blocks all callers for retry_after seconds (server said 429)."""
+        with self._lock:
+            until = time.monotonic() + retry_after
+            self._blocked_until = max(self._blocked_until, until)
+
+    def get_levels(self) -> Dict[str, float]:
+        """Returns tokens left in each window and remaining 429 block time."""
+        with self._lock:
+            now = time.monotonic()
+            self._second.refill(now)
+            self._hour.refill(now)
+            levels = {
+                "second": self._second.tokens,
+                "hour": self._hour.tokens,
+                "blocked_for": max(self._blocked_until - now, 0.0),
+            }
+        return levels
+
+    def load(self) -> None:
+        """Loads hourly bucket and 429 block from the json snapshot.
+
+        Monotonic clocks don't carry over between processes, so the
+        snapshot is stamped with wall time and refilled from that.
+        """
+        with open(self.file_path) as file_:
+            state = json.load(file_)
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(time.time() - state["saved_at"], 0.0)
+            self._hour.tokens = min(state["hour_tokens"], self.per_hour)
+            self._hour.updated = now - elapsed
+            self._hour.refill(now)
+            blocked_for = state["blocked_for"] - elapsed
+            self._blocked_until = max(self._blocked_until, now + blocked_for)
+
+    def save(self) -> None:
+        """Saves hourly bucket and 429 block to the json snapshot (if path given)."""
+        if not self.file_path:
+            return
+        levels = self.get_levels()
+        state = {
+            "saved_at": time.time(),
+            "hour_tokens": levels["hour"],
+            "blocked_for": levels["blocked_for"],
+        }
+        temp_path = self.file_path + ".tmp"
+        with open(temp_path, "w") as file_:
+            json.dump(state, file_)
+        os.replace(temp_path, self.file_path)
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Converts Retry-After header (seconds or HTTP date) to seconds."""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class SessionPool:
+    """Long-lived requests sessions, one per API host.
+
+    Attributes
+    ----------
+        pool_size : int
+            max number of kept-alive connections per host; set this to at
+            least the number of threads that share the pool
+        limiter : RateLimiter
+            limiter every request waits on (process-wide one if not given)
+        max_throttle_retries : int
+            how many times a 429'd request is re-sent after Retry-After
+    """
+
+    def __init__(
+        self, pool_size: int = 20, limiter: Optional[RateLimiter] = None
+    ) -> None:
+        """Inits with max number of connections kept alive per host."""
+        self.pool_size = pool_size
+        self.limiter = limiter if limiter else get_default_limiter()
+        self.max_throttle_retries = 3
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self) -> requests.Session:
+        """Creates session whose adapter keeps pool_size connections alive."""
+        session = requests.Session()
+        # one session per host, so the adapter only ever needs one host pool
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def get_session(self, host: str) -> requests.Session:
+        """Returns the session for host, creating it on first use."""
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = self._create_session()
+            return self._sessions[host]
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Sends GET request over the pooled session for url's host.
+
+        Waits on the rate limiter first. A 429 blocks the limiter for
+        Retry-After seconds and the request is re-sent, up to
+        max_throttle_retries times; after that the 429 is returned.
+        """
+        session = self.get_session(urlsplit(url).netloc)
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response = session.get(url, **kwargs)
+            if response.status_code != 429 or attempt >= self.max_throttle_retries:
+                return response
+            attempt += 1
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            self.limiter.throttle(retry_after)
+            response.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns request and connection counters summed over all hosts.
+
+        Returns
+        -------
+        stats : dict
+            hosts - number of hosts with an open session
+            requests - number of requests sent
+            connections - number of connections opened (i.e. handshakes)
+            reused - number of requests sent over an already open connection
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+        num_requests, num_connections = 0, 0
+        for session in sessions:
+            # the same adapter is mounted under http:// and https://
+            adapters = {id(a): a for a in session.adapters.values()}.values()
+            for adapter in adapters:
+                manager = adapter.poolmanager
+                for key in manager.pools.keys():
+                    connection_pool = manager.pools[key]
+                    num_requests += connection_pool.num_requests
+                    num_connections += connection_pool.num_connections
+        stats = {
+            "hosts": len(sessions),
+            "requests": num_requests,
+            "connections": num_connections,
+            "reused": max(num_requests - num_connections, 0),
+        }
+        return stats
+
+    def close(self) -> None:
+        """Closes all sessions (and their connections)."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+        for session in sessions:
+            session.close()
+
+
+class ValidatorCache:
+    """Store of response validators (ETag / Last-Modified) for conditional GETs.
+
+    Entries are keyed by tuples, for leaderboards that is
+    (region, realm, dungeon, period). A key with stored validators gets
+    If-None-Match / If-Modified-Since headers; if the server answers 304
+    the cached response body is known to be unchanged.
+
+    Validators of a full response are held as pending until confirm() is
+    called for its key, i.e. once the body has been parsed. A body that
+    failed to parse never gets its validator used or saved, so the next
+    call downloads it again instead of getting a 304 forever.
+
+    Attributes
+    ----------
+        file_path : str, optional
+            json snapshot the validators are loaded from and saved to
+        hits : int
+            number of 304 (not modified) responses
+        misses : int
+            number of full (200) responses
+        bytes_saved : int
+            body bytes not downloaded thanks to 304s (from last full size)
+    """
+
+    def __init__(self, file_path: Optional[str] = None) -> None:
+        """Inits with optional snapshot file; loads it if it exists."""
+        self.file_path = file_path
+        self._validators = {}
+        self._pending = {}  # validators of responses not parsed yet
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        if file_path and os.path.exists(file_path):
+            self.load()
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        """Converts key tuple into json-friendly string."""
+        return "/".join(str(k) for k in key)
+
+    def get_headers(self, key: Hashable) -> Dict[str, str]:
+        """Returns conditional request headers for key ({} if not cached)."""
+        with self._lock:
+            entry = self._validators.get(self._encode_key(key))
+        headers = {}
+        if entry is None:
+            return headers
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, key: Hashable, headers, size: int) -> None:
+        """Stores validators of a full (200) response, pending confirm().
+
+        Parameters
+        ----------
+        key : tuple
+            cache key of the call
+        headers : dict-like
+            response headers (case-insensitive, as in requests/aiohttp)
+        size : int
+            response body size in bytes
+        """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        with self._lock:
+            self.misses += 1
+            if etag or last_modified:
+                self._pending[self._encode_key(key)] = {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "size": size,
+                }
+
+    def confirm(self, keys: List[Hashable]) -> None:
+        """Starts using validators of keys, whose response bodies parsed."""
+        with self._lock:
+            for key in keys:
+                entry = self._pending.pop(self._encode_key(key), None)
+                if entry is not None:
+                    self._validators[self._encode_key(key)] = entry
+
+    def record_hit(self, key: Hashable) -> None:
+        """Counts a 304 (not modified) response for key."""
+        with self._lock:
+            self.hits += 1
+            entry = self._validators.get(self._encode_key(key))
+            if entry is not None:
+                self.bytes_saved += entry["size"]
+
+    def get_stats(self) -> dict:
+        """Returns hit/miss counters, hit rate and bytes saved."""
+        with self._lock:
+            calls = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / calls if calls else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "entries": len(self._validators),
+            }
+        return stats
+
+    def load(self) -> None:
+        """Loads validators from the json snapshot."""
+        with open(self.file_path) as file_:
+            validators = json.load(file_)
+        with self._lock:
+            self._validators = validators
+
+    def save(self) -> None:
+        """Saves validators to the json snapshot (if file path was given).
+
+        Save only after the fetched data has been stored: a saved validator
+        means the next call for that key will not return the body again.
+        """
+        if not self.file_path:
+            return
+        with self._lock:
+            validators = dict(self._validators)
+        temp_path = self.file_path + ".tmp"
+        with open(temp_path, "w") as file_:
+            json.dump(validators, file_)
+        os.replace(temp_path, self.file_path)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Checks if a failed call is worth re-sending.
+
+    Timeouts and connection errors (no status code), 429s and 5xx are;
+    other 4xx (bad url, realm without leaderboard, etc) are not.
+    """
+    response = getattr(error, "response", None)  # requests.HTTPError
+    if response is not None:
+        status = response.status_code
+    else:
+        status = getattr(error, "status", None)  # aiohttp.ClientResponseError
+    if status is None:
+        return True
+    return status == 429 or status >= 500
+
+
+def _strip_token(url: str) -> str:
+    """Masks access token in call url, so it can be logged/reported."""
+    return re.sub("access_token=[^&]*", "access_token=***", url)
+
+
+class RetryBudget:
+    """Thread-safe count of retries a cycle is allowed to send.
+
+    Share one budget between all batch calls of a cycle, so a bad hour
+    (API outage) can't turn into an endless retry loop.
+
+    Attributes
+    ----------
+        retries : int
+            total number of retries allowed
+        remaining : int
+            retries left
+    """
+
+    def __init__(self, retries: int = 200) -> None:
+        """Inits with total number of retries allowed."""
+        self.retries = retries
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def spend(self) -> bool:
+        """Takes one retry from the budget, returns False if none left."""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+        return True
+
+
+class RetryQueue:
+    """Failed calls waiting for their next attempt.
+
+    A call that failed on attempt n becomes ready after a jittered
+    exponential backoff: half of min(max_delay, base_delay * 2**(n-1))
+    plus a random part of up to the same amount.
+
+    Attributes
+    ----------
+        budget : RetryBudget
+            retries left for the cycle
+        max_attempts : int
+            max number of attempts per call (first call included)
+        base_delay : float
+            backoff before the first retry, in seconds (before jitter)
+        max_delay : float
+            backoff ceiling, in seconds (before jitter)
+    """
+
+    def __init__(
+        self,
+        budget: Optional[RetryBudget] = None,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ) -> None:
+        """Inits empty queue; budget is a fresh RetryBudget if not given."""
+        self.budget = budget if budget else RetryBudget()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._heap = []
+        self._counter = itertools.count()  # tie-breaker, calls may not compare
+
+    def __len__(self) -> int:
+        """Returns number of calls waiting."""
+        return len(self._heap)
+
+    def backoff(self, attempt: int) -> float:
+        """Returns jittered delay (seconds) before re-sending a call.
+
+        Parameters
+        ----------
+        attempt : int
+            number of the attempt that just failed (1 is the first call)
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def allow(self, attempt: int) -> bool:
+        """Checks if a call that failed on attempt may be retried.
+
+        A call may be retried if it has attempts left and the cycle has
+        retry budget left (in which case one retry is taken from it).
+        """
+        return attempt < self.max_attempts and self.budget.spend()
+
+    def push(self, call: Any, attempt: int) -> bool:
+        """Queues call that failed on attempt for a retry.
+
+        Returns False (and does not queue) if the call may not be retried.
+        """
+        if not self.allow(attempt):
+            return False
+        ready_at = time.monotonic() + self.backoff(attempt)
+        heapq.heappush(self._heap, (ready_at, next(self._counter), call, attempt))
+        return True
+
+    def next_ready_in(self) -> Optional[float]:
+        """Returns seconds until the next call is ready (None if queue empty)."""
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - time.monotonic(), 0.0)
+
+    def pop_ready(self) -> List[Tuple[Any, int]]:
+        """Pops calls whose backoff has run out, as (call, failed attempt)."""
+        ready = []
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, call, attempt = heapq.heappop(self._heap)
+            ready.append((call, attempt))
+        return ready
+
+
+class FetchReport:
+    """Outcome of a batch of API calls.
+
+    Attributes
+    ----------
+        requested : int
+            number of calls in the batch
+        succeeded : int
+            calls that returned data
+        not_modified : int
+            calls answered with 304 (see ValidatorCache)
+        retried : int
+            retries sent
+        recovered : int
+            calls that succeeded on a retry
+        failures : List[dict]
+            calls that were given up on, each as dict of key, url (token
+            masked), status (None for timeouts etc), error and attempts
+    """
+
+    def __init__(self) -> None:
+        """Inits empty report."""
+        self.requested = 0
+        self.succeeded = 0
+        self.not_modified = 0
+        self.retried = 0
+        self.recovered = 0
+        self.failures = []
+
+    @property
+    def failed(self) -> int:
+        """Number of calls given up on."""
+        return len(self.failures)
+
+    def add_success(self, attempt: int, modified: bool = True) -> None:
+        """Counts call that succeeded on attempt (1 is the first call)."""
+        if modified:
+            self.succeeded += 1
+        else:
+            self.not_modified += 1
+        if attempt > 1:
+            self.recovered += 1
+
+    def add_failure(
+        self, key: Hashable, url: str, error: Exception, attempts: int
+    ) -> None:
+        """Records call that was given up on."""
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", getattr(error, "status", None))
+        self.failures.append(
+            {
+                "key": key,
+                "url": _strip_token(url),
+                "status": status,
+                "error": "%s: %s" % (type(error).__name__, _strip_token(str(error))),
+                "attempts": attempts,
+            }
+        )
+
+    def merge(self, other: "FetchReport") -> None:
+        """Adds counts and failures of another report to this one."""
+        self.requested += other.requested
+        self.succeeded += other.succeeded
+        self.not_modified += other.not_modified
+        self.retried += other.retried
+        self.recovered += other.recovered
+        self.failures.extend(other.failures)
+
+    def as_dict(self) -> dict:
+        """Returns report as dict (ex: for json logging)."""
+        return {
+            "requested": self.requested,
+            "succeeded": self.succeeded,
+            "not_modified": self.not_modified,
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "failed": self.failed,
+            "failures": list(self.failures),
+        }
+
+    def __str__(self) -> str:
+        """One-line summary of the report."""
+        return (
+            "%d calls: %d ok, %d not modified, %d failed "
+            "(%d retries sent, %d calls recovered)"
+        ) % (
+            self.requested,
+            self.succeeded,
+            self.not_modified,
+            self.failed,
+            self.retried,
+            self.recovered,
+        )
+
+
+_default_pool = None  # type: Optional[SessionPool]
+_default_pool_lock = threading.Lock()
+_default_limiter = None  # type: Optional[RateLimiter]
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter() -> RateLimiter:
+    """Returns process-wide rate limiter, creating it on first use."""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
+
+
+def get_default_pool() -> SessionPool:
+    """Returns process-wide session pool, creating it on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool()
+        return _default_pool
@@ -6,9 +6,22 @@ Usage example:
 
     response = requests.get(leaderboard_url)
     leaderboard = parser.parse_mplus_leaderboard(response.json())
+
+    # same run/roster tuples, without building the leaderboard's json tree
+    runs, rosters = parser.parse_leaderboard_stream(response.content)
+
+    # columnar: numpy structured arrays, one typed column per tuple field
+    runs = parser.runs_to_array(runs)
+    runs["run_id"], runs["score"]
 """
+import codecs
+import json
 import re
-from typing import List, Tuple
+from collections import deque
+from contextlib import contextmanager
+from typing import Generator, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
 
 import utils
 from utils import Utils
@@ -16,6 +29,34 @@ from utils import Utils
 SPEC_UTILS = utils.Specs()
 SCORER = utils.Scorer()
 
+# columnar layout of the run/roster tuples: same fields in the same order,
+# sized after the MDB 'run' and 'roster' columns (names are 12 chars max
+# in game, compositions 5 letters)
+RUN_DTYPE = np.dtype(
+    [
+        ("run_id", np.uint64),
+        ("dungeon", np.uint16),
+        ("level", np.uint8),
+        ("period", np.uint16),
+        ("timestamp", np.uint64),
+        ("duration", np.uint32),
+        ("faction", np.uint8),
+        ("region", np.uint8),
+        ("score", np.float64),
+        ("istimed", np.bool_),
+        ("composition", "U5"),
+    ]
+)
+ROSTER_DTYPE = np.dtype(
+    [
+        ("run_id", np.uint64),
+        ("character_id", np.uint64),
+        ("name", "U12"),
+        ("spec", np.uint16),
+        ("realm", np.uint16),
+    ]
+)
+
 
 def _get_realm_id_from_url(connected_realm_url: str) -> int:
     """Parsess realm ID from the realm url."""
@@ -24,6 +65,131 @@ def _get_realm_id_from_url(connected_realm_url: str) -> int:
     return realm_id
 
 
+# single-digit region codes (Utils.encode_region gives ints, and "4" for tw)
+_REGION_DIGITS = {code: int(code) for code in list(range(10)) + list("0123456789")}
+
+
+def _generate_run_id(completed_timestamp: int, region, member_ids: List[int]) -> int:
+    """Creates a unique record id for the run."""
+
+    # This will serve as the PRIMARY KEY in the MySQL table. Uniqueness is
+    # achieved by combining the truncated timestamp with character
+    # id of the first player. Character ids are loosely region-unique, and
+    # the same player id can't appear in two different keys at the same
+    # time witin a region.
+
+    smallest_member_id = min(member_ids)
+    region_digit = _REGION_DIGITS.get(region)
+    if (
+        region_digit is not None
+        and 10 ** 12 <= completed_timestamp < 10 ** 13
+        and 0 <= smallest_member_id < 10 ** 10
+    ):
+        # fast path, same digits as the string version below:
+        # [timestamp digits 2-9][region digit][member id, zero-padded to 10]
+        timestamp = completed_timestamp % 10 ** 12 // 10 ** 4
+        run_id = timestamp * 10 ** 11 + region_digit * 10 ** 10 + smallest_member_id
+    else:
+        timestamp = str(completed_timestamp)[1:-4]
+        run_id = int(
+            "%s%s%s" % (timestamp, region, str(smallest_member_id).zfill(10))
+        )
+    if run_id >= 18446744073709551615:  # max 64 bit int
+        raise ValueError("Oh oh. The run id exceeds 64-bit int limit.")
+    return run_id
+
+
+def _get_composition(specs: List[int]) -> str:
+    """Generates 5-letter signature for roster spec composition."""
+    shorthand = utils.REGISTRY.shorthand
+    return "".join(sorted([shorthand.get(spec) for spec in specs]))
+
+
+def runs_to_array(runs: List[tuple]) -> np.ndarray:
+    """Converts run tuples into a RUN_DTYPE structured array.
+
+    Region comes out as a number for every region (tw is "4" in tuples).
+    """
+    return np.array(runs, dtype=RUN_DTYPE)
+
+
+def rosters_to_array(rosters: List[tuple]) -> np.ndarray:
+    """Converts roster tuples into a ROSTER_DTYPE structured array."""
+    return np.array(rosters, dtype=ROSTER_DTYPE)
+
+
+class RunDeduper:
+    """Fingerprints of the runs parsed so far, to skip repeated copies.
+
+    The same run is on the leaderboard of every connected realm its
+    members come from. A run's fingerprint is its completed timestamp and
+    lowest member id (what the run id is made of, minus the region), so a
+    copy can be spotted before it is scored and turned into tuples.
+
+    The decoders fingerprint a leaderboard inside staging(): its runs are
+    remembered only once the whole body has parsed. A leaderboard that
+    fails half way is thrown away, so its runs must not make the clean
+    copies on other realms' leaderboards look like repeats.
+
+    Attributes
+    ----------
+        skipped : int
+            number of copies skipped so far
+    """
+
+    def __init__(self) -> None:
+        """Inits with no runs seen."""
+        self._seen = set()
+        self._staged = set()  # fingerprints of the leaderboard being parsed
+        self._staged_skipped = 0
+        self._depth = 0  # nested staging() blocks
+        self.skipped = 0
+
+    def is_new(self, completed_timestamp: int, member_ids: List[int]) -> bool:
+        """Returns whether run is new, and remembers it; counts it if not."""
+        fingerprint = (completed_timestamp, min(member_ids))
+        if fingerprint in self._seen or fingerprint in self._staged:
+            self.skipped += 1
+            self._staged_skipped += 1
+            return False
+        self._staged.add(fingerprint)
+        return True
+
+    def is_new_group(self, group: dict) -> bool:
+        """Same as is_new, for a 'leading_groups' entry of leaderboard json."""
+        member_ids = [member["profile"]["id"] for member in group["members"]]
+        return self.is_new(group["completed_timestamp"], member_ids)
+
+    @contextmanager
+    def staging(self) -> Generator["RunDeduper", None, None]:
+        """Remembers the runs seen in the block only if it doesn't raise.
+
+        Blocks can be nested; the outermost one commits.
+        """
+        self._depth += 1
+        try:
+            yield self
+        except Exception:
+            self.discard()
+            raise
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.commit()
+
+    def commit(self) -> None:
+        """Remembers the staged runs for good."""
+        self._seen.update(self._staged)
+        self._staged.clear()
+        self._staged_skipped = 0
+
+    def discard(self) -> None:
+        """Forgets the staged runs, and the copies skipped since the commit."""
+        self.skipped -= self._staged_skipped
+        self._staged.clear()
+        self._staged_skipped = 0
+
+
 def parse_timeperiod_index_json(json: dict) -> List[int]:
     """Retrieves time period ids from periond index call json."""
     period_ids = []
@@ -141,6 +307,8 @@ class RosterMember:
     """Container for player character from a key run."""
 
     # a class is an overkill for this? should be a method that produces a NamedTuple
+    # (parse_leaderboard_json skips it altogether)
+    __slots__ = ("name", "id_", "vanity_realm_id", "faction", "spec")
 
     def __init__(self, profile) -> None:
         """Inits with profile element of the 'members' json."""
@@ -158,6 +326,21 @@ class RosterMember:
 class KeyRun:
     """Container/parser for individual m+ run."""
 
+    __slots__ = (
+        "key_run_json",
+        "region",
+        "dungeon",
+        "duration_in_ms",
+        "completed_timestamp",
+        "keystone_level",
+        "roster",
+        "faction",
+        "run_id",
+        "composition",
+        "score",
+        "istimed",
+    )
+
     def __init__(self, key_run_json, region, dungeon) -> None:
         """Inits record with key run json."""
         self.key_run_json = key_run_json
@@ -180,10 +363,7 @@ class KeyRun:
 
     def _get_comp(self) -> str:
         """Generates 5-letter signature for roster spec composition."""
-        sig = []
-        for member in self.roster:
-            sig.append(SPEC_UTILS.get_shorthand(member.spec))
-        return "".join(sorted(sig))
+        return _get_composition([member.spec for member in self.roster])
 
     @staticmethod
     def _parse_roster(members) -> List[RosterMember]:
@@ -194,22 +374,9 @@ class KeyRun:
         return roster
 
     def _generate_id(self) -> int:
-        """Creates a unique record id for the run."""
-
-        # This will serve as the PRIMARY KEY in the MySQL table. Uniqueness is
-        # achieved by combining the truncated timestamp with character
-        # id of the first player. Character ids are loosely region-unique, and
-        # the same player id can't appear in two different keys at the same
-        # time witin a region.
-
-        timestamp = str(self.completed_timestamp)[1:-4]
-        smallest_member_id = min([member.id_ for member in self.roster])
-        run_id = int(
-            "%s%s%s" % (timestamp, self.region, str(smallest_member_id).zfill(10))
-        )
-        if run_id >= 18446744073709551615:  # max 64 bit int
-            raise ValueError("Oh oh. The run id exceeds 64-bit int limit.")
-        return run_id
+        """Creates a unique record id for the run (see _generate_run_id)."""
+        member_ids = [member.id_ for member in self.roster]
+        return _generate_run_id(self.completed_timestamp, self.region, member_ids)
 
     def _get_score(self) -> float:
         """Calculate points awarded by run."""
@@ -236,22 +403,50 @@ class KeyRun:
 
     def get_composition_vector(self) -> tuple:
         """Construct one-hot style vector to repsent spec composition."""
-        specs = Utils().get_all_spec_ids()
-        comp_vector = [0 for i in range(len(specs))]
+        spec_index = utils.REGISTRY.spec_index
+        comp_vector = [0] * len(spec_index)
         for member in self.roster:
-            spec_index = specs.index(member.spec)
-            comp_vector[spec_index] += 1
+            if member.spec not in spec_index:
+                raise ValueError("%s is not in list" % member.spec)
+            comp_vector[spec_index[member.spec]] += 1
         comp_vector.insert(0, self.run_id)
         return tuple(comp_vector)
 
 
 class KeyRunLeaderboard:
-    """Container/parser for Key Run leaderboard."""
-
-    def __init__(self, json) -> None:
+    """Container/parser for Key Run leaderboard.
+
+    By default all runs are parsed into KeyRun objects on init (keyruns).
+    With lazy=True only the metadata (period, realm, affixes, ...) is
+    parsed; runs are decoded one at a time by iter_keyruns/iter_runs/
+    iter_rosters, and neither the runs nor their json are kept once
+    handed out. A lazy leaderboard's runs can be iterated only once
+    (iterating again raises RuntimeError): to get both runs and rosters,
+    build them in one pass over iter_keyruns, as parse_leaderboard does.
+
+    Usage example:
+
+        leaderboard = parser.KeyRunLeaderboard(response.json(), lazy=True)
+        leaderboard.period, leaderboard.affixes
+        for run in leaderboard.iter_runs():
+            ...
+    """
+
+    def __init__(self, json, lazy: bool = False) -> None:
+        """Inits with leaderboard json, parses runs unless lazy."""
+        self.lazy = lazy
+        self._iterated = False  # lazy runs were handed out already
+        if lazy:
+            # hold the runs in a queue of our own, so each run's json is
+            # released as soon as it's been decoded (once the caller drops
+            # json), and keep the rest of the json for the metadata
+            self._groups = deque(json.get("leading_groups", []))
+            json = {
+                key: value for key, value in json.items() if key != "leading_groups"
+            }
         self.json = json
         self._parse_meta_features()
-        self.keyruns = self._parse_key_runs()
+        self.keyruns = None if lazy else self._parse_key_runs()
 
     def _parse_meta_features(self) -> None:
         """Extracts leaderboard regon-level data."""
@@ -284,43 +479,484 @@ class KeyRunLeaderboard:
             keyruns.append(keyrun)
         return keyruns
 
+    def iter_keyruns(
+        self, deduper: Optional[RunDeduper] = None
+    ) -> Generator[KeyRun, None, None]:
+        """Yields KeyRun of each run, in leaderboard order.
+
+        Lazy leaderboards decode each run on demand and hand it out only
+        once (the KeyRun doesn't keep its json). If deduper is given, runs
+        it has seen already are skipped (before they are decoded, if lazy);
+        the runs are remembered once the iteration ends without an error.
+
+        Raises
+        ------
+        RuntimeError
+            runs of a lazy leaderboard are iterated a second time
+        """
+        if deduper is None:
+            yield from self._iter_keyruns(None)
+            return
+        with deduper.staging():
+            yield from self._iter_keyruns(deduper)
+
+    def _iter_keyruns(
+        self, deduper: Optional[RunDeduper]
+    ) -> Generator[KeyRun, None, None]:
+        """Yields KeyRun of each run (see iter_keyruns)."""
+        if not self.lazy:
+            for keyrun in self.keyruns:
+                member_ids = [member.id_ for member in keyrun.roster]
+                if deduper is None or deduper.is_new(
+                    keyrun.completed_timestamp, member_ids
+                ):
+                    yield keyrun
+            return
+        if self._iterated:
+            raise RuntimeError(
+                "Runs of a lazy KeyRunLeaderboard can be iterated only once."
+            )
+        self._iterated = True
+        while self._groups:
+            group = self._groups.popleft()
+            if deduper is not None and not deduper.is_new_group(group):
+                continue
+            keyrun = KeyRun(group, self.region, self.dungeon)
+            keyrun.key_run_json = None
+            yield keyrun
+
+    def _get_run_tuple(self, run: KeyRun) -> tuple:
+        """Returns run as a tuple (see get_runs_as_tuple_list)."""
+        return (
+            run.run_id,
+            self.dungeon,
+            run.keystone_level,
+            self.period,
+            run.completed_timestamp,
+            run.duration_in_ms,
+            run.faction,
+            self.region,
+            run.score,
+            run.istimed,
+            run.composition,
+        )
+
+    def iter_runs(self) -> Generator[tuple, None, None]:
+        """Yields each run as a tuple (see get_runs_as_tuple_list)."""
+        for run in self.iter_keyruns():
+            yield self._get_run_tuple(run)
+
+    def iter_rosters(self) -> Generator[tuple, None, None]:
+        """Yields each roster member as a tuple (see get_rosters_as_tuple_list)."""
+        for run in self.iter_keyruns():
+            yield from run.get_roster_as_tuple_list()
+
     def get_runs_as_tuple_list(self) -> List[tuple]:  # annotation is tricky here
         """Return leaderboard as list of tuples, where each tuple is a run.
 
         This list is meant to be fed to an SQL connector for a batch insert.
         """
-        runs = []
-        if self.keyruns == []:
-            return runs
-        for run in self.keyruns:
-            tpl = (
-                run.run_id,
-                self.dungeon,
-                run.keystone_level,
-                self.period,
-                run.completed_timestamp,
-                run.duration_in_ms,
-                run.faction,
-                self.region,
-                run.score,
-                run.istimed,
-                run.composition,
-            )
-            runs.append(tpl)
-        return runs
+        return list(self.iter_runs())
 
     def get_rosters_as_tuple_list(self) -> List[tuple]:
         """Returns roster data collated as list of tuples."""
-        rosters = []
-        for run in self.keyruns:
-            tpl = run.get_roster_as_tuple_list()
-            rosters.extend(tpl)
-        return rosters
+        return list(self.iter_rosters())
+
+    def get_runs_as_array(self) -> np.ndarray:
+        """Returns leaderboard as RUN_DTYPE structured array, one row per run."""
+        return runs_to_array(self.get_runs_as_tuple_list())
+
+    def get_rosters_as_array(self) -> np.ndarray:
+        """Returns roster data as ROSTER_DTYPE structured array."""
+        return rosters_to_array(self.get_rosters_as_tuple_list())
 
     def get_run_comps_as_vector_list(self) -> List[tuple]:
         """Return roster class/spec composition as list of lists."""
         comps = []
-        for run in self.keyruns:
+        for run in self.iter_keyruns():
             comp = run.get_composition_vector()
             comps.append(comp)
         return comps
+
+
+def _get_leaderboard_context(json: dict) -> tuple:
+    """Returns (region, dungeon, period) from top-level leaderboard fields."""
+    region_slug = Utils().get_region_from_url(json["_links"]["self"]["href"])
+    region = Utils().encode_region(region_slug)
+    return region, json["map_challenge_mode_id"], json["period"]
+
+
+def _get_run_record(group: dict) -> tuple:
+    """Returns compact record of a 'leading_groups' entry.
+
+    Record is (timestamp, duration, level, faction, members), members
+    being (character id, name, spec, realm id) tuples.
+    """
+    members = [
+        (
+            member["profile"]["id"],
+            member["profile"]["name"],
+            member["specialization"]["id"],
+            member["profile"]["realm"]["id"],
+        )
+        for member in group["members"]
+    ]
+    faction = group["members"][0]["faction"]["type"].lower()
+    return (
+        group["completed_timestamp"],
+        group["duration"],
+        group["keystone_level"],
+        0 if "alliance" in faction else 1,
+        members,
+    )
+
+
+def _get_run_tuples(record: tuple, context: tuple) -> Tuple[tuple, List[tuple]]:
+    """Turns compact run record into run tuple and roster tuples."""
+    timestamp, duration, level, faction, members = record
+    region, dungeon, period = context
+    run_id = _generate_run_id(timestamp, region, [m[0] for m in members])
+    run = (
+        run_id,
+        dungeon,
+        level,
+        period,
+        timestamp,
+        duration,
+        faction,
+        region,
+        SCORER.get_score(duration, dungeon, level),
+        Utils.istimed(dungeon=dungeon, duration=duration),
+        _get_composition([m[2] for m in members]),
+    )
+    roster = [(run_id, id_, name, spec, realm) for id_, name, spec, realm in members]
+    return run, roster
+
+
+def parse_leaderboard_json(
+    json: dict, deduper: Optional[RunDeduper] = None
+) -> Tuple[List[tuple], List[tuple]]:
+    """Turns leaderboard json into (runs, rosters) tuple lists.
+
+    Same output as KeyRunLeaderboard's get_runs_as_tuple_list and
+    get_rosters_as_tuple_list, but writes the tuples straight from the
+    json, without KeyRun/RosterMember objects in between. If deduper is
+    given, runs it has seen already are skipped (and the new ones are
+    remembered only if the whole leaderboard parses).
+    """
+    if deduper is None:
+        return _get_leaderboard_tuples(json, None)
+    with deduper.staging():
+        return _get_leaderboard_tuples(json, deduper)
+
+
+def _get_leaderboard_tuples(
+    json: dict, deduper: Optional[RunDeduper]
+) -> Tuple[List[tuple], List[tuple]]:
+    """Turns leaderboard json into (runs, rosters) (see parse_leaderboard_json)."""
+    context = _get_leaderboard_context(json)
+    runs = []
+    rosters = []
+    for group in json.get("leading_groups", []):
+        if deduper is not None and not deduper.is_new_group(group):
+            continue
+        run, roster = _get_run_tuples(_get_run_record(group), context)
+        runs.append(run)
+        rosters.extend(roster)
+    return runs, rosters
+
+
+class LeaderboardStreamParser:
+    """Incremental parser for leaderboard responses.
+
+    Reads the response body chunk by chunk and yields (run, roster)
+    tuples, the same ones KeyRunLeaderboard.get_runs_as_tuple_list and
+    get_rosters_as_tuple_list return. Only one 'leading_groups' entry is
+    decoded into python objects at a time; the rest of the response is
+    never held as a json tree.
+
+    Runs are yielded as soon as the region and dungeon are known. In
+    Blizzard's responses 'map_challenge_mode_id' comes after
+    'leading_groups', so runs are held as compact records until then.
+
+    Usage example:
+
+        parser = blizz_parser.LeaderboardStreamParser()
+        for run, roster in parser.iter_runs(response.iter_content(65536)):
+            ...
+    """
+
+    chunk_size = 65536  # bytes payloads are fed in slices of this size
+
+    # top-level keys the tuples are made from
+    _meta_keys = ("_links", "period", "map_challenge_mode_id")
+    _whitespace = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+
+    def iter_runs(
+        self,
+        chunks: Union[bytes, Iterable[bytes]],
+        deduper: Optional[RunDeduper] = None,
+    ) -> Generator[Tuple[tuple, List[tuple]], None, None]:
+        """Yields (run tuple, roster tuples) of each run, in leaderboard order.
+
+        Parameters
+        ----------
+        chunks : bytes or iterable of bytes
+            leaderboard response body, whole or in chunks
+        deduper : RunDeduper, optional
+            skip runs deduper has seen already (new ones are remembered
+            once the whole body has parsed)
+
+        Raises
+        ------
+        json.JSONDecodeError
+            body is not valid json
+        KeyError
+            body is missing fields of a leaderboard
+        """
+        if deduper is None:
+            yield from self._iter_runs(chunks, None)
+            return
+        with deduper.staging():
+            yield from self._iter_runs(chunks, deduper)
+
+    def _iter_runs(
+        self, chunks: Union[bytes, Iterable[bytes]], deduper: Optional[RunDeduper]
+    ) -> Generator[Tuple[tuple, List[tuple]], None, None]:
+        """Yields (run tuple, roster tuples) of each run (see iter_runs)."""
+        if isinstance(chunks, (bytes, bytearray)):
+            chunks = self._slice(chunks)
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        meta = {}
+        context = None  # (region, dungeon, period), once known
+        pending = []  # compact runs seen before region/dungeon were known
+        self._expect("{")
+        if not self._consume("}"):
+            while True:
+                key = self._decode_value()
+                self._expect(":")
+                if key == "leading_groups":
+                    for record in self._iter_group_records(deduper):
+                        if context:
+                            yield _get_run_tuples(record, context)
+                        else:
+                            pending.append(record)
+                elif key in self._meta_keys:
+                    meta[key] = self._decode_value()
+                    if len(meta) == len(self._meta_keys):
+                        context = _get_leaderboard_context(meta)
+                else:
+                    self._skip_value()
+                if self._consume("}"):
+                    break
+                self._expect(",")
+        self._skip_whitespace()
+        if self._pos < len(self._buffer):
+            raise json.JSONDecodeError("Extra data", self._buffer, self._pos)
+        if not context:
+            # raises KeyError if the leaderboard is missing meta data, even
+            # with no runs (as the json decoders do)
+            context = _get_leaderboard_context(meta)
+        for record in pending:
+            yield _get_run_tuples(record, context)
+
+    def parse(
+        self,
+        chunks: Union[bytes, Iterable[bytes]],
+        deduper: Optional[RunDeduper] = None,
+    ) -> Tuple[list, list]:
+        """Returns (runs, rosters) tuple lists of a leaderboard response."""
+        runs = []
+        rosters = []
+        for run, roster in self.iter_runs(chunks, deduper):
+            runs.append(run)
+            rosters.extend(roster)
+        return runs, rosters
+
+    def _slice(self, payload: bytes) -> Generator[bytes, None, None]:
+        """Cuts payload into chunks, so the text buffer stays small."""
+        view = memoryview(payload)
+        for start in range(0, len(payload), self.chunk_size):
+            yield bytes(view[start : start + self.chunk_size])
+
+    def _read_more(self) -> bool:
+        """Appends more of the body to the buffer; False if there is nothing left.
+
+        Reads at least as much as is left unparsed in the buffer, so a value
+        spread over many small chunks is only re-decoded a few times.
+        """
+        if self._eof:
+            return False
+        # drop what has been parsed already
+        unparsed = self._buffer[self._pos :]
+        parts = [unparsed]
+        size = 0
+        while size <= len(unparsed):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                parts.append(self._text_decoder.decode(b"", final=True))
+                break
+            parts.append(self._text_decoder.decode(chunk))
+            size += len(parts[-1])
+        self._buffer = "".join(parts)
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self) -> None:
+        """Moves past whitespace, reading more of the body if needed."""
+        while True:
+            self._pos = self._whitespace.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._read_more():
+                return
+
+    def _consume(self, char: str) -> bool:
+        """Moves past char if it comes next; returns whether it did."""
+        self._skip_whitespace()
+        if self._buffer.startswith(char, self._pos):
+            self._pos += 1
+            return True
+        return False
+
+    def _expect(self, char: str) -> None:
+        """Moves past char, raises if something else comes next."""
+        if not self._consume(char):
+            raise json.JSONDecodeError(
+                "Expecting '%s'" % char, self._buffer, self._pos
+            )
+
+    def _decode_value(self):
+        """Decodes the json value that comes next."""
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # value may continue in the next chunk
+                if self._read_more():
+                    continue
+                raise
+            # a number at the end of the buffer may have more digits coming
+            if end == len(self._buffer) and self._read_more():
+                continue
+            self._pos = end
+            return value
+
+    def _skip_value(self) -> None:
+        """Moves past the json value that comes next."""
+        # keys we don't need are small (names, links, affixes)
+        self._decode_value()
+
+    def _iter_group_records(
+        self, deduper: Optional[RunDeduper] = None
+    ) -> Generator[tuple, None, None]:
+        """Yields compact record of each 'leading_groups' entry (new ones only)."""
+        self._expect("[")
+        if self._consume("]"):
+            return
+        while True:
+            group = self._decode_value()
+            if deduper is None or deduper.is_new_group(group):
+                yield _get_run_record(group)
+            if self._consume("]"):
+                return
+            self._expect(",")
+
+
+def parse_leaderboard_stream(
+    chunks: Union[bytes, Iterable[bytes]]
+) -> Tuple[List[tuple], List[tuple]]:
+    """Parses leaderboard response body into (runs, rosters) tuple lists.
+
+    Same output as KeyRunLeaderboard's get_runs_as_tuple_list and
+    get_rosters_as_tuple_list, without building the json tree.
+    """
+    return LeaderboardStreamParser().parse(chunks)
+
+
+def parse_leaderboard(
+    payload: bytes, decoder: str = "stream", deduper: Optional[RunDeduper] = None
+) -> Tuple[List[tuple], List[tuple]]:
+    """Parses leaderboard response body with decoder into (runs, rosters).
+
+    decoder is "stream" (LeaderboardStreamParser), "fast" (json.loads and
+    parse_leaderboard_json) or "json" (KeyRunLeaderboard); all give the
+    same tuples. If deduper is given, runs it has seen already are skipped.
+    """
+    if decoder == "stream":
+        return LeaderboardStreamParser().parse(payload, deduper)
+    if decoder == "fast":
+        return parse_leaderboard_json(json.loads(payload), deduper)
+    # one pass over a lazy leaderboard, no KeyRun outlives its roster tuples
+    leaderboard = KeyRunLeaderboard(json.loads(payload), lazy=True)
+    if deduper is None:
+        return _get_keyrun_tuples(leaderboard, None)
+    # tuples are built outside of iter_keyruns, so a run that fails there
+    # has to discard the staged runs too
+    with deduper.staging():
+        return _get_keyrun_tuples(leaderboard, deduper)
+
+
+def _get_keyrun_tuples(
+    leaderboard: "KeyRunLeaderboard", deduper: Optional[RunDeduper]
+) -> Tuple[List[tuple], List[tuple]]:
+    """Returns (runs, rosters) of a lazy leaderboard, in one pass."""
+    runs, rosters = [], []
+    for run in leaderboard.iter_keyruns(deduper):
+        runs.append(leaderboard._get_run_tuple(run))
+        rosters.extend(run.get_roster_as_tuple_list())
+    return runs, rosters
+
+
+def parse_leaderboard_or_skip(
+    payload: bytes, decoder: str = "stream", deduper: Optional[RunDeduper] = None
+) -> Tuple[List[tuple], List[tuple]]:
+    """Same as parse_leaderboard, but a malformed leaderboard gives ([], [])."""
+    result = _parse_leaderboard_or_none(payload, decoder, deduper)
+    return result if result is not None else ([], [])
+
+
+def _parse_leaderboard_or_none(
+    payload: bytes, decoder: str, deduper: Optional[RunDeduper]
+) -> Optional[Tuple[List[tuple], List[tuple]]]:
+    """Same as parse_leaderboard, but a malformed leaderboard gives None."""
+    try:
+        return parse_leaderboard(payload, decoder, deduper)
+    except json.JSONDecodeError as error:
+        print("Leaderboard parse error: JSONDecodeError ", error)
+    except KeyError as error:
+        print("Leaderboard parse error: KeyError", error)
+    return None
+
+
+def parse_leaderboards(
+    payloads: List[bytes],
+    decoder: str = "stream",
+    deduper: Optional[RunDeduper] = None,
+    failed: Optional[List[int]] = None,
+) -> Tuple[List[tuple], List[tuple]]:
+    """Parses leaderboard response bodies into one (runs, rosters) pair.
+
+    Runs on more than one leaderboard are parsed once (deduper is created
+    if not given); malformed leaderboards are skipped, and their indexes
+    are appended to failed (if given).
+    """
+    deduper = deduper if deduper is not None else RunDeduper()
+    runs = []
+    rosters = []
+    for index, payload in enumerate(payloads):
+        result = _parse_leaderboard_or_none(payload, decoder, deduper)
+        if result is None:
+            if failed is not None:
+                failed.append(index)
+            continue
+        runs.extend(result[0])
+        rosters.extend(result[1])
+    return runs, rosters
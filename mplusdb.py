@@ -1,13 +1,665 @@
-"""Module for uploading data to the M+ MySQL database."""
+"""Module for uploading data to the M+ MySQL database.
+
+Usage example:
+
+    mdb = mplusdb.MplusDatabase("config/db_config.ini", pool_size=5)
+
+    # every call borrows a pooled connection and commits on its own
+    mdb.insert(table="run", data=runs)
+
+    # calls in a session share one connection (each still commits)
+    with mdb.session():
+        for region in regions:
+            mdb.pull_existing_run_ids(region, period)
+
+    # calls in a transaction share one connection and commit together
+    # (or are rolled back together, if the block raises)
+    with mdb.transaction():
+        mdb.insert(table="run", data=runs)
+        mdb.insert(table="roster", data=rosters)
+
+    # backfills: chunked multi-row inserts, one commit per chunk
+    stats = mdb.bulk_insert(table="roster", data=rosters)
+
+    # which runs are already in MDB, without pulling every id each cycle
+    seen_runs = mplusdb.SeenRunIndex("data/seen_runs.npz")
+    seen_runs.reconcile(mdb, region=1, period=775)  # rebuilds if out of sync
+    novel_runs = seen_runs.get_new((1, 775), runs)
+
+    # inserts on writer threads, while the caller moves on
+    with mplusdb.BackgroundWriter(mdb, workers=2) as writer:
+        writer.submit(runs, rosters)  # blocks only if the queue is full
+    # (leaving the block waits until everything is written)
+
+    # keep summary_spec current from the inserted runs, without a rebuild
+    writer.summary_deltas = mplusdb.SpecSummaryDeltas()
+    ...
+    mdb.apply_summary_spec_deltas(writer.summary_deltas)
+"""
 import configparser
-from typing import List, Optional, Tuple, Union
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Generator, List, Optional, Tuple, Union
 
 import mysql.connector
+import numpy as np
 import pandas as pd
 
+import utils
+
+# errors after which a connection can't be trusted anymore
+_CONNECTION_ERRORS = (
+    mysql.connector.errors.OperationalError,
+    mysql.connector.errors.InterfaceError,
+)
+
+# rows per multi-row INSERT of bulk_insert
+BULK_CHUNK_SIZE = 10000  # type: int
+
+
+def get_multirow_insert(table: str, fields: List[str], num_rows: int) -> str:
+    """Returns INSERT IGNORE query with num_rows rows of placeholders."""
+    blanks = "(%s)" % ",".join(["%s"] * len(fields))
+    return "INSERT IGNORE INTO {table} ({table_fields}) VALUES {values}".format(
+        table=table, table_fields=",".join(fields), values=",".join([blanks] * num_rows)
+    )
+
+
+class ConnectionPool:
+    """Thread-safe pool of open MySQL connections.
+
+    Connections are opened on demand, up to pool_size, and are kept open
+    between calls. A connection that has been idle for longer than
+    health_check_interval is pinged (and reconnected, if it has to be)
+    before it's handed out; a connection that broke while in use is
+    dropped instead of going back to the pool.
+
+    Attributes
+    ----------
+        pool_size : int
+            max number of open connections
+        timeout : float
+            seconds to wait for a free connection before giving up
+        health_check_interval : float
+            idle seconds after which a connection is pinged on checkout
+    """
+
+    def __init__(self, credentials: dict, pool_size: int = 5) -> None:
+        """Inits with mysql.connector.connect kwargs and max number of connections."""
+        self.credentials = credentials
+        self.pool_size = pool_size
+        self.timeout = 60
+        self.health_check_interval = 30
+        self._idle = queue.LifoQueue()  # (connection, returned at)
+        self._num_open = 0
+        self._stats = {"checkouts": 0, "connections": 0, "reconnects": 0}
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """Opens a new connection."""
+        connection = mysql.connector.connect(**self.credentials)
+        with self._lock:
+            self._stats["connections"] += 1
+        return connection
+
+    def get(self):
+        """Returns an open connection, blocks while all are in use.
+
+        Raises
+        ------
+        mysql.connector.errors.PoolError
+            no connection came free within timeout seconds
+        """
+        with self._lock:
+            self._stats["checkouts"] += 1
+            can_open = self._idle.empty() and self._num_open < self.pool_size
+            if can_open:
+                self._num_open += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._num_open -= 1
+                raise
+        try:
+            connection, returned_at = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise mysql.connector.errors.PoolError(
+                "No free MDB connection after %s sec" % self.timeout
+            )
+        if time.monotonic() - returned_at > self.health_check_interval:
+            try:
+                connection.ping()
+            except mysql.connector.Error:
+                # server closed it (wait_timeout, restart, failover)
+                try:
+                    connection.reconnect(attempts=2, delay=1)
+                except mysql.connector.Error:
+                    self.discard(connection)
+                    return self.get()
+                with self._lock:
+                    self._stats["reconnects"] += 1
+        return connection
+
+    def put(self, connection) -> None:
+        """Returns connection to the pool."""
+        self._idle.put((connection, time.monotonic()))
+
+    def discard(self, connection) -> None:
+        """Closes a (broken) connection, its slot can be reopened."""
+        with self._lock:
+            self._num_open -= 1
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
+
+    def close(self) -> None:
+        """Closes all idle connections."""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(connection)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns counters of the pool.
+
+        Returns
+        -------
+        stats : dict
+            open - connections currently open
+            checkouts - connections handed out
+            connections - connections opened (i.e. handshakes)
+            reconnects - idle connections that had to reconnect on checkout
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = self._num_open
+        return stats
+
+
+class SeenRunIndex:
+    """Ids of the runs already in MDB, per (region, period).
+
+    Ids are kept as sorted uint64 arrays, so membership tests are
+    vectorized binary searches, and are snapshotted to an npz file
+    between cycles. After a snapshot is loaded, reconcile() checks each
+    (region, period) against the 'run' table (count and xor of the ids)
+    and pulls the ids again only if they don't match.
+
+    Attributes
+    ----------
+        file_path : str, optional
+            npz snapshot the index is loaded from and saved to
+    """
+
+    def __init__(self, file_path: Optional[str] = None) -> None:
+        """Inits with optional snapshot file; loads it if it exists."""
+        self.file_path = file_path
+        self._ids = {}  # (region, period) -> sorted uint64 array
+        self._lock = threading.Lock()
+        if file_path and os.path.exists(file_path):
+            self.load()
+
+    @staticmethod
+    def _get_run_ids(records: Union[list, np.ndarray]) -> np.ndarray:
+        """Returns run id column of run/roster tuples or structured array."""
+        if isinstance(records, np.ndarray):
+            return records["run_id"].astype(np.uint64)
+        return np.fromiter(
+            (record[0] for record in records), dtype=np.uint64, count=len(records)
+        )
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        """Checks if ids of (region, period) are in the index."""
+        with self._lock:
+            return key in self._ids
+
+    def get_ids(self, key: Tuple[int, int]) -> np.ndarray:
+        """Returns sorted ids of (region, period) (empty if unknown)."""
+        with self._lock:
+            return self._ids.get(key, np.empty(0, dtype=np.uint64))
+
+    def set_ids(self, key: Tuple[int, int], run_ids: List[int]) -> None:
+        """Replaces ids of (region, period) (ex: with ids pulled from MDB)."""
+        run_ids = np.unique(np.asarray(run_ids, dtype=np.uint64))
+        with self._lock:
+            self._ids[key] = run_ids
+
+    def add(self, key: Tuple[int, int], records: Union[list, np.ndarray]) -> None:
+        """Adds run ids of records, once they are stored in MDB."""
+        run_ids = self._get_run_ids(records)
+        with self._lock:
+            self._ids[key] = np.union1d(self._ids.get(key, run_ids[:0]), run_ids)
+
+    def is_new(self, key: Tuple[int, int], run_ids: np.ndarray) -> np.ndarray:
+        """Returns boolean mask of run_ids that aren't in the index."""
+        known = self.get_ids(key)
+        run_ids = np.asarray(run_ids, dtype=np.uint64)
+        if len(known) == 0:
+            return np.ones(len(run_ids), dtype=bool)
+        positions = np.searchsorted(known, run_ids)
+        positions[positions == len(known)] = 0
+        return known[positions] != run_ids
+
+    def get_new(
+        self, key: Tuple[int, int], records: Union[list, np.ndarray]
+    ) -> Union[list, np.ndarray]:
+        """Returns runs (or rosters) whose run id isn't in the index.
+
+        Records are run/roster tuples, or a structured array from
+        BatchCaller.get_data(columnar=True), then an array comes back.
+        """
+        mask = self.is_new(key, self._get_run_ids(records))
+        if isinstance(records, np.ndarray):
+            return records[mask]
+        return [record for record, new in zip(records, mask.tolist()) if new]
+
+    def reconcile(self, mdb: "MplusDatabase", region: int, period: int) -> bool:
+        """Checks ids of (region, period) against MDB, re-pulls them if off.
+
+        Returns
+        -------
+        in_sync : bool
+            True if the index already matched MDB
+        """
+        key = (region, period)
+        count, checksum = mdb.get_run_id_checksum(region, period)
+        run_ids = self.get_ids(key)
+        in_sync = (
+            key in self
+            and len(run_ids) == count
+            and int(np.bitwise_xor.reduce(run_ids)) == checksum
+        )
+        if not in_sync:
+            self.set_ids(key, mdb.pull_existing_run_ids(region, period))
+        return in_sync
+
+    def prune(self, keys: List[Tuple[int, int]]) -> None:
+        """Drops every (region, period) not in keys (ex: past periods)."""
+        keys = set(keys)
+        with self._lock:
+            self._ids = {key: ids for key, ids in self._ids.items() if key in keys}
+
+    def load(self) -> None:
+        """Loads ids from the npz snapshot."""
+        with np.load(self.file_path) as snapshot:
+            ids = {
+                tuple(int(part) for part in name.split("-")): snapshot[name]
+                for name in snapshot.files
+            }
+        with self._lock:
+            self._ids = ids
+
+    def save(self) -> None:
+        """Saves ids to the npz snapshot (if file path was given).
+
+        Save only after the ids added since the last save are in MDB.
+        """
+        if not self.file_path:
+            return
+        with self._lock:
+            ids = {"%d-%d" % key: run_ids for key, run_ids in self._ids.items()}
+        temp_path = self.file_path + ".tmp"
+        with open(temp_path, "wb") as file_:
+            np.savez(file_, **ids)
+        os.replace(temp_path, self.file_path)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns number of (region, period) keys and of ids in the index."""
+        with self._lock:
+            return {
+                "keys": len(self._ids),
+                "ids": sum(len(run_ids) for run_ids in self._ids.values()),
+            }
+
+
+class SpecSummaryDeltas:
+    """Counts to add to 'summary_spec', from the runs inserted into MDB.
+
+    'summary_spec' counts roster rows per (period, spec, level). Instead
+    of re-aggregating whole periods, ingest adds the counts of the runs
+    it inserted here, and MplusDatabase.apply_summary_spec_deltas()
+    upserts them in one query.
+
+    The counts are only right for runs that weren't in MDB yet. If an
+    insert skipped some runs (already there), their periods go into
+    stale_periods instead, and need the full rebuild
+    (MplusDatabase.update_summary_spec_table).
+
+    Attributes
+    ----------
+        stale_periods : set
+            periods whose counts could not be tracked
+    """
+
+    def __init__(self) -> None:
+        self._counts = Counter()  # (period, spec, level) -> count
+        self.stale_periods = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Returns number of (period, spec, level) counts held."""
+        with self._lock:
+            return len(self._counts)
+
+    @staticmethod
+    def _get_columns(runs: Union[list, np.ndarray]) -> Tuple[list, list, list]:
+        """Returns run id, period and level columns of runs."""
+        if isinstance(runs, np.ndarray):
+            return (
+                runs["run_id"].tolist(),
+                runs["period"].tolist(),
+                runs["level"].tolist(),
+            )
+        return (
+            [run[0] for run in runs],
+            [run[3] for run in runs],
+            [run[2] for run in runs],
+        )
+
+    def add(
+        self, runs: Union[list, np.ndarray], rosters: Union[list, np.ndarray]
+    ) -> None:
+        """Adds counts of newly inserted runs and their rosters."""
+        run_ids, periods, levels = self._get_columns(runs)
+        period_levels = dict(zip(run_ids, zip(periods, levels)))
+        if isinstance(rosters, np.ndarray):
+            members = zip(rosters["run_id"].tolist(), rosters["spec"].tolist())
+        else:
+            members = ((member[0], member[3]) for member in rosters)
+        counts = Counter(
+            (period_levels[run_id][0], spec, period_levels[run_id][1])
+            for run_id, spec in members
+        )
+        with self._lock:
+            self._counts.update(counts)
+
+    def mark_stale(self, runs: Union[list, np.ndarray]) -> None:
+        """Marks periods of runs as needing the full rebuild."""
+        with self._lock:
+            self.stale_periods.update(self._get_columns(runs)[1])
+
+    def get_counts(self) -> Dict[Tuple[int, int, int], int]:
+        """Returns counts by (period, spec, level)."""
+        with self._lock:
+            return dict(self._counts)
+
+    def clear(self) -> None:
+        """Drops the counts (ex: once applied)."""
+        with self._lock:
+            self._counts.clear()
+
+
+class BackgroundWriter:
+    """Inserts runs and rosters into MDB on dedicated writer threads.
+
+    submit() puts a batch in a bounded queue and returns; it blocks only
+    while the queue is full, so a slow MDB slows the producer down
+    instead of piling up rows in memory. Each writer thread takes
+    whatever batches are waiting (up to batch_rows runs) and inserts them
+    in one transaction, on a connection of its own from the MDB pool:
+    runs and their rosters go in together, or not at all.
+
+    close() (or leaving the with block) waits until every submitted
+    batch is written, then raises if any of them failed.
+
+    Attributes
+    ----------
+        batch_rows : int
+            max number of runs merged into one transaction
+        summary_deltas : SpecSummaryDeltas, optional
+            if set, counts of the committed runs are added to it
+        errors : list
+            (number of runs, error) of the batches that failed (or whose
+            on_commit callback did)
+    """
+
+    _STOP = None  # queue item that stops a writer thread
+
+    def __init__(
+        self, mdb: "MplusDatabase", workers: int = 1, max_pending: int = 4
+    ) -> None:
+        """Inits with MDB, number of writer threads and queue size (in batches).
+
+        MDB connection pool needs a connection per writer thread (and
+        one for the calling thread, if it queries MDB meanwhile).
+        """
+        self.mdb = mdb
+        self.batch_rows = 50000
+        self.summary_deltas = None  # type: Optional[SpecSummaryDeltas]
+        self.errors = []
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "batches": 0,
+            "transactions": 0,
+            "runs": 0,
+            "write_seconds": 0.0,
+            "blocked_seconds": 0.0,
+        }
+        self._threads = [
+            threading.Thread(target=self._write_loop, name="mdb-writer-%d" % i)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def submit(
+        self,
+        runs: Union[list, np.ndarray],
+        rosters: Union[list, np.ndarray],
+        on_commit: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Queues runs and their rosters for insertion.
+
+        Parameters
+        ----------
+        runs, rosters : list of tuples, or structured array
+            rows of the 'run' and 'roster' tables
+        on_commit : callable, optional
+            called (on the writer thread) once the rows are committed,
+            ex: to add the runs to a SeenRunIndex
+        """
+        if self._closed:
+            raise RuntimeError("BackgroundWriter is closed.")
+        start = time.perf_counter()
+        self._put((runs, rosters, on_commit))
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["blocked_seconds"] += time.perf_counter() - start
+
+    def _put(self, item) -> None:
+        """Puts item in the queue; raises if it's full and no writer is left.
+
+        Raises
+        ------
+        RuntimeError
+            every writer thread has stopped, the item would never be taken
+        """
+        while True:
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                if not any(thread.is_alive() for thread in self._threads):
+                    raise RuntimeError("MDB writer threads have stopped.")
+
+    @staticmethod
+    def _count_runs(batches: list) -> int:
+        """Returns number of runs in batches (0 if they're malformed)."""
+        try:
+            return sum(len(batch[0]) for batch in batches)
+        except TypeError:
+            return 0
+
+    def _record_error(self, num_runs: int, error: BaseException) -> None:
+        """Keeps error of a failed batch, close() raises it."""
+        print("ERROR WRITING %d RUNS TO MDB: " % num_runs, error)
+        with self._lock:
+            self.errors.append((num_runs, error))
+
+    def _take_batches(self) -> Tuple[list, bool]:
+        """Waits for a batch, then takes the waiting ones up to batch_rows.
+
+        Returns the batches, and whether a stop item was taken.
+        """
+        item = self._queue.get()
+        if item is self._STOP:
+            return [], True
+        batches = [item]
+        num_runs = self._count_runs(batches)
+        while num_runs < self.batch_rows:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batches, True
+            batches.append(item)
+            num_runs += self._count_runs([item])
+        return batches, False
+
+    @staticmethod
+    def _concatenate(parts: List[Union[list, np.ndarray]]) -> Union[list, np.ndarray]:
+        """Merges lists of rows, or structured arrays, into one."""
+        if all(isinstance(part, np.ndarray) for part in parts):
+            return np.concatenate(parts)
+        rows = []
+        for part in parts:
+            rows.extend(part.tolist() if isinstance(part, np.ndarray) else part)
+        return rows
+
+    def _write(self, batches: list) -> None:
+        """Inserts batches in one transaction, then runs their callbacks."""
+        start = time.perf_counter()
+        try:
+            runs = self._concatenate([batch[0] for batch in batches])
+            rosters = self._concatenate([batch[1] for batch in batches])
+            with self.mdb.transaction():
+                inserted = self.mdb.insert(table="run", data=runs)
+                self.mdb.insert(table="roster", data=rosters)
+        except Exception as error:
+            self._record_error(self._count_runs(batches), error)
+            return
+        if self.summary_deltas is not None:
+            try:
+                if inserted == len(runs):
+                    self.summary_deltas.add(runs, rosters)
+                else:
+                    # some runs were in MDB already, can't tell which ones
+                    self.summary_deltas.mark_stale(runs)
+            except Exception as error:
+                # the runs are committed: their periods need the full rebuild
+                print("ERROR COUNTING SUMMARY DELTAS, MARKING PERIODS STALE: ", error)
+                self.summary_deltas.mark_stale(runs)
+        with self._lock:
+            self._stats["transactions"] += 1
+            self._stats["runs"] += len(runs)
+            self._stats["write_seconds"] += time.perf_counter() - start
+        for batch_runs, _, on_commit in batches:
+            try:
+                if on_commit is not None:
+                    on_commit()
+            except Exception as error:
+                print("ERROR AFTER WRITING RUNS TO MDB: ", error)
+                with self._lock:
+                    self.errors.append((len(batch_runs), error))
+
+    def _write_loop(self) -> None:
+        """Writer thread: writes batches until it takes a stop item.
+
+        A batch that fails is recorded and skipped; the thread has to keep
+        going, or submit() and close() would wait on a queue nobody takes
+        from.
+        """
+        stop = False
+        try:
+            while not stop:
+                batches, stop = self._take_batches()
+                if not batches:
+                    continue
+                try:
+                    self._write(batches)
+                except Exception as error:
+                    self._record_error(self._count_runs(batches), error)
+        except BaseException as error:
+            self._record_error(0, error)
+            raise
+
+    def close(self) -> None:
+        """Writes out every submitted batch and stops the writer threads.
+
+        Raises
+        ------
+        Exception
+            some batches could not be written
+        """
+        if not self._closed:
+            self._closed = True
+            try:
+                for _ in self._threads:
+                    self._put(self._STOP)
+            except RuntimeError:
+                pass  # no writer left, what's still queued is counted below
+            for thread in self._threads:
+                thread.join()
+            pending = []
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not self._STOP:
+                    pending.append(item)
+            if pending:
+                self._record_error(
+                    self._count_runs(pending),
+                    RuntimeError("MDB writer threads stopped before writing them."),
+                )
+        if self.errors:
+            raise Exception(
+                "Problem writing %d runs into MDB: [%s]"
+                % (sum(runs for runs, _ in self.errors), self.errors[0][1])
+            )
+
+    def get_stats(self) -> dict:
+        """Returns counters of the writer.
+
+        Returns
+        -------
+        stats : dict
+            batches - batches submitted
+            transactions - transactions committed (batches get merged)
+            runs - runs committed
+            write_seconds - time spent in committed transactions
+            blocked_seconds - time submit() waited for room in the queue
+            pending - batches waiting in the queue
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
 
 class MplusDatabase(object):
-    """Class for working with M+ MySQL database."""
+    """Class for working with M+ MySQL database.
+
+    Calls borrow connections from a ConnectionPool (pool) instead of
+    opening one per call. See session() and transaction() to run several
+    calls on the same connection.
+    """
 
     __utility_tables = ["realm", "region", "dungeon", "spec", "period"]
     __table_fields = {  # these are used to formulate batch inserts queries
@@ -83,8 +735,8 @@ class MplusDatabase(object):
         ],
     }  # is this time to move these into their own container?
 
-    def __init__(self, config_file_path):
-        """Inits with database config file."""
+    def __init__(self, config_file_path, pool_size: int = 5):
+        """Inits with database config file, and max number of open connections."""
         # self.credentials = self.parse_config_file(config_file_path)
         parser = configparser.ConfigParser()
         parser.read(config_file_path)
@@ -93,10 +745,14 @@ class MplusDatabase(object):
         self.credentials["password"] = parser["DATABASE"]["password"]
         self.credentials["host"] = parser["DATABASE"]["host"]
         self.credentials["database"] = "keyruns"
+        self.pool = ConnectionPool(self.credentials, pool_size)
+        self._local = threading.local()  # connection pinned by session()
 
     def connect(self):
         """Connects to the database.
 
+        The connection is not pooled, the caller has to close it.
+
         Returns
         -------
         conn : mysql.connector connection
@@ -105,46 +761,249 @@ class MplusDatabase(object):
         conn = mysql.connector.connect(**self.credentials)
         return conn
 
-    def insert(self, table: str, data: list) -> None:
+    def close(self) -> None:
+        """Closes the pooled connections."""
+        self.pool.close()
+
+    @contextmanager
+    def session(self) -> Generator:
+        """Runs the calls made in the block (on this thread) on one connection.
+
+        Each call still commits its own work. Sessions can be nested; the
+        inner ones just keep using the connection.
+        """
+        with self._pin(transaction=False) as connection:
+            yield connection
+
+    @contextmanager
+    def transaction(self) -> Generator:
+        """Runs the calls made in the block on one connection, as one transaction.
+
+        Commits when the block ends, rolls back if it raises. Inside a
+        session or transaction, it joins the pinned connection (and the
+        outer transaction, if any).
+        """
+        with self._pin(transaction=True) as connection:
+            yield connection
+
+    @contextmanager
+    def _pin(self, transaction: bool) -> Generator:
+        """Pins a pooled connection to this thread for the block."""
+        if getattr(self._local, "connection", None) is not None:
+            # nested: the outermost block owns the connection
+            if not transaction or self._local.in_transaction:
+                yield self._local.connection
+                return
+            self._local.in_transaction = True
+            try:
+                yield self._local.connection
+                self._local.connection.commit()
+            except BaseException:
+                self._rollback(self._local.connection)
+                raise
+            finally:
+                self._local.in_transaction = False
+            return
+        connection = self.pool.get()
+        self._local.connection = connection
+        self._local.in_transaction = transaction
+        error = None
+        try:
+            yield connection
+            connection.commit()
+        except BaseException as error_:
+            error = error_
+            self._rollback(connection)
+            raise
+        finally:
+            self._local.connection = None
+            self._local.in_transaction = False
+            self._release(connection, error)
+
+    @contextmanager
+    def _connection(self) -> Generator:
+        """Yields connection for one call, and commits the call's work.
+
+        Uses the connection pinned by session()/transaction() if there is
+        one (and leaves the commit to the transaction, if in one),
+        otherwise borrows one from the pool for the call. A call that
+        raises in a session is rolled back, so the next call doesn't
+        commit its half-applied work; in a transaction, the transaction
+        rolls back once the error leaves its block.
+        """
+        pinned = getattr(self._local, "connection", None)
+        if pinned is not None:
+            try:
+                yield pinned
+            except BaseException:
+                if not self._local.in_transaction:
+                    self._rollback(pinned)
+                raise
+            self._commit(pinned)
+            return
+        connection = self.pool.get()
+        error = None
+        try:
+            yield connection
+            connection.commit()
+        except BaseException as error_:
+            error = error_
+            self._rollback(connection)
+            raise
+        finally:
+            self._release(connection, error)
+
+    def _commit(self, connection) -> None:
+        """Commits, unless a transaction() is open on this thread."""
+        if not getattr(self._local, "in_transaction", False):
+            connection.commit()
+
+    @staticmethod
+    def _rollback(connection) -> None:
+        """Rolls back, if the connection is still up."""
+        try:
+            connection.rollback()
+        except mysql.connector.Error:
+            pass
+
+    def _release(self, connection, error: Optional[BaseException] = None) -> None:
+        """Returns connection to the pool, or drops it if error broke it."""
+        if isinstance(error, _CONNECTION_ERRORS):
+            self.pool.discard(connection)
+        else:
+            self.pool.put(connection)
+
+    def insert(self, table: str, data: Union[list, np.ndarray]) -> int:
         """Batch-inserts list of rows into database.
 
+        Rows can also come as a structured array (ex: from
+        BatchCaller.get_data(columnar=True)).
         Warning: make sure row fields align with fields in the table.
+
+        Returns
+        -------
+        inserted : int
+            number of rows inserted (rows already in the table are skipped)
         """
+        if isinstance(data, np.ndarray):
+            data = data.tolist()  # tuples of python scalars
         if not isinstance(data, list):
             raise TypeError("Supply data as a list of rows.")
         if table not in self.__table_fields.keys():
             raise ValueError("Table not annotated in object attrs.")
         fields = self.get_table_fields(table)
-        connection = self.connect()
-        cursor = connection.cursor()
         try:
-            query = (
-                "INSERT IGNORE into {table} ({table_fields}) VALUES ({blanks})"
-            ).format(
-                table=table,
-                table_fields=",".join(fields),
-                blanks=",".join(["%s" for i in range(0, len(fields))]),
-            )
-            # executemany supposedly batches data into a single query
-            cursor.executemany(query, data)
-            connection.commit()
+            with self._connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    query = (
+                        "INSERT IGNORE into {table} ({table_fields}) VALUES ({blanks})"
+                    ).format(
+                        table=table,
+                        table_fields=",".join(fields),
+                        blanks=",".join(["%s" for i in range(0, len(fields))]),
+                    )
+                    # executemany supposedly batches data into a single query
+                    cursor.executemany(query, data)
+                    inserted = cursor.rowcount
+                finally:
+                    cursor.close()
         except Exception as error:
             raise Exception("Problem with inserting data into MDB: [%s]" % error)
+        return inserted
+
+    def bulk_insert(
+        self,
+        table: str,
+        data: Union[list, np.ndarray],
+        chunk_size: Optional[int] = None,
+        into: Optional[str] = None,
+    ) -> dict:
+        """Inserts many rows, one multi-row INSERT IGNORE per chunk.
+
+        Each chunk is committed on its own.
+
+        Like insert(), rows already in the table are skipped. A failed
+        chunk is rolled back, but the chunks before it stay committed.
+        Inside a transaction(), nothing is committed until it ends.
+
+        Parameters
+        ----------
+        table : str
+            table the rows are shaped after
+        data : list of tuples, or structured array
+            rows, fields in the order of the table's fields
+        chunk_size : int, optional
+            rows per chunk (default: BULK_CHUNK_SIZE)
+        into : str, optional
+            insert into this table instead (ex: a copy of table)
+
+        Returns
+        -------
+        stats : dict
+            rows, chunks, seconds, rows_per_sec, and chunk_rows_per_sec
+            (list, one per chunk)
+        """
+        if isinstance(data, np.ndarray):
+            data = data.tolist()  # tuples of python scalars
+        if not isinstance(data, list):
+            raise TypeError("Supply data as a list of rows.")
+        if table not in self.__table_fields.keys():
+            raise ValueError("Table not annotated in object attrs.")
+        chunk_size = chunk_size if chunk_size else BULK_CHUNK_SIZE
+        fields = self.get_table_fields(table)
+        into = into if into else table
+        stats = {"rows": 0, "chunks": 0, "seconds": 0.0, "chunk_rows_per_sec": []}
+        try:
+            with self.session():
+                for start in range(0, len(data), chunk_size):
+                    chunk = data[start : start + chunk_size]
+                    chunk_start = time.perf_counter()
+                    with self._connection() as connection:
+                        self._insert_values(connection, into, fields, chunk)
+                    seconds = time.perf_counter() - chunk_start
+                    stats["rows"] += len(chunk)
+                    stats["chunks"] += 1
+                    stats["seconds"] += seconds
+                    stats["chunk_rows_per_sec"].append(len(chunk) / seconds)
+        except Exception as error:
+            raise Exception(
+                "Problem bulk-loading data into MDB (%d rows in): [%s]"
+                % (stats["rows"], error)
+            )
+        stats["rows_per_sec"] = (
+            stats["rows"] / stats["seconds"] if stats["seconds"] else None
+        )
+        print(
+            "bulk-loaded %d rows into %s (%d chunks, %.0f rows/sec)"
+            % (stats["rows"], into, stats["chunks"], stats["rows_per_sec"] or 0)
+        )
+        return stats
+
+    @staticmethod
+    def _insert_values(connection, table: str, fields: List[str], rows: list) -> None:
+        """Inserts rows with one multi-row INSERT."""
+        query = get_multirow_insert(table, fields, len(rows))
+        params = [value for row in rows for value in row]
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
         finally:
             cursor.close()
-            connection.close()
 
     def send_query_to_mdb(self, query, isfetch=False) -> Optional[List[tuple]]:
         """Sends non-insert query to MDB."""
         result = None
-        conn = self.connect()
         try:
-            cursor = conn.cursor()
-            cursor.execute("use keyruns")
-            cursor.execute(query)
-            if isfetch:
-                result = cursor.fetchall()
-            conn.commit()
+            # the pooled connections are opened on the keyruns database
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(query)
+                    if isfetch:
+                        result = cursor.fetchall()
+                finally:
+                    cursor.close()
         except Exception as error:
             print("ERROR CONNECTING TO MDB: ", error)
             if "Commands out of sync; you can't run this command now" in str(error):
@@ -155,8 +1014,6 @@ class MplusDatabase(object):
                     a transaction that hasn't been fetched. Try setting isfetch to True.
                     """
                 )
-        finally:
-            conn.close()
         return result
 
     def get_table_fields(self, table):
@@ -187,17 +1044,17 @@ class MplusDatabase(object):
         if table not in self.__utility_tables:
             raise ValueError("%s is not a legal utility table." % table)
         data, columns = None, None
-        connection = self.connect()
-        cursor = connection.cursor()
         try:
-            cursor.execute("SELECT * from %s" % table)
-            data = cursor.fetchall()
-            columns = cursor.column_names
+            with self._connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute("SELECT * from %s" % table)
+                    data = cursor.fetchall()
+                    columns = cursor.column_names
+                finally:
+                    cursor.close()
         except:
             raise Exception("Problem retrieving util table.")
-        finally:
-            cursor.close()
-            connection.close()
         return pd.DataFrame(data, columns=columns)
 
     def pull_existing_run_ids(self, region: int, period: int) -> List[int]:
@@ -207,8 +1064,162 @@ class MplusDatabase(object):
         run_ids = [int(item[0]) for item in run_ids]
         return run_ids
 
+    def get_run_id_checksum(self, region: int, period: int) -> Tuple[int, int]:
+        """Returns number and xor of the run ids of a period/region."""
+        query = (
+            "SELECT COUNT(*), BIT_XOR(id) FROM run WHERE region=%d and period=%d"
+            % (region, period)
+        )
+        count, checksum = self.send_query_to_mdb(query=query, isfetch=True)[0]
+        return int(count), int(checksum)
+
+    def rescore_runs(
+        self,
+        scorer: Optional[utils.Scorer] = None,
+        chunk_size: int = 200000,
+        period_start: Optional[int] = None,
+        period_end: Optional[int] = None,
+    ) -> Tuple[int, int]:
+        """Re-scores the 'run' table, writing back only scores that changed.
+
+        Streams the table in id order, chunk_size rows at a time, scores each
+        chunk with Scorer.get_scores, and updates the changed rows with one
+        join per chunk. Use after a timer or score formula change.
+
+        Parameters
+        ----------
+        scorer : utils.Scorer, optional
+            scorer with the new timers/formula (default: utils.Scorer())
+        chunk_size : int
+            rows read (and at most written) per round trip
+        period_start, period_end : int, optional
+            only re-score runs in this period band (default: all runs)
+
+        Returns
+        -------
+        (scanned, updated) : tuple of int
+            number of runs read, and number of runs whose score changed
+        """
+        scorer = scorer if scorer else utils.Scorer()
+        dungeon_ids = np.array(list(scorer.dungeon_timers), dtype=np.int64)
+        period_clause = ""
+        if period_start is not None and period_end is not None:
+            period_clause = "AND period BETWEEN %d AND %d" % (period_start, period_end)
+        select_query = (
+            "SELECT id, duration, dungeon, level, score FROM run"
+            " WHERE id > %s {period_clause} ORDER BY id LIMIT %s"
+        ).format(period_clause=period_clause)
+        try:
+            with self._connection() as connection:
+                scanned, updated, skipped = self._rescore_chunks(
+                    connection, select_query, chunk_size, scorer, dungeon_ids
+                )
+        except Exception as error:
+            raise Exception("Problem re-scoring runs in MDB: [%s]" % error)
+        if skipped:
+            print("skipped %d runs in dungeons without a timer" % skipped)
+        return scanned, updated
+
+    def _rescore_chunks(
+        self,
+        connection,
+        select_query: str,
+        chunk_size: int,
+        scorer: utils.Scorer,
+        dungeon_ids: np.ndarray,
+    ) -> Tuple[int, int, int]:
+        """Re-scores runs chunk by chunk, returns (scanned, updated, skipped)."""
+        scanned, updated, skipped = 0, 0, 0
+        last_id = -1
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS run_score_update"
+                " (id bigint unsigned NOT NULL PRIMARY KEY, score float)"
+            )
+            while True:
+                # keyset pagination: each chunk is an index range scan
+                cursor.execute(select_query, (last_id, chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                scanned += len(rows)
+                last_id = rows[-1][0]
+                ids = np.array([row[0] for row in rows], dtype=np.uint64)
+                durations = np.array([row[1] for row in rows], dtype=np.int64)
+                dungeons = np.array([row[2] for row in rows], dtype=np.int64)
+                levels = np.array([row[3] for row in rows], dtype=np.int64)
+                old_scores = np.array([row[4] for row in rows], dtype=np.float64)
+                known = np.isin(dungeons, dungeon_ids)
+                skipped += int((~known).sum())
+                new_scores = scorer.get_scores(
+                    durations[known], dungeons[known], levels[known]
+                )
+                # the score column is a single-precision float
+                old_scores = old_scores[known].astype(np.float32)
+                new_scores = new_scores.astype(np.float32)
+                changed = np.isnan(old_scores) | (old_scores != new_scores)
+                if not changed.any():
+                    continue
+                changed_rows = list(
+                    zip(ids[known][changed].tolist(), new_scores[changed].tolist())
+                )
+                # (not TRUNCATE: that commits implicitly, even in a transaction)
+                cursor.execute("DELETE FROM run_score_update")
+                cursor.executemany(
+                    "INSERT INTO run_score_update (id, score) VALUES (%s, %s)",
+                    changed_rows,
+                )
+                cursor.execute(
+                    "UPDATE run INNER JOIN run_score_update"
+                    " ON run.id = run_score_update.id"
+                    " SET run.score = run_score_update.score"
+                )
+                # (in a transaction, the chunks are committed all together)
+                self._commit(connection)
+                updated += len(changed_rows)
+                print("re-scored %d runs, %d changed so far" % (scanned, updated))
+        finally:
+            cursor.close()
+        return scanned, updated, skipped
+
+    def apply_summary_spec_deltas(self, deltas: SpecSummaryDeltas) -> int:
+        """Adds counts of newly inserted runs to 'summary_spec', in one upsert.
+
+        The deltas are cleared once applied. Periods the deltas couldn't
+        track (deltas.stale_periods) still need update_summary_spec_table.
+
+        Returns
+        -------
+        num_counts : int
+            number of (period, spec, level) counts applied
+        """
+        counts = deltas.get_counts()
+        if not counts:
+            return 0
+        query = (
+            "INSERT INTO summary_spec (period, spec, level, count) VALUES {values}"
+            " ON DUPLICATE KEY UPDATE count=count+VALUES(count)"
+        ).format(values=",".join(["(%s,%s,%s,%s)"] * len(counts)))
+        params = [value for key, count in counts.items() for value in key + (count,)]
+        try:
+            with self._connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(query, params)
+                finally:
+                    cursor.close()
+        except Exception as error:
+            raise Exception("Problem updating summary_spec in MDB: [%s]" % error)
+        deltas.clear()
+        return len(counts)
+
     def update_summary_spec_table(self, period_start, period_end) -> None:
-        """Updates 'summary_spec' table with runs from specified period band."""
+        """Updates 'summary_spec' table with runs from specified period band.
+
+        This is the full rebuild: it re-counts every run of the periods
+        (and so also fixes counts apply_summary_spec_deltas got wrong).
+        """
         # at some point, I need to make this method more flexible wrt period clause
         update_query = """
             INSERT INTO summary_spec
@@ -6,82 +6,197 @@ Example usage:
     pipeline.get_runs() # scrapes *all* leaderboard endpoints, 15-30 mins
     pipeline.summarize() # goes into MDB and pushes *new* data into summary tables
 """
+import contextlib
+import functools
 import sqlite3
 import time
 import datetime
 
 from typing import List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 import blizz_api
+import blizz_http
 import mplusdb
+import utils
 
 
 def find_uniq(existing_ids, runs) -> List[tuple]:
-    """Returns records that are novel to MDB."""
-    incoming_ids = [run[0] for run in runs]
-    new_ids = list(set(incoming_ids) - set(existing_ids))
-    new_records = [r for r in runs if r[0] in new_ids]
+    """Returns records that are novel to MDB.
+
+    Runs (or rosters) can also be a structured array from
+    BatchCaller.get_data(columnar=True), then the dedupe is vectorized
+    and an array comes back.
+    """
+    if isinstance(runs, np.ndarray):
+        existing_ids = np.asarray(existing_ids, dtype=np.uint64)
+        return runs[~np.isin(runs["run_id"], existing_ids)]
+    existing_ids = set(existing_ids)
+    new_records = [r for r in runs if r[0] not in existing_ids]
     return new_records
 
 
 def get_data():
     """Scrapes all of M+ leaderboards and inserts new records into MDB."""
-    caller = blizz_api.Caller()
-    batch_caller = blizz_api.BatchCaller(caller.access_token)  # share the token
-    batch_caller.workers = 6
-    print(batch_caller.workers)
-
-    dungeons = caller.get_dungeons()
-    dungeons = [d["id"] for d in dungeons]
-    regions = ["us", "eu", "tw", "kr"]
-    region_int = {"us": 1, "eu": 3, "kr": 2, "tw": 4}
-    mdb = mplusdb.MplusDatabase("config/db_config.ini")
-    cycle_start = time.time()
-    print("START CYCLE:")
-    for region in regions:
-        period = caller.get_current_period(region)
-        # peek at what's already present in the db for this period/region
-        existing_run_ids = mdb.pull_existing_run_ids(region_int[region], period)
-        print("Retrieved existing run ids from MDB for [%s %s]" % (region, period))
-        for dungeon in dungeons:
-            # point batch caller toward region/period/dungeon endpoints
-            batch_caller.region = region
-            batch_caller.dungeon = dungeon
-            batch_caller.period = period
-
-            calls_start = time.time()
-            runs, rosters = batch_caller.get_data()
-            novel_runs = find_uniq(existing_run_ids, runs)
-            novel_rosters = find_uniq(existing_run_ids, rosters)
-            calls_end = time.time()
-
-            insert_start = time.time()
-            if len(novel_runs) > 0:
-                mdb.insert(table="run", data=novel_runs)
-                mdb.insert(table="roster", data=novel_rosters)
-            insert_end = time.time()
-            print(
-                (
-                    "batch call (%d sec) success [%s %s %s]"
-                    + " got %d total runs, inserted %d new runs (%d sec) into MDB"
+    # one keep-alive connection pool for every call made during the cycle;
+    # requests wait on the API quota limiter, whose hourly bucket is carried
+    # over from the previous cycle (this runs as a new process every hour)
+    limiter = blizz_http.RateLimiter(file_path="data/rate_limiter.json")
+    pool = blizz_http.SessionPool(pool_size=20, limiter=limiter)
+    # everything opened for the cycle is closed even if the cycle fails
+    # (callbacks run last-registered first)
+    with contextlib.ExitStack() as cleanup:
+        # requests sent count against the quota, whether the cycle failed or not
+        cleanup.callback(limiter.save)
+        cleanup.callback(pool.close)
+        caller = blizz_api.Caller(pool=pool)
+        # every region/dungeon/realm call of the cycle goes through one work queue
+        # (no token given: calls use the shared, auto-refreshed credentials)
+        scheduler = blizz_api.LeaderboardScheduler(pool=pool)
+        scheduler.workers = 20
+        # skip leaderboards that haven't changed since the last cycle
+        validators = blizz_http.ValidatorCache("data/validator_cache.json")
+        scheduler.validator_cache = validators
+        # failed calls are retried, but the whole cycle gets one retry budget
+        scheduler.retry_budget = blizz_http.RetryBudget(500)
+        print(scheduler.workers)
+
+        dungeons = caller.get_dungeons()
+        dungeons = [d["id"] for d in dungeons]
+        regions = ["us", "eu", "tw", "kr"]
+        region_int = {"us": 1, "eu": 3, "kr": 2, "tw": 4}
+        mdb = mplusdb.MplusDatabase("config/db_config.ini")
+        cleanup.callback(mdb.close)
+        # ids of the runs already in MDB, kept between cycles
+        seen_runs = mplusdb.SeenRunIndex("data/seen_runs.npz")
+        cycle_start = time.time()
+        print("START CYCLE:")
+        # the reconciliation queries share one pooled connection
+        with mdb.session():
+            periods = {}
+            index_keys = {}
+            for region in regions:
+                periods[region] = caller.get_current_period(region)
+                index_keys[region] = (region_int[region], periods[region])
+                # check the saved ids against what's present in the db for this
+                # period/region (and pull them again if they're off)
+                in_sync = seen_runs.reconcile(mdb, *index_keys[region])
+                print(
+                    "%s existing run ids from MDB for [%s %s]"
+                    % ("Verified" if in_sync else "Retrieved", region, periods[region])
                 )
-                % (
-                    calls_end - calls_start,
-                    region,
-                    period,
-                    dungeon,
-                    len(runs),
-                    len(novel_runs),
-                    insert_end - insert_start,
+            # past periods won't get new runs
+            seen_runs.prune(list(index_keys.values()))
+        # the index only ever gets ids of committed runs, so it's saved even
+        # if the cycle fails
+        cleanup.callback(seen_runs.save)
+        # runs are written to MDB on writer threads (own pooled connections),
+        # so the next group's calls don't wait on the inserts
+        writer = mplusdb.BackgroundWriter(mdb, workers=2)
+        # summary_spec counts of the inserted runs, applied at the end of the cycle
+        writer.summary_deltas = mplusdb.SpecSummaryDeltas()
+        try:
+            calls_start = time.time()
+            groups = scheduler.iter_groups(periods, dungeons)
+            # groups come out as soon as all of their realms are in
+            for region, dungeon, runs, rosters, report in groups:
+                novel_runs = seen_runs.get_new(index_keys[region], runs)
+                novel_rosters = seen_runs.get_new(index_keys[region], rosters)
+                calls_end = time.time()
+
+                insert_start = time.time()
+                if len(novel_runs) > 0:
+                    # (once they're in MDB, the runs are added to the seen-run index)
+                    on_commit = functools.partial(
+                        seen_runs.add, index_keys[region], novel_runs
+                    )
+                    writer.submit(novel_runs, novel_rosters, on_commit)
+                insert_end = time.time()
+                print(
+                    (
+                        "batch call (%d sec) success [%s %s %s]"
+                        + " got %d total runs, queued %d new runs (%d sec) for MDB"
+                        + " (%d calls failed, %d cross-realm copies skipped)"
+                    )
+                    % (
+                        calls_end - calls_start,
+                        region,
+                        periods[region],
+                        dungeon,
+                        len(runs),
+                        len(novel_runs),
+                        insert_end - insert_start,
+                        report.failed,
+                        scheduler.duplicates_skipped[(region, dungeon)],
+                    )
                 )
-            )
-    print("END CYCLE, exec time %d seconds" % (time.time() - cycle_start))
+                # the next group has been downloading in the meantime
+                calls_start = time.time()
+        finally:
+            try:
+                # flush: waits for every queued run to be written (raises if
+                # any failed)
+                writer.close()
+            finally:
+                # counts of the runs that did get committed
+                _apply_summary_deltas(mdb, writer.summary_deltas)
+        # all data is in MDB now, so it's safe to remember the validators
+        # (not saved if any write failed: those leaderboards must be
+        # downloaded again next cycle)
+        validators.save()
+        writer_stats = writer.get_stats()
+        cache_stats = validators.get_stats()
+        pool_stats = pool.get_stats()
+        quota_levels = pool.limiter.get_levels()
+    print(
+        "END CYCLE, exec time %d seconds, %d requests over %d connections"
+        % (time.time() - cycle_start, pool_stats["requests"], pool_stats["connections"])
+    )
+    print(
+        "%d of %d leaderboards unchanged (%.0f%% hit rate, %.1f MB not downloaded)"
+        % (
+            cache_stats["hits"],
+            cache_stats["hits"] + cache_stats["misses"],
+            cache_stats["hit_rate"] * 100,
+            cache_stats["bytes_saved"] / 1e6,
+        )
+    )
+    print(
+        "Wrote %d runs in %d transactions (%d sec), waited %d sec on MDB"
+        % (
+            writer_stats["runs"],
+            writer_stats["transactions"],
+            writer_stats["write_seconds"],
+            writer_stats["blocked_seconds"],
+        )
+    )
+    print("%d calls left in the hourly API quota" % quota_levels["hour"])
+    print("Leaderboard calls: %s" % scheduler.report)
+    for failure in scheduler.report.failures:
+        print("  gave up on %s: %s" % (failure["key"], failure["error"]))
+
+
+def _apply_summary_deltas(
+    mdb: mplusdb.MplusDatabase, deltas: mplusdb.SpecSummaryDeltas
+) -> None:
+    """Applies summary_spec counts of a cycle, rebuilds periods it lost track of."""
+    num_counts = mdb.apply_summary_spec_deltas(deltas)
+    print("Added %d spec/level counts to summary_spec" % num_counts)
+    stale_periods = deltas.stale_periods
+    if stale_periods:
+        # some runs were in MDB already, so these periods get the full rebuild
+        mdb.update_summary_spec_table(min(stale_periods), max(stale_periods))
+        print("Rebuilt summary_spec for periods %s" % sorted(stale_periods))
 
 
 def update_mdb_summary() -> None:
-    """Updates summary tables in MDB."""
+    """Updates summary tables in MDB.
+
+    get_data keeps summary_spec current as it inserts runs; the full
+    rebuild here also corrects any drift in those counts.
+    """
     caller = blizz_api.Caller()
     us_current_period = caller.get_current_period("us")
     # different regions roll into new period (reset) at
@@ -93,8 +208,23 @@ def update_mdb_summary() -> None:
     start = us_current_period - 1
     end = us_current_period
     mdb = mplusdb.MplusDatabase("config/db_config.ini")
-    mdb.update_summary_spec_table(period_start=start, period_end=end)
-    mdb.update_weekly_top500_table(period_start=start, period_end=end)
+    with mdb.session():
+        mdb.update_summary_spec_table(period_start=start, period_end=end)
+        mdb.update_weekly_top500_table(period_start=start, period_end=end)
+    mdb.close()
+
+
+def rescore_runs(period_start=None, period_end=None) -> None:
+    """Re-scores runs in MDB (ex: after a timer or score formula change)."""
+    time_start = time.time()
+    mdb = mplusdb.MplusDatabase("config/db_config.ini")
+    scanned, updated = mdb.rescore_runs(
+        period_start=period_start, period_end=period_end
+    )
+    print(
+        "Re-scored %d runs, updated %d scores (%d sec)"
+        % (scanned, updated, time.time() - time_start)
+    )
 
 
 def export_mdb_summary() -> None:
@@ -229,18 +359,26 @@ def push_weekly_top500_summary_to_sqlite(weekly_top500_summary):
 def push_comp_data_to_sqlite(data: List[Tuple[str, int, float, float, int]]) -> None:
     """Pushes composition data to SQLite db.
 
+    Each composition also gets its integer code (utils.encode_composition),
+    so readers can group on it or load it into utils.CompositionIndex
+    without parsing the strings. Comps with a letter the spec registry
+    doesn't know get code 0.
+
     Parameters
     ----------
     data : List[tuple(str, int, float, float, int)]
         list of tuples with comp data, including tokenized comp name
         the number of runs, and average and std dev of the run key levels
     """
+    codes = utils.encode_compositions([row[0] for row in data], strict=False)
+    data = [(int(code),) + tuple(row) for code, row in zip(codes, data)]
     conn = connect_to_sqlite("data/summary.sqlite")
     cursor = conn.cursor()
     cursor.execute("DROP TABLE IF EXISTS composition")
     cursor.execute(
         """
         CREATE TABLE composition(
+            composition_code integer NOT NULL,
             composition text NOT NULL,
             run_count integer NOT NULL,
             level_mean real NOT NULL,
@@ -251,11 +389,14 @@ def push_comp_data_to_sqlite(data: List[Tuple[str, int, float, float, int]]) ->
     )
     cursor.executemany(
         """
-        INSERT INTO composition(composition, run_count, level_mean, level_std, level_max)
-        VALUES(?,?,?,?,?)
+        INSERT INTO composition(
+            composition_code, composition, run_count, level_mean, level_std, level_max
+        )
+        VALUES(?,?,?,?,?,?)
         """,
         data,
     )
+    cursor.execute("CREATE INDEX composition_code_idx ON composition(composition_code)")
     conn.commit()
     conn.close()
 
@@ -0,0 +1,148 @@
+"""Call scheduling of blizz_api, with _api_call stubbed out (no network)."""
+import requests
+
+import blizz_api
+import blizz_http
+import blizz_parser
+from fixtures import make_corpus, make_leaderboard
+
+
+class StubResponse:
+    status_code = 200
+    content = b"{}"
+
+
+class StubPool:
+    """Answers each url with its body (ETag is the url), or a 304 if the
+    request carries that ETag; an int body is an error status."""
+
+    def __init__(self, bodies) -> None:
+        self.bodies = bodies
+        self.requests = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requests.append((url, dict(headers or {})))
+        response = requests.Response()
+        response.url = url
+        etag = '"%s"' % url
+        if isinstance(self.bodies[url], int):
+            response.status_code = self.bodies[url]
+            response._content = b""
+        elif (headers or {}).get("If-None-Match") == etag:
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = self.bodies[url]
+            response.headers["ETag"] = etag
+        return response
+
+
+def test_validators_confirmed_only_for_parsed_bodies(monkeypatch):
+    good = make_leaderboard(num_runs=5, realm_id=1)
+    pool = StubPool({"good": good, "bad": good[: len(good) // 2]})
+    calls = [(("us", 1, 244, 775), "good"), (("us", 2, 244, 775), "bad")]
+    validators = blizz_http.ValidatorCache()
+    caller = blizz_api.BatchCaller("token", pool=pool)
+    caller.validator_cache = validators
+    monkeypatch.setattr(caller, "_get_leaderboard_calls", lambda: calls)
+    runs, _ = caller.get_data()
+    assert len(runs) == 5
+    assert validators.get_stats()["entries"] == 1
+    # the next cycle: the good leaderboard is not modified, the bad one is
+    # downloaded again
+    pool.requests = []
+    runs, _ = caller.get_data()
+    assert runs == []
+    assert sorted(pool.requests) == [
+        ("bad", {}),
+        ("good", {"If-None-Match": '"good"'}),
+    ]
+    assert validators.get_stats()["hits"] == 1
+
+
+def test_backoff_is_slept_not_spun(monkeypatch):
+    attempts = []
+
+    def api_call(key, url, pool, validators=None):
+        attempts.append(url)
+        if len(attempts) == 1:
+            raise requests.ConnectionError("stub connection reset")
+        return StubResponse()
+
+    waits = []
+    real_wait = blizz_api.wait
+
+    def counting_wait(*args, **kwargs):
+        waits.append(1)
+        return real_wait(*args, **kwargs)
+
+    monkeypatch.setattr(blizz_api, "_api_call", api_call)
+    monkeypatch.setattr(blizz_api, "wait", counting_wait)
+    retries = blizz_http.RetryQueue(base_delay=0.2)
+    responses, report = blizz_api._multi_threaded_call(
+        [("us", "url")], 1, None, retries=retries
+    )
+    assert isinstance(responses[0], StubResponse)
+    assert len(attempts) == 2
+    assert report.retried == 1
+    # one wait() per attempt, and no wait() while only the retry is queued
+    assert len(waits) <= 4
+
+
+def test_unretryable_failure_is_reported_once(monkeypatch):
+    attempts = []
+
+    def api_call(key, url, pool, validators=None):
+        attempts.append(url)
+        response = requests.Response()
+        response.status_code = 404
+        raise requests.HTTPError("404 not found", response=response)
+
+    monkeypatch.setattr(blizz_api, "_api_call", api_call)
+    responses, report = blizz_api._multi_threaded_call(
+        [("us", "missing")], 1, None, retries=blizz_http.RetryQueue(base_delay=0.0)
+    )
+    assert responses == [None]
+    assert attempts == ["missing"]
+    assert report.failed == 1 and report.retried == 0
+
+
+def test_scheduler_yields_each_group_once(monkeypatch):
+    good = make_leaderboard(num_runs=5, realm_id=1)
+    shared = make_corpus(num_runs=10, num_realms=2, duplicate_rate=0.5, seed=2)
+    bodies = {
+        ("us", 1, 244): shared[0],
+        ("us", 2, 244): shared[1],
+        ("us", 1, 245): good,
+        ("us", 2, 245): 404,
+        ("eu", 1, 244): good,
+        ("eu", 2, 244): good[: len(good) // 2],
+    }
+    groups = [(region, dungeon) for region, _, dungeon in bodies]
+    calls = [((*key, 775), str(key)) for key in bodies]
+    pool = StubPool({str(key): body for key, body in bodies.items()})
+    scheduler = blizz_api.LeaderboardScheduler("token", pool=pool)
+    scheduler.workers = 3
+    scheduler.validator_cache = blizz_http.ValidatorCache()
+    scheduler.retry_budget = blizz_http.RetryBudget(0)
+    monkeypatch.setattr(
+        scheduler, "_get_calls", lambda periods, dungeons: (groups, calls)
+    )
+    results = {}
+    for region, dungeon, runs, rosters, report in scheduler.iter_groups(
+        {"us": 775, "eu": 775}, [244, 245]
+    ):
+        assert (region, dungeon) not in results
+        results[region, dungeon] = (runs, report)
+    assert set(results) == {("us", 244), ("us", 245), ("eu", 244)}
+    expected, _ = blizz_parser.parse_leaderboards(shared)
+    assert sorted(results["us", 244][0]) == sorted(expected)
+    assert scheduler.duplicates_skipped["us", 244] > 0
+    assert len(results["us", 245][0]) == 5
+    assert results["us", 245][1].failed == 1
+    assert len(results["eu", 244][0]) == 5
+    assert results["eu", 244][1].succeeded == 2
+    assert scheduler.report.requested == 6 and scheduler.report.failed == 1
+    # validators of the truncated body (and of the 404) are not used
+    assert scheduler.validator_cache.get_stats()["entries"] == 4
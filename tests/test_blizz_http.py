@@ -0,0 +1,150 @@
+"""blizz_http transport helpers (no network)."""
+import json
+
+import requests
+
+import blizz_http
+
+
+def take_tokens(limiter):
+    """Takes tokens until the limiter says wait; returns how many it gave."""
+    taken = 0
+    while limiter.reserve() == 0:
+        taken += 1
+    return taken
+
+
+def test_rate_limiter_enforces_both_windows():
+    assert take_tokens(blizz_http.RateLimiter(per_second=5, per_hour=100)) == 5
+    assert take_tokens(blizz_http.RateLimiter(per_second=100, per_hour=3)) == 3
+
+
+def test_rate_limiter_throttle_blocks_callers():
+    limiter = blizz_http.RateLimiter()
+    limiter.throttle(30)
+    assert 29 < limiter.reserve() <= 30
+    assert limiter.get_levels()["blocked_for"] > 29
+
+
+def test_rate_limiter_carries_hourly_bucket_over(tmp_path):
+    path = str(tmp_path / "rate_limiter.json")
+    limiter = blizz_http.RateLimiter(per_second=100, per_hour=50, file_path=path)
+    assert take_tokens(limiter) == 50
+    limiter.throttle(60)
+    limiter.save()
+    # the next process starts from the spent bucket, and is still blocked
+    limiter = blizz_http.RateLimiter(per_second=100, per_hour=50, file_path=path)
+    assert limiter.get_levels()["hour"] < 1
+    assert limiter.get_levels()["blocked_for"] > 59
+    # an hour later the bucket is full again
+    with open(path) as file_:
+        state = json.load(file_)
+    state["saved_at"] -= 3600
+    with open(path, "w") as file_:
+        json.dump(state, file_)
+    limiter = blizz_http.RateLimiter(per_second=100, per_hour=50, file_path=path)
+    assert limiter.get_levels()["hour"] == 50
+    assert limiter.get_levels()["blocked_for"] == 0
+
+
+def make_headers(etag):
+    headers = requests.structures.CaseInsensitiveDict()
+    headers["ETag"] = etag
+    return headers
+
+
+def test_validators_are_pending_until_confirmed(tmp_path):
+    path = str(tmp_path / "validators.json")
+    validators = blizz_http.ValidatorCache(path)
+    validators.update(("us", 1, 244, 800), make_headers('"a"'), 1000)
+    validators.update(("us", 2, 244, 800), make_headers('"b"'), 2000)
+    assert validators.get_headers(("us", 1, 244, 800)) == {}
+    validators.confirm([("us", 1, 244, 800)])
+    assert validators.get_headers(("us", 1, 244, 800)) == {"If-None-Match": '"a"'}
+    assert validators.get_headers(("us", 2, 244, 800)) == {}
+    validators.save()
+    # only the confirmed validator is saved
+    loaded = blizz_http.ValidatorCache(path)
+    assert loaded.get_headers(("us", 1, 244, 800)) == {"If-None-Match": '"a"'}
+    assert loaded.get_headers(("us", 2, 244, 800)) == {}
+    assert loaded.get_stats()["entries"] == 1
+
+
+def test_validator_hits_count_bytes_saved():
+    validators = blizz_http.ValidatorCache()
+    validators.update(("us", 1, 244, 800), make_headers('"a"'), 1000)
+    validators.confirm([("us", 1, 244, 800)])
+    validators.record_hit(("us", 1, 244, 800))
+    stats = validators.get_stats()
+    assert (stats["hits"], stats["misses"], stats["bytes_saved"]) == (1, 1, 1000)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_response_without_validators_is_not_stored():
+    validators = blizz_http.ValidatorCache()
+    validators.update(("us", 1, 244, 800), {}, 1000)
+    validators.confirm([("us", 1, 244, 800)])
+    assert validators.get_stats()["entries"] == 0
+
+
+def make_http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError("%d error" % status, response=response)
+
+
+def test_retryable_errors():
+    assert blizz_http.is_retryable(requests.ConnectionError("reset"))
+    assert blizz_http.is_retryable(make_http_error(429))
+    assert blizz_http.is_retryable(make_http_error(503))
+    assert not blizz_http.is_retryable(make_http_error(404))
+
+
+def test_retry_budget_is_shared_by_queues():
+    budget = blizz_http.RetryBudget(3)
+    first = blizz_http.RetryQueue(budget, max_attempts=10)
+    second = blizz_http.RetryQueue(budget, max_attempts=10)
+    assert first.push("a", 1) and first.push("b", 1) and second.push("c", 1)
+    assert not second.push("d", 1)
+    assert budget.remaining == 0
+    assert (len(first), len(second)) == (2, 1)
+
+
+def test_retry_queue_stops_at_max_attempts():
+    retries = blizz_http.RetryQueue(max_attempts=3)
+    assert retries.push("call", 2)
+    assert not retries.push("call", 3)
+    assert retries.budget.remaining == retries.budget.retries - 1
+
+
+def test_retry_backoff_is_jittered_and_capped():
+    retries = blizz_http.RetryQueue(base_delay=1.0, max_delay=8.0)
+    for attempt, delay in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (10, 8.0)]:
+        backoff = retries.backoff(attempt)
+        assert delay / 2 <= backoff <= delay
+
+
+def test_retries_pop_once_their_backoff_runs_out():
+    retries = blizz_http.RetryQueue(base_delay=0.0)
+    assert retries.next_ready_in() is None
+    retries.push("call", 1)
+    assert retries.next_ready_in() == 0.0
+    assert retries.pop_ready() == [("call", 1)]
+    assert not retries
+    retries = blizz_http.RetryQueue(base_delay=60.0, max_delay=60.0)
+    retries.push("call", 1)
+    assert retries.pop_ready() == []
+    assert 30.0 < retries.next_ready_in() <= 60.0
+
+
+def test_fetch_report_masks_token_and_counts_recoveries():
+    report = blizz_http.FetchReport()
+    report.requested = 3
+    report.add_success(1)
+    report.add_success(2, modified=False)
+    url = "https://us.api.blizzard.com/x?namespace=dynamic-us&access_token=secret"
+    report.add_failure(("us", 1), url, make_http_error(503), 4)
+    assert (report.succeeded, report.not_modified, report.recovered) == (1, 1, 1)
+    assert report.failed == 1
+    assert "secret" not in report.failures[0]["url"]
+    assert report.failures[0]["status"] == 503
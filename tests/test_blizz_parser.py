@@ -0,0 +1,90 @@
+"""The leaderboard decoders have to agree with each other."""
+
+import json
+import random
+
+import pytest
+
+import blizz_parser
+import utils
+from fixtures import make_corpus, make_group, make_leaderboard
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return make_corpus(num_runs=50, num_realms=5, seed=1)
+
+
+def test_decoders_give_identical_tuples():
+    payload = make_leaderboard(num_runs=100, seed=3)
+    leaderboard = blizz_parser.KeyRunLeaderboard(json.loads(payload))
+    expected = (
+        leaderboard.get_runs_as_tuple_list(),
+        leaderboard.get_rosters_as_tuple_list(),
+    )
+    for decoder in ("stream", "fast", "json"):
+        assert blizz_parser.parse_leaderboard(payload, decoder) == expected, decoder
+
+
+def test_decoders_dedupe_identically(corpus):
+    results = {}
+    for decoder in ("stream", "fast", "json"):
+        deduper = blizz_parser.RunDeduper()
+        results[decoder] = (
+            blizz_parser.parse_leaderboards(corpus, decoder, deduper),
+            deduper.skipped,
+        )
+    assert results["stream"][1] > 0  # the corpus has runs on several realms
+    assert results["stream"] == results["fast"] == results["json"]
+
+
+def test_decoders_skip_the_same_malformed_bodies(corpus):
+    payloads = list(corpus[:2]) + [b'{"leading_groups": [', b"{}"] + list(corpus[2:])
+    results = {}
+    for decoder in ("stream", "fast", "json"):
+        failed = []
+        runs, rosters = blizz_parser.parse_leaderboards(
+            payloads, decoder, failed=failed
+        )
+        results[decoder] = (runs, rosters, failed)
+    assert results["stream"][2] == [2, 3]
+    assert results["stream"] == results["fast"] == results["json"]
+
+
+# a truncated body only fails half way through with the stream decoder,
+# json.loads rejects it before any run is fingerprinted
+@pytest.mark.parametrize(
+    "decoder, breakage",
+    [
+        ("stream", "bad entry"),
+        ("fast", "bad entry"),
+        ("json", "bad entry"),
+        ("stream", "truncated"),
+    ],
+)
+def test_failed_leaderboard_does_not_hide_runs(decoder, breakage):
+    rnd = random.Random(7)
+    spec_ids = utils.Utils.get_all_spec_ids()
+    shared, other, broken, clean = [make_group(rnd, spec_ids) for _ in range(4)]
+    for level, group in zip([20, 19, 2, 18], [shared, other, broken, clean]):
+        group["keystone_level"] = level
+    groups = [json.loads(json.dumps(group)) for group in (shared, other, broken)]
+    bad = json.loads(make_leaderboard(groups=groups, realm_id=1))
+    # the last run fails after the others were fingerprinted
+    if breakage == "bad entry":
+        del bad["leading_groups"][-1]["members"][0]["specialization"]
+        bad = json.dumps(bad).encode()
+    else:
+        body = json.dumps(bad).encode()
+        bad = body[: body.rindex(b'"keystone_level": 2')]
+    payloads = [
+        bad,
+        make_leaderboard(groups=[json.loads(json.dumps(shared)), clean], realm_id=2),
+        make_leaderboard(groups=[json.loads(json.dumps(other))], realm_id=3),
+    ]
+    deduper = blizz_parser.RunDeduper()
+    failed = []
+    runs, _ = blizz_parser.parse_leaderboards(payloads, decoder, deduper, failed)
+    assert failed == [0]
+    assert len(runs) == 3
+    assert deduper.skipped == 0
@@ -0,0 +1,356 @@
+"""MDB writes on a stub MySQL connection (no server needed)."""
+import threading
+import types
+
+import mysql.connector
+import numpy as np
+import pytest
+
+import mplusdb
+import utils
+
+
+class StubCursor:
+    """Cursor that records executemany() calls on its connection."""
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.rowcount = 0
+
+    def executemany(self, query, data) -> None:
+        table = query.split()[3]
+        if self.connection.fail_on(table, data):
+            raise mysql.connector.DatabaseError("stub insert failed")
+        self.connection.pending.append((table, list(data)))
+        self.rowcount = len(data)
+
+    def execute(self, query, params) -> None:
+        """Multi-row INSERT: params are the rows' values, flattened."""
+        num_fields = query.split("(")[2].count("%s")
+        rows = [
+            tuple(params[start : start + num_fields])
+            for start in range(0, len(params), num_fields)
+        ]
+        self.executemany(query, rows)
+
+    def close(self) -> None:
+        pass
+
+
+class StubConnection:
+    """Connection that keeps committed rows in its server's `rows`."""
+
+    def __init__(self, server) -> None:
+        self.server = server
+        self.pending = []
+
+    def fail_on(self, table, data) -> bool:
+        return any(row[0] in self.server.failing_ids for row in data)
+
+    def cursor(self) -> StubCursor:
+        return StubCursor(self)
+
+    def commit(self) -> None:
+        with self.server.lock:
+            for table, data in self.pending:
+                self.server.rows.setdefault(table, []).extend(data)
+        self.pending = []
+
+    def rollback(self) -> None:
+        self.pending = []
+
+    def close(self) -> None:
+        pass
+
+
+class StubServer:
+    def __init__(self) -> None:
+        self.rows = {}
+        self.failing_ids = set()
+        self.lock = threading.Lock()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StubServer()
+    monkeypatch.setattr(mysql.connector, "connect", lambda **kw: StubConnection(server))
+    return server
+
+
+@pytest.fixture
+def mdb(server, tmp_path):
+    config = tmp_path / "db_config.ini"
+    config.write_text("[DATABASE]\nuser=u\npassword=p\nhost=h\n")
+    mdb = mplusdb.MplusDatabase(str(config))
+    yield mdb
+    mdb.close()
+
+
+def make_runs(run_ids, period=800):
+    """Returns run and roster tuples shaped like the MDB tables."""
+    runs = [
+        (run_id, 244, 15, period, 0, 1800000, 0, 1, 100.0, 1, "DGhim")
+        for run_id in run_ids
+    ]
+    rosters = [(run_id, 1, "name", 250, 11) for run_id in run_ids]
+    return runs, rosters
+
+
+def close_within(writer, seconds=10):
+    """Closes writer on another thread; fails the test if close() hangs."""
+    result = {}
+
+    def close():
+        try:
+            writer.close()
+        except Exception as error:
+            result["error"] = error
+
+    thread = threading.Thread(target=close)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "BackgroundWriter.close() hangs"
+    return result.get("error")
+
+
+def test_writes_every_batch(server, mdb):
+    committed = []
+    deltas = mplusdb.SpecSummaryDeltas()
+    writer = mplusdb.BackgroundWriter(mdb, workers=2)
+    writer.summary_deltas = deltas
+    for start in range(0, 100, 10):
+        runs, rosters = make_runs(range(start, start + 10))
+        writer.submit(runs, rosters, on_commit=lambda: committed.append(1))
+    assert close_within(writer) is None
+    assert sorted(row[0] for row in server.rows["run"]) == list(range(100))
+    assert len(server.rows["roster"]) == 100
+    assert len(committed) == 10
+    assert writer.get_stats()["runs"] == 100
+    assert deltas.get_counts() == {(800, 250, 15): 100}
+
+
+def test_failed_batch_is_skipped_and_reported(server, mdb):
+    server.failing_ids.add(5)
+    writer = mplusdb.BackgroundWriter(mdb)
+    writer.submit(*make_runs(range(0, 10)))
+    writer.submit(None, None)  # malformed batch
+    writer.submit(*make_runs(range(10, 20)))
+    error = close_within(writer)
+    assert error is not None
+    # the batch the failing run was merged with is rolled back, the rest is not
+    written = {row[0] for row in server.rows.get("run", [])}
+    assert 5 not in written
+    assert {row[0] for row in server.rows.get("roster", [])} == written
+    assert writer.errors
+
+
+def test_failed_summary_deltas_mark_period_stale(server, mdb):
+    deltas = mplusdb.SpecSummaryDeltas()
+    writer = mplusdb.BackgroundWriter(mdb)
+    writer.summary_deltas = deltas
+    runs, rosters = make_runs(range(10), period=801)
+    rosters.append((999, 1, "name", 250, 11))  # roster of an unknown run
+    writer.submit(runs, rosters)
+    assert close_within(writer) is None
+    assert len(server.rows["run"]) == 10
+    assert deltas.stale_periods == {801}
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_close_does_not_hang_when_writer_thread_died(server, mdb):
+    def kill_writer():
+        raise SystemExit
+
+    writer = mplusdb.BackgroundWriter(mdb, max_pending=1)
+    writer.submit(*make_runs([1]), on_commit=kill_writer)
+    with pytest.raises(RuntimeError):
+        for run_id in range(2, 10):
+            writer.submit(*make_runs([run_id]))
+    error = close_within(writer)
+    assert error is not None
+    with pytest.raises(RuntimeError):
+        writer.submit(*make_runs([10]))
+
+
+def test_bulk_insert_commits_chunk_by_chunk(server, mdb):
+    runs, _ = make_runs(range(25))
+    stats = mdb.bulk_insert("run", runs, chunk_size=10)
+    assert (stats["rows"], stats["chunks"]) == (25, 3)
+    assert server.rows["run"] == runs
+    # a failed chunk is rolled back, the ones before it stay
+    server.failing_ids.add(115)
+    with pytest.raises(Exception):
+        mdb.bulk_insert("run", make_runs(range(100, 125))[0], chunk_size=10)
+    assert len(server.rows["run"]) == 35
+
+
+def test_failed_call_in_session_is_rolled_back(server, mdb):
+    query = "INSERT IGNORE into run (id) VALUES (%s)"
+    with mdb.session():
+        with pytest.raises(RuntimeError):
+            with mdb._connection() as connection:
+                connection.cursor().executemany(query, [(1,)])
+                raise RuntimeError("the call's second statement failed")
+        # the next call commits its own work only
+        mdb.insert(table="run", data=make_runs([2])[0])
+    assert [row[0] for row in server.rows["run"]] == [2]
+
+
+def test_failed_transaction_is_rolled_back(server, mdb):
+    with pytest.raises(RuntimeError):
+        with mdb.transaction():
+            mdb.insert(table="run", data=make_runs([1])[0])
+            mdb.insert(table="roster", data=make_runs([1])[1])
+            raise RuntimeError("failed before the commit")
+    mdb.insert(table="run", data=make_runs([2])[0])
+    assert [row[0] for row in server.rows["run"]] == [2]
+    assert "roster" not in server.rows
+
+
+class RunTableCursor:
+    """Cursor that runs rescore_runs' queries on the stub's run table."""
+
+    def __init__(self, table) -> None:
+        self.table = table
+        self._rows = []
+
+    def execute(self, query, params=None) -> None:
+        if query.startswith("SELECT"):
+            last_id, limit = params
+            self.table.selects.append(last_id)
+            ids = sorted(run_id for run_id in self.table.runs if run_id > last_id)
+            self._rows = [(run_id,) + self.table.runs[run_id] for run_id in ids]
+            self._rows = self._rows[:limit]
+        elif query.startswith("DELETE FROM run_score_update"):
+            self.table.updates = []
+        elif query.startswith("UPDATE run"):
+            for run_id, score in self.table.updates:
+                self.table.runs[run_id] = self.table.runs[run_id][:3] + (score,)
+
+    def executemany(self, query, data) -> None:
+        self.table.updates.extend(data)
+
+    def fetchall(self) -> list:
+        return self._rows
+
+    def close(self) -> None:
+        pass
+
+
+class RunTableConnection:
+    def __init__(self, table) -> None:
+        self.table = table
+
+    def cursor(self) -> RunTableCursor:
+        return RunTableCursor(self.table)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def test_rescore_runs_pages_by_id_and_writes_changes(monkeypatch, tmp_path):
+    scorer = utils.Scorer()
+    table = types.SimpleNamespace(selects=[], updates=[])
+    # id -> (duration, dungeon, level, score); ids with gaps, out of order
+    table.runs = {}
+    for run_id in [41, 3, 17, 8, 29, 50, 12, 33, 5, 60]:
+        table.runs[run_id] = (
+            1700000 + run_id,
+            244,
+            15,
+            scorer.get_score(1700000 + run_id, 244, 15),
+        )
+    table.runs[8] = (1700008, 244, 15, 1.0)  # stale score
+    table.runs[33] = (1700033, 244, 15, None)  # never scored
+    table.runs[12] = (1700012, 9999, 15, 5.0)  # dungeon without a timer
+    monkeypatch.setattr(
+        mysql.connector, "connect", lambda **kw: RunTableConnection(table)
+    )
+    config = tmp_path / "db_config.ini"
+    config.write_text("[DATABASE]\nuser=u\npassword=p\nhost=h\n")
+    mdb = mplusdb.MplusDatabase(str(config))
+    scanned, updated = mdb.rescore_runs(scorer, chunk_size=3)
+    assert (scanned, updated) == (10, 2)
+    # each chunk starts after the last id of the one before
+    assert table.selects == [-1, 8, 29, 50, 60]
+    assert table.runs[8][3] == np.float32(scorer.get_score(1700008, 244, 15))
+    assert table.runs[33][3] == np.float32(scorer.get_score(1700033, 244, 15))
+    assert table.runs[12][3] == 5.0
+
+
+class RunIdsMdb:
+    """Answers SeenRunIndex's queries from a dict of run ids."""
+
+    def __init__(self, run_ids) -> None:
+        self.run_ids = run_ids  # (region, period) -> list of ids
+        self.pulls = []
+
+    def get_run_id_checksum(self, region, period):
+        run_ids = self.run_ids.get((region, period), [])
+        checksum = 0
+        for run_id in run_ids:
+            checksum ^= run_id
+        return len(run_ids), checksum
+
+    def pull_existing_run_ids(self, region, period):
+        self.pulls.append((region, period))
+        return list(self.run_ids.get((region, period), []))
+
+
+BIG_ID = 2**64 - 5  # run ids use the whole uint64 range
+
+
+def test_seen_runs_filter_new_runs():
+    seen = mplusdb.SeenRunIndex()
+    runs, rosters = make_runs([1, 2, 3, BIG_ID])
+    assert seen.get_new((1, 800), runs) == runs
+    seen.add((1, 800), runs[:2])
+    assert seen.get_new((1, 800), runs) == runs[2:]
+    assert seen.get_new((1, 800), rosters) == rosters[2:]
+    assert seen.get_new((1, 801), runs) == runs  # other period
+    array = np.array(
+        [(run_id,) for run_id in [2, 3, BIG_ID]], dtype=[("run_id", np.uint64)]
+    )
+    assert seen.get_new((1, 800), array)["run_id"].tolist() == [3, BIG_ID]
+
+
+def test_seen_runs_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "seen_runs.npz")
+    seen = mplusdb.SeenRunIndex(path)
+    seen.set_ids((1, 800), [5, BIG_ID, 3, 5])
+    seen.set_ids((3, 801), [])
+    seen.save()
+    loaded = mplusdb.SeenRunIndex(path)
+    assert loaded.get_ids((1, 800)).tolist() == [3, 5, BIG_ID]
+    assert loaded.get_ids((1, 800)).dtype == np.uint64
+    assert (3, 801) in loaded and len(loaded.get_ids((3, 801))) == 0
+    assert loaded.get_stats() == {"keys": 2, "ids": 3}
+    loaded.prune([(3, 801)])
+    assert (1, 800) not in loaded and (3, 801) in loaded
+
+
+def test_seen_runs_reconcile_pulls_only_when_out_of_sync():
+    mdb = RunIdsMdb({(1, 800): [3, 5, BIG_ID]})
+    seen = mplusdb.SeenRunIndex()
+    # not in the index yet
+    assert not seen.reconcile(mdb, 1, 800)
+    assert seen.get_ids((1, 800)).tolist() == [3, 5, BIG_ID]
+    assert seen.reconcile(mdb, 1, 800)
+    assert mdb.pulls == [(1, 800)]
+    # a run the index missed: count is off
+    mdb.run_ids[1, 800].append(9)
+    assert not seen.reconcile(mdb, 1, 800)
+    # same count, different ids: xor is off
+    mdb.run_ids[1, 800] = [3, 5, BIG_ID, 10]
+    assert not seen.reconcile(mdb, 1, 800)
+    assert seen.get_ids((1, 800)).tolist() == [3, 5, 10, BIG_ID]
+    assert len(mdb.pulls) == 3
+    # a period without runs
+    assert not seen.reconcile(mdb, 2, 800)
+    assert seen.reconcile(mdb, 2, 800)
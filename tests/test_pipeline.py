@@ -0,0 +1,20 @@
+"""Summary exports of the pipeline, on a temporary sqlite file."""
+import sqlite3
+
+import pipeline
+import utils
+
+
+def test_composition_export_has_codes(monkeypatch, tmp_path):
+    path = str(tmp_path / "summary.sqlite")
+    monkeypatch.setattr(pipeline, "connect_to_sqlite", lambda _: sqlite3.connect(path))
+    pipeline.push_comp_data_to_sqlite(
+        [("DGhim", 3, 15.0, 1.0, 18), ("DG?im", 1, 2.0, 0.0, 2)]
+    )
+    rows = sqlite3.connect(path).execute(
+        "SELECT composition_code, composition, run_count FROM composition"
+    )
+    assert rows.fetchall() == [
+        (int(utils.encode_compositions(["DGhim"])[0]), "DGhim", 3),
+        (0, "DG?im", 1),  # a letter the registry doesn't know
+    ]
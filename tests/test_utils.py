@@ -0,0 +1,184 @@
+"""Scoring, spec/dungeon registry and composition codes."""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+
+def test_get_scores_matches_get_score():
+    scorer = utils.Scorer()
+    timers = dict(utils.REGISTRY.dungeon_timers)
+    rnd = random.Random(0)
+    dungeons, durations, levels = [], [], []
+    for dungeon, timer in timers.items():
+        # ratios on the chest/timer boundaries, and either side of them
+        for ratio in (0.3, 0.6, 0.6001, 0.8, 0.8001, 1.0, 1.0001, 1.5, 5.0):
+            for level in (2, 10, 11, 15, rnd.randint(2, 30)):
+                dungeons.append(dungeon)
+                durations.append(int(timer * ratio))
+                levels.append(level)
+    scores = scorer.get_scores(durations, dungeons, levels)
+    expected = [
+        scorer.get_score(duration, dungeon, level)
+        for duration, dungeon, level in zip(durations, dungeons, levels)
+    ]
+    # bit for bit, not approximately
+    assert scores.tolist() == expected
+    assert scores.min() == 10  # slow low keys are clamped
+
+
+def test_get_scores_with_custom_timers():
+    scorer = utils.Scorer(dungeon_timers={1: 1000, 7: 2000})
+    scores = scorer.get_scores([900, 2500], [1, 7], [12, 20])
+    assert scores.tolist() == [
+        scorer.get_score(900, 1, 12),
+        scorer.get_score(2500, 7, 20),
+    ]
+    with pytest.raises(KeyError):
+        scorer.get_scores([900], [3], [12])
+
+
+def test_get_scores_of_no_runs():
+    assert len(utils.Scorer().get_scores([], [], [])) == 0
+    assert utils.Scorer().get_scores(np.array([], dtype=np.int64), [], []).dtype == (
+        np.float64
+    )
+
+
+def test_registry_lookups_agree_with_spec_table():
+    registry = utils.Registry()
+    rows = utils.Specs.get_specs()
+    assert [spec["spec_id"] for spec in registry.specs] == [row[3] for row in rows]
+    assert registry.spec_ids == tuple(sorted(row[3] for row in rows))
+    for row in rows:
+        spec_id = row[3]
+        assert registry.spec_by_id[spec_id]["role"] == row[4]
+        assert registry.shorthand[spec_id] == row[6]
+        assert registry.spec_by_shorthand[row[6]] == spec_id
+        assert registry.spec_ids[registry.spec_index[spec_id]] == spec_id
+        assert registry.spec_index_array[spec_id] == registry.spec_index[spec_id]
+        assert spec_id in registry.spec_ids_by_role[row[4]]
+    assert registry.spec_index_array[61] == -1
+    for dungeon, timer in utils.get_dungeon_timers().items():
+        assert registry.dungeon_timer_array[dungeon] == timer
+
+
+def test_registry_is_read_only():
+    registry = utils.Registry()
+    with pytest.raises(TypeError):
+        registry.dungeon_timers[244] = 1
+    with pytest.raises(TypeError):
+        registry.spec_by_id[250]["role"] = "tank"
+    with pytest.raises(ValueError):
+        registry.dungeon_timer_array[244] = 1
+
+
+class StubMdb:
+    def __init__(self, tables) -> None:
+        self.tables = tables
+
+    def get_utility_table(self, name):
+        return self.tables[name]
+
+
+def test_registry_from_mdb(monkeypatch):
+    spec = pd.DataFrame(
+        [
+            ["Priest", 5, "Discipline", 256, "healer", "priest_discipline"],
+            ["Priest", 5, "New Spec", 1467, "rdps", "priest_new_spec"],
+        ],
+        columns=[
+            "class_name",
+            "class_id",
+            "spec_name",
+            "spec_id",
+            "spec_role",
+            "token",
+        ],
+    )
+    dungeon = pd.DataFrame([[244, 1800000], [999, None]], columns=["id", "timer_in_ms"])
+    registry = utils.Registry.from_mdb(StubMdb({"spec": spec, "dungeon": dungeon}))
+    assert registry.spec_ids == (256, 1467)
+    assert registry.shorthand[256] == utils.REGISTRY.shorthand[256]
+    assert registry.shorthand[1467] is None  # no composition code known
+    assert dict(registry.dungeon_timers) == {244: 1800000}
+    # set_registry switches every lookup of the process
+    monkeypatch.setattr(utils, "REGISTRY", utils.REGISTRY)
+    utils.set_registry(utils.Registry(dungeon_timers={244: 1000}))
+    assert utils.Utils.istimed(244, 1000) and not utils.Utils.istimed(244, 1001)
+    assert utils.Scorer().get_scores([500], [244], [15])[0] == (
+        utils.Scorer().get_score(500, 244, 15)
+    )
+
+
+def random_rosters(count, seed=0):
+    rnd = random.Random(seed)
+    spec_ids = utils.REGISTRY.spec_ids
+    return [[rnd.choice(spec_ids) for _ in range(5)] for _ in range(count)]
+
+
+def to_string(spec_ids):
+    return "".join(sorted(utils.REGISTRY.shorthand[spec_id] for spec_id in spec_ids))
+
+
+def test_composition_codes_round_trip():
+    for roster in random_rosters(200):
+        code = utils.encode_composition(roster)
+        assert utils.encode_composition(list(reversed(roster))) == code
+        assert utils.decode_composition(code) == tuple(
+            sorted(roster, key=utils.REGISTRY.spec_index.get)
+        )
+    assert utils.encode_composition([]) == 0
+    with pytest.raises(ValueError):
+        utils.encode_composition([250] * 6)
+
+
+def test_composition_codes_sort_like_spec_tuples():
+    rosters = random_rosters(200, seed=1)
+    index = utils.REGISTRY.spec_index
+    by_code = sorted(rosters, key=utils.encode_composition)
+    by_tuple = sorted(rosters, key=lambda roster: sorted(map(index.get, roster)))
+    assert [sorted(r) for r in by_code] == [sorted(r) for r in by_tuple]
+
+
+def test_encode_compositions_matches_scalar_codes():
+    rosters = random_rosters(300, seed=2)
+    strings = [to_string(roster) for roster in rosters] + ["", None, "DG"]
+    codes = utils.encode_compositions(strings)
+    assert codes.dtype == np.uint32
+    expected = [utils.encode_composition(roster) for roster in rosters]
+    assert codes[:-3].tolist() == expected
+    assert codes[-3:-1].tolist() == [0, 0]
+    assert codes[-1] == utils.encode_composition(
+        [utils.REGISTRY.spec_by_shorthand[letter] for letter in "DG"]
+    )
+
+
+def test_encode_compositions_unknown_letters():
+    with pytest.raises(ValueError):
+        utils.encode_compositions(["DG?im"])
+    codes = utils.encode_compositions(["DG?im", "DGhim"], strict=False)
+    assert codes[0] == 0 and codes[1] != 0
+
+
+def test_composition_index_matches_counting_rosters():
+    rosters = random_rosters(2000, seed=3)
+    index = utils.CompositionIndex.from_strings([to_string(r) for r in rosters])
+    roles = {
+        spec_id: spec["role"] for spec_id, spec in utils.REGISTRY.spec_by_id.items()
+    }
+    disc, resto_shaman = 256, 264
+    mask = index.find(specs={disc: 2})
+    assert mask.tolist() == [roster.count(disc) >= 2 for roster in rosters]
+    mask = index.find(specs={resto_shaman: 1}, roles={"tank": 1, "healer": 2})
+    expected = [
+        resto_shaman in roster
+        and [roles[s] for s in roster].count("tank") >= 1
+        and [roles[s] for s in roster].count("healer") >= 2
+        for roster in rosters
+    ]
+    assert mask.tolist() == expected
+    assert index.find().all() and len(index) == 2000
@@ -1,6 +1,9 @@
 """Utility methods."""
 import re
+from types import MappingProxyType
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
 
@@ -73,14 +76,20 @@ class Utils:
     @staticmethod
     def istimed(dungeon, duration):
         """Checks if run has been timed."""
-        timer_in_ms = get_dungeon_timers()
-        return int(duration) <= timer_in_ms[int(dungeon)]
+        return int(duration) <= REGISTRY.dungeon_timers[int(dungeon)]
 
 
 class Scorer:
-    def __init__(self):
-        """Inits with dungeon timer dict attr."""
-        self.dungeon_timers = get_dungeon_timers()
+    def __init__(self, dungeon_timers: Optional[Dict[int, int]] = None):
+        """Inits with dungeon timers (default: timers of the registry)."""
+        self._dungeon_timers = dungeon_timers
+
+    @property
+    def dungeon_timers(self) -> Dict[int, int]:
+        """Timer (ms) per dungeon id."""
+        if self._dungeon_timers is not None:
+            return self._dungeon_timers
+        return REGISTRY.dungeon_timers
 
     def get_ratio_user_vs_base_timer(self, user_time, user_dungeon):
         default_time = self.dungeon_timers[user_dungeon]
@@ -128,6 +137,63 @@ class Scorer:
         else:
             return 100 * 1.1 ** (dungeon_level - 10)
 
+    def get_scores(self, user_times, user_dungeons, dungeon_levels) -> np.ndarray:
+        """Calculates points awarded for many runs at once.
+
+        Vectorized get_score: same formula, same operation order, so every
+        score is bit-for-bit the one get_score gives.
+
+        Parameters
+        ----------
+        user_times : array-like of int
+            run durations in ms
+        user_dungeons : array-like of int
+            dungeon ids
+        dungeon_levels : array-like of int
+            keystone levels
+
+        Returns
+        -------
+        scores : np.ndarray
+            float64 score per run
+        """
+        user_times = np.asarray(user_times, dtype=np.float64)
+        ratio = user_times / self._get_timers(user_dungeons)
+        # base score per level comes from the scalar formula, so numpy's
+        # power can't round differently from python's
+        dungeon_levels = np.asarray(dungeon_levels, dtype=np.int64)
+        levels = range(int(dungeon_levels.max(initial=0)) + 1)
+        base_score_table = np.array(
+            [self.get_base_score(level) for level in levels], dtype=np.float64
+        )
+        base_points = base_score_table[dungeon_levels]
+
+        flat_bonus = (1 - ratio) * 0.085
+        chest_bonus = np.where(ratio <= 0.6, 0.03, np.where(ratio <= 0.8, 0.015, 0))
+        bonus_points = base_points * (flat_bonus + chest_bonus)
+        base_penatly_points = base_points * 0.1
+        additional_penalty_points = (ratio - 1) * (0.24 * base_points * 0.9)
+        total_penalty = base_penatly_points + additional_penalty_points
+        final_scores = np.where(
+            ratio <= 1.0, base_points + bonus_points, base_points - total_penalty
+        )
+        return np.where(final_scores < 10, 10, final_scores)
+
+    def _get_timers(self, user_dungeons) -> np.ndarray:
+        """Looks up timer (ms) of each dungeon; KeyError on unknown dungeons."""
+        user_dungeons = np.asarray(user_dungeons, dtype=np.int64)
+        if self._dungeon_timers is None:
+            timer_array = REGISTRY.dungeon_timer_array
+        else:
+            timer_array = Registry.to_dense_array(self._dungeon_timers, np.int64)
+        known = (user_dungeons >= 0) & (user_dungeons < len(timer_array))
+        timers = np.zeros(len(user_dungeons), dtype=np.float64)
+        timers[known] = timer_array[user_dungeons[known]]
+        unknown = timers == 0
+        if unknown.any():
+            raise KeyError(int(user_dungeons[unknown][0]))
+        return timers
+
 
 class ClassColors:
     def __init__(self):
@@ -162,67 +228,42 @@ class Specs:
 
     def __init__(self):
         """Init of list of dict, where each dict is a spec."""
-        class_colors = ClassColors()
-        self.specs = []
-        for row in self.get_specs():
-            spec = dict(
-                class_name=row[0],
-                class_id=row[1],
-                spec_name=row[2],
-                spec_id=row[3],
-                role=row[4],
-                token=row[5],
-                shorthand=row[6],
-                color=class_colors.get_rbg(row[0]),
-            )
-            self.specs.append(spec)
+        # lookups go through the registry's spec id keyed dicts
+        self.specs = [dict(spec) for spec in REGISTRY.specs]
+
+    def _get_field(self, spec_id, field):
+        """Gets field of spec given spec id."""
+        spec = REGISTRY.spec_by_id.get(spec_id)
+        if spec is None:
+            raise ValueError("spec id not found in spec table")
+        return spec[field]
 
-    # I am not using a df here because the data is small
-    # and df will just add overhead that isn't worth it
     def get_color(self, spec_id):
         """Get color for spec using spec id."""
-        for spec in self.specs:
-            if spec["spec_id"] == spec_id:
-                return spec["color"]
-        raise ValueError("spec id not found in spec table")
+        return self._get_field(spec_id, "color")
 
     def get_class_name(self, spec_id):
         """Get class name given a spec id."""
-        for spec in self.specs:
-            if spec["spec_id"] == spec_id:
-                return spec["class_name"]
-        raise ValueError("spec id not found in spec table")
+        return self._get_field(spec_id, "class_name")
 
     def get_spec_name(self, spec_id):
         """Get class name given a spec id."""
-        for spec in self.specs:
-            if spec["spec_id"] == spec_id:
-                return spec["spec_name"]
-        raise ValueError("spec id not found in spec table")
+        return self._get_field(spec_id, "spec_name")
 
     def get_role(self, spec_id):
         """Get class name given a spec id."""
-        for spec in self.specs:
-            if spec["spec_id"] == spec_id:
-                return spec["role"]
-        raise ValueError("spec id not found in spec table")
+        return self._get_field(spec_id, "role")
 
     def get_spec_ids_for_role(self, role):
         """Get list of spec ids for role."""
         valid_roles = ["tank", "healer", "mdps", "rdps"]
         if role not in valid_roles:
             raise ValueError("Spec role invalid. Must be one of: %s")
-        role_specs = []
-        for spec in self.specs:
-            if spec["role"] == role:
-                role_specs.append(spec["spec_id"])
-        return role_specs
+        return list(REGISTRY.spec_ids_by_role.get(role, ()))
 
     def get_shorthand(self, spec_id):
         """Returns one-letter code for spec given spec id."""
-        for spec in self.specs:
-            if spec["spec_id"] == spec_id:
-                return spec["shorthand"]
+        return REGISTRY.shorthand.get(spec_id)
 
     @staticmethod
     def get_specs():
@@ -267,3 +308,286 @@ class Specs:
             ['warrior', 1, 'protection', 73, 'tank', 'warrior_protection', 'K']
         ]
         # fmt: on
+
+
+class Registry:
+    """Immutable spec and dungeon lookup tables, precomputed once.
+
+    Everything the per-run code paths need is a dict lookup or an array
+    index; nothing is scanned or rebuilt per call. The module-level
+    REGISTRY is built at import from the hard-coded tables; use
+    Registry.from_mdb and set_registry to switch to the MDB ones.
+
+    Attributes
+    ----------
+        specs : tuple
+            read-only spec dicts (see Specs), in get_specs order
+        spec_by_id : mapping
+            spec id -> spec dict
+        shorthand : mapping
+            spec id -> one-letter composition code
+        spec_by_shorthand : mapping
+            one-letter composition code -> spec id
+        spec_ids : tuple
+            sorted spec ids (order of composition vectors)
+        spec_index : mapping
+            spec id -> position in spec_ids
+        spec_ids_by_role : mapping
+            role -> tuple of spec ids
+        dungeon_timers : mapping
+            dungeon id -> timer in ms
+        spec_index_array : np.ndarray
+            spec_index as a dense array indexed by spec id (-1: unknown)
+        dungeon_timer_array : np.ndarray
+            dungeon_timers as a dense array indexed by dungeon id (0: unknown)
+    """
+
+    def __init__(
+        self,
+        spec_rows: Optional[List[list]] = None,
+        dungeon_timers: Optional[Dict[int, int]] = None,
+    ) -> None:
+        """Inits with spec rows (Specs.get_specs format) and dungeon timers.
+
+        Both default to the hard-coded tables.
+        """
+        spec_rows = spec_rows if spec_rows else Specs.get_specs()
+        dungeon_timers = dungeon_timers if dungeon_timers else get_dungeon_timers()
+        class_colors = ClassColors()
+        specs = []
+        for row in spec_rows:
+            spec = dict(
+                class_name=row[0],
+                class_id=row[1],
+                spec_name=row[2],
+                spec_id=row[3],
+                role=row[4],
+                token=row[5],
+                shorthand=row[6],
+                color=class_colors.get_rbg(row[0]),
+            )
+            specs.append(MappingProxyType(spec))
+        self.specs = tuple(specs)
+        self.spec_by_id = MappingProxyType({s["spec_id"]: s for s in self.specs})
+        self.shorthand = MappingProxyType(
+            {s["spec_id"]: s["shorthand"] for s in self.specs}
+        )
+        self.spec_by_shorthand = MappingProxyType(
+            {s["shorthand"]: s["spec_id"] for s in self.specs if s["shorthand"]}
+        )
+        self.spec_ids = tuple(sorted(self.spec_by_id))
+        self.spec_index = MappingProxyType(
+            {spec_id: index for index, spec_id in enumerate(self.spec_ids)}
+        )
+        roles = {}
+        for spec in self.specs:
+            roles.setdefault(spec["role"], []).append(spec["spec_id"])
+        self.spec_ids_by_role = MappingProxyType(
+            {role: tuple(ids) for role, ids in roles.items()}
+        )
+        self.dungeon_timers = MappingProxyType(dict(dungeon_timers))
+        self.spec_index_array = self.to_dense_array(self.spec_index, np.int16, -1)
+        self.dungeon_timer_array = self.to_dense_array(self.dungeon_timers, np.int64)
+
+    @staticmethod
+    def to_dense_array(mapping, dtype, fill=0) -> np.ndarray:
+        """Returns read-only array with array[key] = mapping[key], fill elsewhere."""
+        array = np.full(max(mapping, default=-1) + 1, fill, dtype=dtype)
+        for key, value in mapping.items():
+            array[key] = value
+        array.flags.writeable = False
+        return array
+
+    @classmethod
+    def from_mdb(cls, mdb) -> "Registry":
+        """Builds registry from the MDB 'spec' and 'dungeon' utility tables.
+
+        The spec table has no composition codes, so shorthands come from
+        the hard-coded table (specs missing from it get None). Dungeons
+        without a timer in MDB are left out.
+
+        Parameters
+        ----------
+        mdb : mplusdb.MplusDatabase
+            database to read the utility tables from
+        """
+        shorthands = {row[3]: row[6] for row in Specs.get_specs()}
+        spec_table = mdb.get_utility_table("spec")
+        spec_rows = [
+            [
+                row.class_name,
+                int(row.class_id),
+                row.spec_name,
+                int(row.spec_id),
+                row.spec_role,
+                row.token,
+                shorthands.get(int(row.spec_id)),
+            ]
+            for row in spec_table.itertuples(index=False)
+        ]
+        dungeon_table = mdb.get_utility_table("dungeon")
+        dungeon_timers = {
+            int(row.id): int(row.timer_in_ms)
+            for row in dungeon_table.itertuples(index=False)
+            # a NULL timer comes back as NaN (which is truthy)
+            if pd.notna(row.timer_in_ms) and row.timer_in_ms
+        }
+        return cls(spec_rows, dungeon_timers)
+
+
+REGISTRY = Registry()
+
+
+def set_registry(registry: Registry) -> None:
+    """Makes registry the one every lookup in the process goes through."""
+    global REGISTRY
+    REGISTRY = registry
+
+
+# a composition code packs up to 5 slots of 6 bits, most significant first;
+# a slot holds 1 + the spec's position in REGISTRY.spec_ids, 0 if empty
+_SLOT_BITS = 6
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+_SLOT_SHIFTS = np.array([24, 18, 12, 6, 0], dtype=np.uint32)
+
+
+def encode_composition(spec_ids) -> int:
+    """Packs the specs of a roster into one integer (its composition code).
+
+    Slots are sorted, so every ordering of the same specs gives the same
+    code, and codes sort/group like the sorted spec tuples. Codes are
+    stable as long as new specs get larger ids than the existing ones.
+
+    Parameters
+    ----------
+    spec_ids : iterable of int
+        spec ids of the (up to 5) roster members
+    """
+    slots = sorted([REGISTRY.spec_index[spec_id] + 1 for spec_id in spec_ids])
+    if len(slots) > len(_SLOT_SHIFTS):
+        raise ValueError("A composition has at most 5 specs.")
+    code = 0
+    for slot in slots + [0] * (len(_SLOT_SHIFTS) - len(slots)):
+        code = (code << _SLOT_BITS) | slot
+    return code
+
+
+def decode_composition(code: int) -> tuple:
+    """Unpacks composition code into spec ids, in spec id order."""
+    spec_ids = []
+    for shift in _SLOT_SHIFTS:
+        slot = (int(code) >> int(shift)) & _SLOT_MASK
+        if slot:
+            spec_ids.append(REGISTRY.spec_ids[slot - 1])
+    return tuple(spec_ids)
+
+
+def encode_compositions(compositions, strict: bool = True) -> np.ndarray:
+    """Converts composition strings (ex: 'DGhim') to codes, vectorized.
+
+    Parameters
+    ----------
+    compositions : array-like of str
+        shorthand strings as in the run table's composition column
+        (None/'' for unknown, gives code 0)
+    strict : bool
+        if True, a letter that is not a spec code raises ValueError;
+        otherwise that composition gets code 0
+
+    Returns
+    -------
+    codes : np.ndarray
+        uint32 composition code per string
+    """
+    strings = np.array(
+        ["" if comp is None else comp for comp in compositions], dtype="U5"
+    )
+    chars = strings.view(np.uint32).reshape(len(strings), len(_SLOT_SHIFTS))
+    # char code -> slot, 0 for padding; anything else is not a spec code
+    char_slots = np.full(max(chars.max(initial=0) + 1, 128), -1, dtype=np.int16)
+    char_slots[0] = 0
+    for letter, spec_id in REGISTRY.spec_by_shorthand.items():
+        char_slots[ord(letter)] = REGISTRY.spec_index[spec_id] + 1
+    slots = char_slots[chars]
+    unknown = (slots < 0).any(axis=1)
+    if unknown.any():
+        if strict:
+            raise ValueError(
+                "Unknown spec code in composition '%s'" % strings[unknown][0]
+            )
+        slots[unknown] = 0
+    # sort slots with the empty ones last
+    empty = _SLOT_MASK + 1
+    slots = np.sort(np.where(slots == 0, empty, slots), axis=1)
+    slots = np.where(slots == empty, 0, slots).astype(np.uint32)
+    return (slots << _SLOT_SHIFTS).sum(axis=1, dtype=np.uint32)
+
+
+class CompositionIndex:
+    """Containment queries over many composition codes.
+
+    Keeps the unpacked slots (5 bytes per composition), so a query is a
+    few vectorized comparisons and a sum over them.
+
+    Usage example:
+
+        index = utils.CompositionIndex.from_strings(runs["composition"])
+        # comps with at least two discipline priests
+        mask = index.find(specs={256: 2})
+        # at least one tank and one healer, plus a restoration shaman
+        mask = index.find(specs={264: 1}, roles={"tank": 1, "healer": 1})
+
+    Attributes
+    ----------
+        codes : np.ndarray
+            uint32 composition codes, in the order given
+        slots : np.ndarray
+            (5, len(codes)) uint8 unpacked slots
+    """
+
+    def __init__(self, codes) -> None:
+        """Inits with composition codes (see encode_composition)."""
+        self.codes = np.asarray(codes, dtype=np.uint32)
+        shifts = _SLOT_SHIFTS[:, np.newaxis]
+        self.slots = ((self.codes >> shifts) & _SLOT_MASK).astype(np.uint8)
+
+    @classmethod
+    def from_strings(cls, compositions) -> "CompositionIndex":
+        """Builds index from composition strings (ex: 'DGhim')."""
+        return cls(encode_compositions(compositions))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def count_spec(self, spec_id: int) -> np.ndarray:
+        """Returns number of spec_id members in each composition."""
+        slot = REGISTRY.spec_index[spec_id] + 1
+        return (self.slots == slot).sum(axis=0)
+
+    def count_role(self, role: str) -> np.ndarray:
+        """Returns number of members with role in each composition."""
+        in_role = np.zeros(_SLOT_MASK + 1, dtype=bool)
+        for spec_id in REGISTRY.spec_ids_by_role.get(role, ()):
+            in_role[REGISTRY.spec_index[spec_id] + 1] = True
+        return in_role[self.slots].sum(axis=0)
+
+    def find(
+        self,
+        specs: Optional[Dict[int, int]] = None,
+        roles: Optional[Dict[str, int]] = None,
+    ) -> np.ndarray:
+        """Returns mask of compositions that meet every minimum count.
+
+        Parameters
+        ----------
+        specs : dict, optional
+            spec id -> min number of members with that spec
+        roles : dict, optional
+            role ('tank', 'healer', 'mdps', 'rdps') -> min number of members
+        """
+        mask = np.ones(len(self.codes), dtype=bool)
+        for spec_id, at_least in (specs or {}).items():
+            mask &= self.count_spec(spec_id) >= at_least
+        for role, at_least in (roles or {}).items():
+            mask &= self.count_role(role) >= at_least
+        return mask